@@ -10,6 +10,8 @@ import signal
 import sys
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 # 添加当前目录到Python路径
@@ -19,9 +21,11 @@ from config import ClientConfig, asr_config
 from util.cosmic import cosmic
 from util.keyboard_handler import keyboard_handler
 from util.audio_recorder import audio_recorder
-from util.asr_manager import recognize_audio
-from util.result_handler import save_recognition_result
+from util.asr_manager import asr_manager, recognize_audio, recognize_audio_data
+from util.result_handler import result_handler, save_recognition_result
 from util.config_manager import config_manager
+from util.waveform_display import start_waveform, close_waveform, set_waveform_notice
+from util.recognition_queue import RecognitionQueue
 
 # 系统托盘相关
 try:
@@ -37,9 +41,14 @@ class CapsWriterSingle:
 
     def __init__(self):
         self.running = False
-        self.recording_thread = None
         self.system_tray = None
         self.tray_thread = None
+        self.loop = None
+        self.loop_thread = None
+        self.recognitions = None
+        # 录音收尾（等待松开、停止录音、提交识别）在一个常驻线程中依次执行
+        self.capture = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture')
+        self.stopped = threading.Event()
 
     def setup_signal_handlers(self):
         """设置信号处理器"""
@@ -85,6 +94,20 @@ class CapsWriterSingle:
                     lambda: self.switch_asr_service('tencent'),
                     checked=lambda item: os.getenv('ASR_SERVICE', 'volcengine') == 'tencent'
                 ),
+                pystray.MenuItem(
+                    "自适应路由",
+                    pystray.Menu(
+                        pystray.MenuItem(
+                            "启用",
+                            self.toggle_auto_route,
+                            checked=lambda item: ClientConfig.auto_route
+                        ),
+                        pystray.Menu.SEPARATOR,
+                        pystray.MenuItem(lambda item: self.route_decision_text(), None, enabled=False),
+                        pystray.MenuItem(lambda item: self.route_stats_text('volcengine'), None, enabled=False),
+                        pystray.MenuItem(lambda item: self.route_stats_text('tencent'), None, enabled=False)
+                    )
+                ),
                 pystray.Menu.SEPARATOR,
                 pystray.MenuItem(
                     "退出",
@@ -154,96 +177,340 @@ class CapsWriterSingle:
             if config_manager.update_asr_service(service):
                 print(f"ASR服务已切换为: {service.upper()}")
                 
-                # 重新加载ASR配置
-                from util.asr_manager import asr_manager
+                # 后台构建并预热新客户端，完成后原子替换，进行中的识别不受影响
                 asr_manager.reload_config()
-                print("配置已立即生效，无需重启程序")
+                print("新客户端预热完成后自动生效，无需重启程序")
             else:
                 print("更新配置失败")
                 
         except Exception as e:
             print(f"切换ASR服务失败: {e}")
 
-    def start_audio_recording(self, audio_file):
-        """开始音频录制"""
+    def toggle_auto_route(self):
+        """切换自适应路由（需要同时保持两个服务的客户端）"""
+        ClientConfig.auto_route = not ClientConfig.auto_route
+        print(f"自适应路由已{'启用' if ClientConfig.auto_route else '关闭'}")
+        asr_manager.reload_config()
+
+    def route_decision_text(self):
+        """托盘菜单：最近一次路由决策"""
+        _, decision = asr_manager.get_route_stats()
+        if not decision:
+            return "最近路由: 无"
+        service, reason = decision
+        return f"最近路由: {service}（{reason}）"
+
+    def route_stats_text(self, service):
+        """托盘菜单：单个服务的延迟、错误率和熔断状态"""
+        stats = asr_manager.get_route_stats()[0][service]
+        states = {'closed': '正常', 'open': '熔断', 'half_open': '探测'}
+        p50 = f"{stats['p50'] * 1000:.0f}ms" if stats['p50'] is not None else '-'
+        return (f"{service}: p50 {p50}，错误率 {stats['error_rate']:.0%}，"
+                f"{states[stats['breaker']]}，已路由 {stats['routed']} 次")
+
+    def refresh_tray_menu(self):
+        """刷新托盘菜单中的动态文本"""
+        if self.system_tray:
+            try:
+                self.system_tray.update_menu()
+            except Exception:
+                pass
+
+    def open_stream_session(self):
+        """按配置创建流式识别会话，不可用时返回None"""
+        if not ClientConfig.streaming:
+            return None
+
         try:
-            audio_recorder.start_recording()
+            session = asr_manager.create_stream_session(
+                rate=audio_recorder.rate,
+                channels=audio_recorder.channels
+            )
+            if session is None:
+                print("当前ASR服务不支持流式识别，使用整段识别")
+            return session
+        except Exception as e:
+            print(f"创建流式识别会话失败，使用整段识别: {e}")
+            return None
 
-            def recording_worker():
-                # 等待录音开始
-                while not cosmic.is_recording():
-                    time.sleep(0.01)
+    def open_speculative_session(self):
+        """按配置创建推测式分段识别会话"""
+        if not ClientConfig.speculative:
+            return None
 
-                # 等待录音结束
-                while cosmic.is_recording():
-                    time.sleep(0.01)
+        from util.speculative_asr import SpeculativeSession
+        return SpeculativeSession(
+            recognize_audio_data,
+            audio_recorder.get_segment_wav_data,
+            lambda: audio_recorder.buffer,
+            rate=audio_recorder.rate,
+            chunk=audio_recorder.chunk,
+            min_segment=ClientConfig.speculative_segment,
+            min_silence=ClientConfig.speculative_silence,
+            silence_rms=ClientConfig.speculative_silence_rms
+        )
+
+    def start_audio_recording(self, audio_file, sequence):
+        """开始音频录制，sequence 为预留的识别序号"""
+        stream_session = None
+        speculative_session = None
+        listener = None
+        try:
+            # 流式模式下边录边传，否则可在停顿处提前识别已录前缀
+            stream_session = self.open_stream_session()
+            if stream_session:
+                listener = stream_session.send_chunk
+            else:
+                speculative_session = self.open_speculative_session()
+                if speculative_session:
+                    listener = speculative_session.on_chunk
+            if listener:
+                audio_recorder.set_chunk_listener(listener)
+
+            # 先取录音序号：若按键在录音器启动前已松开，收尾线程会立即结束这次录音
+            generation = cosmic.generation
+            audio_recorder.start_recording()
 
-                # 停止录音
-                saved_file = audio_recorder.stop_recording(audio_file)
-                
-                # 获取音频数据进行识别
-                if saved_file:
-                    print(f"录音已保存: {saved_file}")
-                    # 使用文件路径识别
-                    recognition_thread = threading.Thread(
-                        target=self.process_recognition,
-                        args=(saved_file, None)
-                    )
-                    recognition_thread.daemon = True
-                    recognition_thread.start()
-                else:
-                    # 获取WAV格式的音频数据
-                    wav_data = audio_recorder.get_wav_data()
-                    if wav_data:
-                        print("使用音频数据进行识别")
-                        # 使用音频数据识别
-                        recognition_thread = threading.Thread(
-                            target=self.process_recognition,
-                            args=(None, wav_data)
-                        )
-                        recognition_thread.daemon = True
-                        recognition_thread.start()
-                    else:
-                        print("未获取到音频数据")
-
-            self.recording_thread = threading.Thread(target=recording_worker)
-            self.recording_thread.daemon = True
-            self.recording_thread.start()
+            self.capture.submit(
+                self.finish_audio_recording,
+                generation, audio_file, sequence, stream_session, speculative_session, listener
+            )
 
         except Exception as e:
             print(f"启动录音失败: {str(e)}")
+            if listener:
+                audio_recorder.clear_chunk_listener(listener)
+            if stream_session:
+                stream_session.close()
+            self.recognitions.skip(sequence)
+
+    def finish_audio_recording(self, generation, audio_file, sequence, stream_session, speculative_session,
+                               listener=None):
+        """
+        等待本次录音结束，按预留的序号提交识别任务（在录音收尾线程中执行）
+
+        停止录音后快捷键线程可能已开始下一次录音，这里只使用 stop_recording 返回的本次缓冲区和响度，
+        也只取消本次设置的音频块回调 listener
+        """
+        job = None
+        payload = None
+        try:
+            # 等待本次录音结束（由松开按键时的 cosmic.stop_recording 唤醒）
+            cosmic.wait_for_stop(generation)
+
+            # 停止录音
+            saved_file, buffer, loudness = audio_recorder.stop_recording(audio_file)
+            if listener:
+                audio_recorder.clear_chunk_listener(listener)
+            if buffer is None:
+                print("未获取到音频数据")
+                if stream_session:
+                    stream_session.close()
+                return
+            duration = buffer.duration()
+
+            if stream_session:
+                # 流式模式：只需发送最后一包并等待结果
+                job = partial(self.run_blocking, self.process_stream_recognition,
+                              stream_session, saved_file, buffer, loudness)
+            elif speculative_session:
+                # 推测式模式：只需识别尚未提交的尾段
+                job = partial(self.run_blocking, self.process_speculative_recognition,
+                              speculative_session, saved_file, loudness)
+            elif saved_file:
+                print(f"录音已保存: {saved_file}")
+                # 使用文件路径识别
+                job = partial(self.process_recognition_async, saved_file, None, duration, loudness)
+                payload = (buffer, duration, loudness)
+            else:
+                # 获取WAV格式的音频数据
+                wav_data = audio_recorder.get_wav_data(buffer)
+                if wav_data:
+                    print("使用音频数据进行识别")
+                    job = partial(self.process_recognition_async, None, wav_data, duration, loudness)
+                    payload = (buffer, duration, loudness)
+                else:
+                    print("未获取到音频数据")
+        except Exception as e:
+            print(f"结束录音失败: {str(e)}")
+        finally:
+            # 每个预留的序号都要提交或跳过，否则后面的结果会一直等待
+            if job:
+                self.recognitions.submit(sequence, job, payload)
+            else:
+                self.recognitions.skip(sequence)
+
+    def start_event_loop(self):
+        """启动识别用的事件循环线程"""
+        self.loop = asyncio.new_event_loop()
+        # 阻塞操作（腾讯云SDK、保存结果、粘贴）在有限大小的线程池中执行
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=4, thread_name_prefix='recognition')
+        )
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+        cosmic.set_loop(self.loop)
+        asr_manager.set_loop(self.loop)
+
+        # 固定数量的识别工作协程，结果按录音顺序保存和粘贴
+        self.recognitions = RecognitionQueue(
+            self.loop,
+            workers=ClientConfig.max_concurrent_recognitions,
+            max_pending=ClientConfig.max_pending_recognitions,
+            deliver=self.handle_recognition_result,
+            cancel_superseded=ClientConfig.cancel_superseded,
+            coalesce=self.coalesce_recordings
+        )
+        self.recognitions.start()
+
+    def stop_event_loop(self):
+        """停止事件循环线程"""
+        if self.recognitions:
+            self.print_queue_stats()
+            try:
+                self.recognitions.close()
+            except Exception as e:
+                print(f"关闭识别队列失败: {e}")
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join(timeout=2.0)
+
+    def print_queue_stats(self):
+        """输出识别队列的积压和排队耗时"""
+        stats = self.recognitions.get_stats()
+        if not stats['submitted']:
+            return
+        wait, hold = stats['wait'], stats['hold']
+        line = (f"识别队列: {stats['submitted']} 次，最大积压 {stats['max_depth']}，"
+                f"积压时开始录音 {stats['backlogged']} 次，合并识别 {stats['coalesced']} 次")
+        if wait['count']:
+            line += (f"，排队 p50 {wait['p50'] * 1000:.0f}ms / p95 {wait['p95'] * 1000:.0f}ms，"
+                     f"等待按序输出 p95 {hold['p95'] * 1000:.0f}ms")
+        print(line)
+
+    def coalesce_recordings(self, recordings):
+        """
+        把积压时排队的多次录音合并为一次识别（识别队列的合并函数）
+
+        Args:
+            recordings: [(录音缓冲区, 时长, 响度)]，按录音顺序
+        """
+        buffers = [buffer for buffer, _, _ in recordings]
+        duration = sum(duration for _, duration, _ in recordings)
+        # 响度取峰值最高的一次录音
+        loudness = max((loudness for _, _, loudness in recordings if loudness and loudness['peak_dbfs'] is not None),
+                       key=lambda loudness: loudness['peak_dbfs'], default=None)
+
+        async def job():
+            wav_data = await self.run_blocking(audio_recorder.get_merged_wav_data, buffers)
+            return await self.process_recognition_async(None, wav_data, duration, loudness)
+
+        return job
+
+    async def run_blocking(self, func, *args):
+        """在线程池中执行阻塞的识别流程"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def handle_recognition_result(self, source, result, duration=None, loudness=None):
+        """保存识别结果并自动粘贴（由识别队列按录音顺序调用）"""
+        if result:
+            print(f"识别结果: {result}")
+            save_recognition_result(source, result, duration=duration, loudness=loudness)
+            print("识别完成，系统已准备下次录音")
+        else:
+            print("识别失败：未获取到有效结果")
+            print("系统已准备下次录音")
+        self.refresh_tray_menu()
+
+    def process_stream_recognition(self, stream_session, saved_file, buffer, loudness=None):
+        """
+        完成流式识别，失败时回退到整段识别
+
+        Returns:
+            tuple: handle_recognition_result 的参数，识别出错时返回None
+        """
+        try:
+            start = time.time()
+            result = stream_session.finish()
+            print(f"流式识别完成，松开后等待: {(time.time() - start) * 1000:.0f}ms，"
+                  f"已推送 {stream_session.bytes_sent} 字节")
+        except Exception as e:
+            print(f"流式识别失败，回退到整段识别: {e}")
+            if saved_file:
+                return self.process_recognition(saved_file, None, buffer.duration(), loudness)
+            return self.process_recognition(None, audio_recorder.get_wav_data(buffer), buffer.duration(), loudness)
+
+        return saved_file or "audio_stream", result, buffer.duration(), loudness
 
-    def process_recognition(self, audio_file, audio_data):
-        """处理语音识别"""
+    def process_speculative_recognition(self, speculative_session, saved_file, loudness=None):
+        """完成推测式分段识别并拼接结果，返回值同 process_stream_recognition"""
+        try:
+            result, stats = speculative_session.finish()
+            print(f"预识别 {stats['pre_recognized_seconds']:.1f}s / {stats['total_seconds']:.1f}s"
+                  f"（{stats['segments']} 段），松开后等待: {stats['finish_ms']:.0f}ms")
+        except Exception as e:
+            print(f"识别过程出错: {str(e)}")
+            print("系统已准备下次录音")
+            return None
+
+        return saved_file or "audio_data", result, stats['total_seconds'], loudness
+
+    def process_recognition(self, audio_file, audio_data, duration=None, loudness=None):
+        """处理语音识别（同步，用于流式识别失败后的回退），返回值同 process_stream_recognition"""
         try:
             if audio_file:
                 print(f"开始识别音频文件: {audio_file}")
                 # 使用文件识别
-                from util.asr_manager import recognize_audio
                 result = recognize_audio(audio_file)
                 source = audio_file
             elif audio_data:
                 print("开始识别音频数据")
                 # 使用音频数据识别
-                from util.asr_manager import recognize_audio_data
                 result = recognize_audio_data(audio_data)
                 source = "audio_data"
             else:
                 print("无效的音频数据")
-                return
+                return None
+
+            return source, result, duration, loudness
 
-            if result:
-                print(f"识别结果: {result}")
-                # 保存结果并自动粘贴
-                save_recognition_result(source, result)
-                print("识别完成，系统已准备下次录音")
+        except Exception as e:
+            print(f"识别过程出错: {str(e)}")
+            print("系统已准备下次录音")
+            return None
+
+    async def process_recognition_async(self, audio_file, audio_data, duration=None, loudness=None):
+        """处理语音识别（由识别队列的工作协程执行），返回值同 process_stream_recognition"""
+        loop = asyncio.get_running_loop()
+        try:
+            if audio_file:
+                print(f"开始识别音频文件: {audio_file}")
+                # 使用文件识别
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(None, recognize_audio, audio_file),
+                    timeout=ClientConfig.recognition_timeout
+                )
+                source = audio_file
+            elif audio_data:
+                print("开始识别音频数据")
+                # 使用音频数据识别
+                result = await asr_manager.recognize_audio_data_async(audio_data)
+                source = "audio_data"
             else:
-                print("识别失败：未获取到有效结果")
-                print("系统已准备下次录音")
+                print("无效的音频数据")
+                return None
 
+            return source, result, duration, loudness
+
+        except asyncio.TimeoutError:
+            print(f"识别超时（{ClientConfig.recognition_timeout}秒）")
+            print("系统已准备下次录音")
         except Exception as e:
             print(f"识别过程出错: {str(e)}")
             print("系统已准备下次录音")
+        return None
 
     def start(self):
         """启动应用"""
@@ -255,8 +522,19 @@ class CapsWriterSingle:
         self.running = True
         self.setup_signal_handlers()
 
-        # 设置事件循环
-        cosmic.set_loop(asyncio.new_event_loop())
+        # 启动事件循环线程
+        self.start_event_loop()
+
+        # 提前创建隐藏的波形窗口，按住快捷键时只需显示
+        if ClientConfig.show_waveform:
+            start_waveform()
+
+        # 常开麦克风模式：提前打开输入流
+        if ClientConfig.warm_stream:
+            try:
+                audio_recorder.open_warm_stream()
+            except Exception as e:
+                print(f"打开常开输入流失败，改为每次录音打开设备: {e}")
 
         try:
             # 启动系统托盘
@@ -271,9 +549,10 @@ class CapsWriterSingle:
             print("CapsWriter已就绪，按下快捷键开始录音")
             print("按Ctrl+C退出或右键托盘图标选择退出")
 
-            # 保持运行
-            while self.running:
-                time.sleep(1)
+            # 等待退出（Windows下无超时的等待不能被Ctrl+C打断，保留低频唤醒）
+            timeout = 1 if os.name == 'nt' else None
+            while not self.stopped.wait(timeout):
+                pass
 
         except KeyboardInterrupt:
             print("\n用户中断")
@@ -294,11 +573,19 @@ class CapsWriterSingle:
                 self.app = app
 
             def launch_recording(self):
-                """启动录音"""
+                """启动录音（识别积压时照常录音，在波形窗口提示结果会延后并可能合并识别）"""
+                depth = self.app.recognitions.depth()
+                sequence, backlogged = self.app.recognitions.reserve()
+                if backlogged:
+                    print(f"还有 {depth} 次识别结果未输出，本次结果会延后粘贴，并可能与排队的录音合并识别")
+                if ClientConfig.show_waveform:
+                    set_waveform_notice(f"前面还有 {depth} 条识别结果，本次会延后并合并识别" if backlogged else '')
                 super().launch_recording()
                 audio_file = cosmic.get_audio_file()
                 if audio_file:
-                    self.app.start_audio_recording(audio_file)
+                    self.app.start_audio_recording(audio_file, sequence)
+                else:
+                    self.app.recognitions.skip(sequence)
 
         # 替换键盘处理器
         global keyboard_handler
@@ -311,10 +598,12 @@ class CapsWriterSingle:
 
         print("正在关闭CapsWriter...")
         self.running = False
+        self.stopped.set()
 
         # 停止录音
         if cosmic.is_recording():
             audio_recorder.stop_recording()
+        audio_recorder.close_warm_stream()
 
         # 停止键盘监听
         keyboard_handler.stop()
@@ -322,6 +611,16 @@ class CapsWriterSingle:
         # 停止系统托盘
         self.stop_system_tray()
 
+        # 退出波形界面线程
+        close_waveform()
+
+        # 结束录音收尾线程，停止事件循环
+        self.capture.shutdown(wait=False)
+        self.stop_event_loop()
+
+        # 写完剩余的识别结果
+        result_handler.close()
+
         print("CapsWriter已关闭")
 
 
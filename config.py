@@ -24,6 +24,8 @@ class TencentASRConfig:
     secret_id = os.getenv('TENCENT_SECRET_ID', '')
     secret_key = os.getenv('TENCENT_SECRET_KEY', '')
     region = os.getenv('TENCENT_REGION', 'ap-shanghai')
+    # 接口地址，可指向本地替身服务测试，如 http://127.0.0.1:8802
+    endpoint = os.getenv('TENCENT_ENDPOINT', 'asr.tencentcloudapi.com')
 
 
 # 创建全局配置实例
@@ -37,6 +39,16 @@ class VolcengineASRConfig:
     app_id = os.getenv('VOLCENGINE_APP_ID', '7262428661')
     access_key = os.getenv('VOLCENGINE_ACCESS_KEY', '-KqMDs8LhnRInYaTAjMr8BOyY-RqUQnx')
 
+    # 识别接口地址，可指向本地替身服务测试，如 http://127.0.0.1:8801/
+    base_url = os.getenv('VOLCENGINE_URL', 'https://openspeech.bytedance.com/api/v3/auc/bigmodel/recognize/flash')
+
+    # HTTP连接池配置
+    pool_maxsize       = 4      # 连接池最大连接数
+    keepalive_interval = 25     # 空闲保活间隔（秒），0 表示不保活，避免服务端关闭空闲连接
+
+    # 流式识别地址（可改为本地替身服务 ws://127.0.0.1:8765 离线测试）
+    stream_url = os.getenv('VOLCENGINE_STREAM_URL', 'wss://openspeech.bytedance.com/api/v3/sauc/bigmodel_nostream')
+
 
 # ASR服务选择配置
 class ASRConfig:
@@ -64,15 +76,77 @@ class ClientConfig:
     threshold    = 0.5          # 按下快捷键后，触发语音识别的时间阈值
     paste        = True         # 是否以写入剪切板然后模拟 Ctrl-V 粘贴的方式输出结果
     restore_clip = True         # 模拟粘贴后是否恢复剪贴板
+    restore_clip_delay = 0.3    # 最后一次粘贴后多久恢复剪贴板（秒，且等到粘贴完成），期间的连续粘贴共用一次保存和恢复
+    type_max_chars = 0          # 不超过该字数的单行结果直接模拟键入，不经过剪贴板（0为关闭；
+                                # 英文字母按键会受 CapsLock 和输入法状态影响，中文不受影响）
+
+    # 常开麦克风：输入流保持打开并缓存最近的音频，按下快捷键前的声音也会录入，
+    # 避免每次录音打开设备丢失开头的语音（系统会一直显示麦克风占用）
+    warm_stream = False
+    preroll     = 0.3           # 录音包含按下快捷键前的时长（秒）
 
     save_audio = False           # 是否保存录音文件
+    save_history = True          # 是否把识别结果写入历史库（results/history.db，可用 python -m util.history_store 检索）
+
+    # 识别请求
+    recognition_timeout        = 30     # 单次识别超时（秒）
+    max_concurrent_recognitions = 2     # 同时进行的识别请求数上限（识别队列的工作协程数）
+    max_pending_recognitions   = 4      # 结果尚未输出的录音数达到该值后，新录音并入前一个尚未开始识别的录音一起识别（排队任务数有上限，结果按录音顺序粘贴）
+    cancel_superseded          = False  # 新录音开始识别时，取消仍未完成的上一次识别（其结果将被丢弃）
+
+    # 对冲请求：主服务在延迟阈值内未返回时，同时向另一个服务发送请求，取先返回的结果
+    hedge               = False
+    hedge_percentile    = 95     # 以主服务该分位数的历史延迟作为对冲阈值
+    hedge_min_delay     = 0.3    # 对冲阈值下限（秒）
+    hedge_default_delay = 1.5    # 样本不足时的对冲阈值（秒）
+    hedge_min_samples   = 20     # 使用历史分位数所需的最少样本数
+
+    # 自适应路由：同时保持两个服务，每次识别选择近期延迟最低的健康服务，失败时改用另一个服务
+    auto_route               = False
+    route_min_samples        = 5      # 参与延迟比较所需的最少样本数
+    route_explore_ratio      = 0.05   # 随机探索另一个服务的比例，保持其延迟统计新鲜
+    route_max_error_rate     = 0.5    # 近期错误率超过该值的服务不参与路由
+    route_failure_threshold  = 3      # 连续失败多少次后熔断
+    route_cooldown           = 30     # 熔断后多久放行一次探测请求（秒）
+
+    # 长音频：超过该时长的录音在静音处分段并行识别（腾讯云一句话识别限60秒，
+    # 强制切分的分段两侧各有1秒重叠，分段最长为该值+2秒）
+    long_audio_chunk   = 55
+    long_audio_workers = 4      # 并行识别的分段数
+
+    # 识别结果缓存：相同音频（按PCM内容哈希）直接返回缓存结果，不再请求接口
+    # 只用于文件和批量识别（重复识别同一文件），实时听写的音频不会重复，不经过缓存
+    result_cache                = False
+    result_cache_memory_entries = 256               # 内存缓存条目数
+    result_cache_disk_entries   = 10000             # 磁盘缓存条目数（cache/results.db）
+    result_cache_ttl            = 7 * 24 * 3600     # 过期时间（秒）
+
+    # 上传编码：'auto' 按服务自动选择（腾讯云使用FLAC），或 'wav' / 'flac' / 'opus'
+    # 服务不支持或未安装 soundfile 时回退到 WAV
+    audio_codec = 'auto'
+    streaming  = False           # 流式识别模式：按住时边录边传，松开后只等待最终结果（仅火山引擎）
+
+    # 推测式分段识别：长录音在停顿处提前识别已录部分，松开后只识别尾段（流式模式开启时不生效）
+    speculative             = False
+    speculative_segment     = 3.0    # 分段最短时长（秒）
+    speculative_silence     = 0.4    # 视为停顿的静音时长（秒）
+    speculative_silence_rms = 300    # 静音判定的RMS阈值
     
+    # 静音裁剪：上传前去掉首尾静音并压缩过长停顿，减少上传数据量（有损，仅影响上传数据，不影响保存的录音文件；
+    # 阈值不合适时可能裁掉轻声的开头或结尾，默认关闭）
+    vad_trim      = False
+    vad_threshold = 300          # 判定为语音的RMS阈值
+    vad_padding   = 0.2          # 语音段前后保留的静音时长（秒）
+    vad_max_pause = 0.6          # 句中停顿最长保留时长（秒）
+
     # 波形显示配置
     show_waveform = True         # 是否显示波形动画
+    level_update_rate = 30       # 波形电平更新频率（次/秒），与录音块大小无关
 
 
 # 项目路径配置
 class ProjectPaths:
     base_dir = Path(__file__).parent
     recordings_dir = base_dir / 'recordings'
-    results_dir = base_dir / 'results'
\ No newline at end of file
+    results_dir = base_dir / 'results'
+    cache_dir = base_dir / 'cache'
\ No newline at end of file
@@ -2,80 +2,577 @@
 ASR服务管理器 - 统一管理腾讯ASR和火山引擎ASR
 """
 
+import asyncio
 import os
-from config import asr_config, tencent_asr_config, volcengine_asr_config
+import threading
+import time
+from config import ClientConfig, ProjectPaths, asr_config, tencent_asr_config, volcengine_asr_config
+from util.async_asr import create_async_client
+from util.audio_codec import encode_audio
+from util.backend_router import BackendRouter
+from util.latency import LatencyHistogram
+from util.long_audio import file_duration, map_file, transcribe_file, transcribe_wav_data, wav_duration
+from util.rate_limiter import RateLimiter
+from util.result_cache import ResultCache, audio_digest
 from util.volcengine_asr import VolcengineASRClient
 
 
+class ClientSet:
+    """
+    一组已初始化的客户端（不可变快照）
+
+    切换服务时构造新的ClientSet并通过一次引用赋值发布；识别请求开始时取一次引用，
+    全程使用同一组客户端。被替换的ClientSet在进行中的请求全部结束后才释放连接。
+    """
+    
+    def __init__(self, service_type, clients, async_clients):
+        self.service_type = service_type
+        self.clients = clients              # 服务类型 -> 同步客户端
+        self.async_clients = async_clients  # 服务类型 -> 异步客户端
+        self.client = clients.get(service_type)
+        self.async_client = async_clients.get(service_type)
+        self.inflight = 0
+        self.retired = False
+        self.on_drained = None
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        登记一个进行中的请求
+
+        Returns:
+            bool: 是否登记成功，已被替换（retire）时返回False，调用方应重新读取当前快照
+        """
+        with self.lock:
+            if self.retired:
+                return False
+            self.inflight += 1
+            return True
+    
+    def release(self):
+        with self.lock:
+            self.inflight -= 1
+            drained = self.retired and self.inflight == 0
+        if drained:
+            self.on_drained()
+    
+    def retire(self, on_drained):
+        """停止接收新请求，进行中的请求结束后调用on_drained"""
+        with self.lock:
+            self.on_drained = on_drained
+            self.retired = True
+            drained = self.inflight == 0
+        if drained:
+            on_drained()
+
+
 class ASRManager:
     """ASR服务管理器"""
     
+    SERVICES = ('volcengine', 'tencent')
+    
     def __init__(self):
-        self.service_type = None
-        self.client = None
-        self._init_client()
+        self.latency = {service: LatencyHistogram() for service in self.SERVICES}
+        self.router = BackendRouter(
+            self.latency,
+            min_samples=ClientConfig.route_min_samples,
+            explore_ratio=ClientConfig.route_explore_ratio,
+            failure_threshold=ClientConfig.route_failure_threshold,
+            cooldown=ClientConfig.route_cooldown,
+            max_error_rate=ClientConfig.route_max_error_rate
+        )
+        self.cache = None
+        if ClientConfig.result_cache:
+            self.cache = ResultCache(
+                ProjectPaths.cache_dir / 'results.db',
+                memory_entries=ClientConfig.result_cache_memory_entries,
+                disk_entries=ClientConfig.result_cache_disk_entries,
+                ttl=ClientConfig.result_cache_ttl
+            )
+        self.rate_limiters = {}  # 服务类型 -> RateLimiter，为空时不限速
+        self.loop = None
+        self._semaphore = None
+        self._swap_lock = threading.Lock()  # 串行化客户端构建，不在识别路径上
+        self.active = ClientSet(None, {}, {})
+        self._swap(self._build_client_set())
+    
+    # 以下属性都读取同一个快照；需要前后一致时应先取 self.active
+    @property
+    def service_type(self):
+        return self.active.service_type
     
-    def reload_config(self):
-        """重新加载配置并重创建客户端"""
-        import os
-        from importlib import reload
-        import sys
+    @property
+    def client(self):
+        return self.active.client
+    
+    @property
+    def async_client(self):
+        return self.active.async_client
+    
+    @property
+    def clients(self):
+        return self.active.clients
+    
+    @property
+    def async_clients(self):
+        return self.active.async_clients
+    
+    def set_loop(self, loop):
+        """设置运行异步识别的事件循环，并在其上预热异步客户端"""
+        self.loop = loop
+        self._semaphore = None
+        for async_client in self.active.async_clients.values():
+            asyncio.run_coroutine_threadsafe(async_client.warm_up(), loop)
+    
+    def reload_config(self, wait=False):
+        """
+        按当前配置（ASR_SERVICE等）在后台构建并预热新客户端，完成后原子替换；
+        进行中的识别继续使用旧客户端直到结束
         
-        # 重新加载配置模块
-        if 'config' in sys.modules:
-            reload(sys.modules['config'])
+        Args:
+            wait: 是否等待切换完成
+        """
+        def worker():
+            with self._swap_lock:
+                try:
+                    self._swap(self._build_client_set())
+                except Exception as e:
+                    print(f"切换ASR客户端失败，继续使用当前客户端: {e}")
         
-        # 重新初始化
-        self._init_client()
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return thread
     
-    def _init_client(self):
-        """初始化ASR客户端"""
+    def _create_client(self, service):
+        """创建指定服务的ASR客户端，失败返回None"""
         try:
-            # 获取当前配置
-            current_service = os.getenv('ASR_SERVICE', 'volcengine')
-            self.service_type = current_service
-            
-            if self.service_type == 'volcengine':
-                self.client = VolcengineASRClient(
+            if service == 'volcengine':
+                client = VolcengineASRClient(
                     volcengine_asr_config.app_id,
-                    volcengine_asr_config.access_key
+                    volcengine_asr_config.access_key,
+                    pool_maxsize=volcengine_asr_config.pool_maxsize,
+                    keepalive_interval=volcengine_asr_config.keepalive_interval,
+                    base_url=volcengine_asr_config.base_url
                 )
+                # 启动时预热连接池
+                client.warm_up()
                 print(f"已启用火山引擎ASR服务")
+                return client
             else:  # tencent
                 # 重新创建腾讯ASR客户端
                 from util.tencent_asr import TencentASRClient
-                self.client = TencentASRClient()
-                if self.client and hasattr(self.client, 'client') and self.client.client:
+                client = TencentASRClient()
+                if client and hasattr(client, 'client') and client.client:
                     print(f"已启用腾讯云ASR服务")
-                else:
-                    print(f"腾讯云ASR客户端初始化失败，请检查配置")
-                    self.client = None
+                    return client
+                print(f"腾讯云ASR客户端初始化失败，请检查配置")
+                return None
                 
         except Exception as e:
             print(f"ASR客户端初始化失败: {e}")
-            self.client = None
+            return None
+    
+    def _build_client_set(self):
+        """构建新的客户端组，已有的同服务客户端直接复用；对冲或自适应路由模式下同时保持两个服务"""
+        current = self.active
+        current_service = os.getenv('ASR_SERVICE', 'volcengine')
+        services = [current_service]
+        if ClientConfig.hedge or ClientConfig.auto_route:
+            services += [service for service in self.SERVICES if service != current_service]
+        
+        clients = {}
+        async_clients = {}
+        warm_ups = []
+        for service in services:
+            if service in current.clients:
+                clients[service] = current.clients[service]
+                async_clients[service] = current.async_clients[service]
+                continue
+            
+            client = self._create_client(service)
+            if client is None:
+                continue
+            clients[service] = client
+            # 创建对应的异步客户端
+            async_clients[service] = create_async_client(
+                service,
+                client,
+                pool_maxsize=volcengine_asr_config.pool_maxsize,
+                keepalive_interval=volcengine_asr_config.keepalive_interval,
+                timeout=ClientConfig.recognition_timeout
+            )
+            if self.loop:
+                warm_ups.append(asyncio.run_coroutine_threadsafe(async_clients[service].warm_up(), self.loop))
+        
+        # 发布前等待异步客户端预热完成
+        for future in warm_ups:
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass
+        
+        if current_service not in clients and current.client is not None:
+            raise Exception(f"{current_service} 客户端初始化失败")
+        return ClientSet(current_service, clients, async_clients)
+    
+    def _swap(self, client_set):
+        """发布新的客户端组，旧客户端组在请求排空后释放未被复用的客户端"""
+        old = self.active
+        self.active = client_set
+        
+        kept = set(map(id, client_set.clients.values())) | set(map(id, client_set.async_clients.values()))
+        old_clients = [client for client in old.clients.values() if id(client) not in kept]
+        old_async_clients = [client for client in old.async_clients.values() if id(client) not in kept]
+        
+        def close_old():
+            # 释放旧客户端的连接池
+            for old_client in old_clients:
+                if hasattr(old_client, 'close'):
+                    old_client.close()
+            if self.loop:
+                for old_async_client in old_async_clients:
+                    asyncio.run_coroutine_threadsafe(old_async_client.close(), self.loop)
+        
+        old.retire(close_old)
+    
+    def acquire_active(self):
+        """
+        取当前客户端组并登记一个进行中的请求（请求结束后调用其 release）
+
+        读取引用和登记之间可能恰好发生切换，旧客户端组已退役并关闭连接；
+        此时登记失败，重新读取（_swap 先发布新组再退役旧组，重试必然取到新组）
+        """
+        while True:
+            active = self.active
+            if active.acquire():
+                return active
+    
+    def get_pool_stats(self):
+        """获取当前客户端的连接池统计"""
+        client = self.client
+        if client and hasattr(client, 'get_pool_stats'):
+            return client.get_pool_stats()
+        return None
+    
+    def supports_streaming(self):
+        """当前服务是否支持流式识别"""
+        active = self.active
+        return active.client is not None and active.service_type == 'volcengine'
+    
+    def create_stream_session(self, rate=16000, bits=16, channels=1):
+        """创建流式识别会话，不支持时返回None"""
+        if not self.supports_streaming():
+            return None
+        
+        from util.streaming_asr import VolcengineStreamingClient
+        stream_client = VolcengineStreamingClient(
+            volcengine_asr_config.app_id,
+            volcengine_asr_config.access_key,
+            volcengine_asr_config.stream_url
+        )
+        return stream_client.create_session(rate=rate, bits=bits, channels=channels)
     
     def recognize_audio_file(self, audio_file_path):
         """识别音频文件"""
-        if not self.client:
-            raise Exception("ASR客户端未初始化")
+        active = self.acquire_active()
+        try:
+            client = active.client
+            if not client:
+                raise Exception("ASR客户端未初始化")
+            
+            digest = None
+            if self.cache:
+                # 内存映射读取，长文件也不整体读入内存
+                with map_file(audio_file_path) as mm:
+                    digest, text = self._cached(active, mm)
+                if text is not None:
+                    return text
+            
+            if file_duration(audio_file_path) > ClientConfig.long_audio_chunk:
+                # 超过单次识别时长限制：在静音处分段并行识别
+                text, stats = transcribe_file(
+                    audio_file_path, self._recognize_short,
+                    workers=ClientConfig.long_audio_workers, max_chunk=ClientConfig.long_audio_chunk
+                )
+                print(f"长音频分段识别: {stats['audio_seconds']:.1f}秒，{stats['chunks']} 段，"
+                      f"耗时 {stats['elapsed']:.1f}s")
+            elif active.service_type == 'volcengine':
+                self._throttle(active.service_type)
+                result = client.recognize_audio_file(audio_file_path)
+                text = client.get_text_result(result)
+            else:  # tencent
+                self._throttle(active.service_type)
+                text = client.recognize_audio_file(audio_file_path)
+            self._store(digest, active.service_type, client, text)
+            return text
+        finally:
+            active.release()
+    
+    def set_rate_limit(self, rate):
+        """
+        按服务限速（批量转写时使用）：长音频的每个分段、路由或对冲到其他服务的请求
+        都按实际收到请求的服务计数
+
+        Args:
+            rate: 每个服务每秒最多请求数，0 表示不限速
+        """
+        self.rate_limiters = {service: RateLimiter(rate) for service in self.SERVICES} if rate else {}
+    
+    def _throttle(self, service):
+        """向服务发出请求前按限速等待"""
+        limiter = self.rate_limiters.get(service)
+        if limiter:
+            limiter.acquire()
+    
+    def _cached(self, active, audio_data):
+        """
+        查找识别缓存，依次查当前服务和其他已启用的服务
+        
+        Returns:
+            (音频哈希, 缓存结果或None)
+        """
+        digest = audio_digest(audio_data)
+        services = [active.service_type] + [s for s in active.clients if s != active.service_type]
+        candidates = [
+            (service, getattr(active.clients[service], 'model', ''))
+            for service in services if service in active.clients
+        ]
+        service, text = self.cache.lookup(digest, candidates)
+        if text is not None:
+            print(f"命中识别缓存（{service}），跳过接口请求")
+        return digest, text
+    
+    def _store(self, digest, service, client, text):
+        """写入识别缓存"""
+        if self.cache and digest:
+            self.cache.put(ResultCache.make_key(digest, service, getattr(client, 'model', '')), text)
+    
+    def get_cache_stats(self):
+        """获取识别缓存的命中统计"""
+        return self.cache.get_stats() if self.cache else None
+    
+    def _encode(self, audio_data, service_type):
+        """按服务压缩音频"""
+        audio_data, audio_format, stats = encode_audio(
+            audio_data, service_type, ClientConfig.audio_codec
+        )
+        if stats['codec'] != 'wav':
+            print(f"音频已编码为{stats['codec']}: {stats['original_bytes']} -> "
+                  f"{stats['encoded_bytes']} 字节，耗时 {stats['encode_ms']:.1f}ms")
+        return audio_data, audio_format
+    
+    def _recognize_sync(self, service_type, client, audio_data, digest=None):
+        """用指定服务同步识别，记录延迟和成败，结果写入缓存"""
+        audio_data, audio_format = self._encode(audio_data, service_type)
+        self._throttle(service_type)
+        
+        start = time.perf_counter()
+        try:
+            result = client.recognize_audio_data(audio_data, audio_format)
+        except Exception:
+            self.router.record_failure(service_type)
+            raise
+        self.latency[service_type].record(time.perf_counter() - start)
+        self.router.record_success(service_type)
         
-        if self.service_type == 'volcengine':
-            result = self.client.recognize_audio_file(audio_file_path)
-            return self.client.get_text_result(result)
-        else:  # tencent
-            return self.client.recognize_audio_file(audio_file_path)
+        if service_type == 'volcengine':
+            result = client.get_text_result(result)
+        self._store(digest, service_type, client, result)
+        return result
     
     def recognize_audio_data(self, audio_data):
-        """识别音频数据"""
-        if not self.client:
+        """识别音频数据（WAV），按服务压缩后上传；超过单次识别时长限制时分段识别"""
+        if wav_duration(audio_data) > ClientConfig.long_audio_chunk:
+            text, stats = transcribe_wav_data(
+                audio_data, self._recognize_short,
+                workers=ClientConfig.long_audio_workers, max_chunk=ClientConfig.long_audio_chunk
+            )
+            print(f"长音频分段识别: {stats['audio_seconds']:.1f}秒，{stats['chunks']} 段，"
+                  f"耗时 {stats['elapsed']:.1f}s")
+            return text
+        return self._recognize_short(audio_data)
+    
+    def _recognize_short(self, audio_data):
+        """识别单段音频数据；自适应路由模式下选择最快的健康服务"""
+        active = self.acquire_active()
+        try:
+            if active.service_type not in active.clients:
+                raise Exception("ASR客户端未初始化")
+            digest = None
+            if self.cache:
+                digest, text = self._cached(active, audio_data)
+                if text is not None:
+                    return text
+            return self._recognize_data_with(active.clients, active.service_type, audio_data, digest)
+        finally:
+            active.release()
+    
+    def _recognize_data_with(self, clients, service_type, audio_data, digest=None):
+        if not (ClientConfig.auto_route and len(clients) > 1):
+            return self._recognize_sync(service_type, clients[service_type], audio_data, digest)
+        
+        tried = []
+        while True:
+            candidates = [service for service in clients if service not in tried]
+            service = self.router.choose(candidates, service_type)
+            tried.append(service)
+            try:
+                return self._recognize_sync(service, clients[service], audio_data, digest)
+            except Exception as e:
+                if len(tried) == len(clients):
+                    raise
+                print(f"{service} 识别失败: {e}，改用其他服务")
+    
+    def get_route_stats(self):
+        """获取路由统计和最近一次路由决策"""
+        return self.router.get_stats(), self.router.last_decision
+    
+    def get_latency_stats(self):
+        """获取各服务的延迟分位数"""
+        return {service: histogram.snapshot() for service, histogram in self.latency.items()}
+    
+    def hedge_delay(self, service):
+        """对冲阈值：主服务历史延迟的分位数，样本不足时使用默认值"""
+        histogram = self.latency[service]
+        if histogram.count() < ClientConfig.hedge_min_samples:
+            return ClientConfig.hedge_default_delay
+        delay = histogram.percentile(ClientConfig.hedge_percentile)
+        return max(ClientConfig.hedge_min_delay, delay)
+    
+    async def _recognize_with(self, service, client, async_client, audio_data, digest=None):
+        """用指定服务识别并记录延迟，结果写入缓存"""
+        loop = asyncio.get_running_loop()
+        try:
+            audio_data, audio_format = await loop.run_in_executor(
+                None, self._encode, audio_data, service
+            )
+            limiter = self.rate_limiters.get(service)
+            if limiter:
+                await limiter.acquire_async()
+        except BaseException:
+            # 请求没有发出，熔断探测不算用掉
+            self.router.record_release(service)
+            raise
+        
+        start = time.perf_counter()
+        try:
+            result = await async_client.recognize_audio_data(audio_data, audio_format)
+        except asyncio.CancelledError:
+            # 被对冲取消的慢请求也计入（已耗时是实际延迟的下限），避免分位数只反映快请求；
+            # 被取消的熔断探测没有结果，放行下一次探测
+            self.latency[service].record(time.perf_counter() - start)
+            self.router.record_release(service)
+            raise
+        except Exception:
+            self.router.record_failure(service)
+            raise
+        self.latency[service].record(time.perf_counter() - start)
+        self.router.record_success(service)
+        
+        if service == 'volcengine':
+            result = client.get_text_result(result)
+        self._store(digest, service, client, result)
+        return result
+    
+    async def _recognize_hedged(self, audio_data, primary, secondary, clients, async_clients, digest=None):
+        """先请求主服务，超过对冲阈值仍未返回时再请求备用服务，取先成功的结果"""
+        tasks = {
+            asyncio.ensure_future(self._recognize_with(
+                primary, clients[primary], async_clients[primary], audio_data, digest
+            )): primary
+        }
+        try:
+            delay = self.hedge_delay(primary)
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            
+            # 主服务在阈值内成功返回
+            for task in done:
+                if not task.exception():
+                    return task.result()
+            error = next((task.exception() for task in done), None)
+            
+            print(f"{primary} {delay:.2f}s 内未返回结果，对冲请求 {secondary}")
+            tasks[asyncio.ensure_future(self._recognize_with(
+                secondary, clients[secondary], async_clients[secondary], audio_data, digest
+            ))] = secondary
+            
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception():
+                        error = task.exception()
+                        continue
+                    if tasks[task] != primary:
+                        print(f"采用对冲服务 {tasks[task]} 的结果")
+                    return task.result()
+            raise error
+        finally:
+            # 取消仍未完成的请求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _recognize_routed(self, audio_data, preferred, clients, async_clients, digest=None):
+        """按路由选择服务识别，失败或超时时改用其他服务"""
+        tried = []
+        while True:
+            candidates = [service for service in async_clients if service not in tried]
+            service = self.router.choose(candidates, preferred)
+            tried.append(service)
+            try:
+                return await asyncio.wait_for(
+                    self._recognize_with(service, clients[service], async_clients[service], audio_data, digest),
+                    timeout=ClientConfig.recognition_timeout
+                )
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.router.record_failure(service)
+                if len(tried) == len(async_clients):
+                    raise
+                print(f"{service} 识别失败: {e!r}，改用其他服务")
+    
+    async def recognize_audio_data_async(self, audio_data):
+        """异步识别音频数据，受并发数和超时限制；对冲或自适应路由模式下使用两个服务"""
+        if wav_duration(audio_data) > ClientConfig.long_audio_chunk:
+            # 长音频在线程池中分段识别，各段并行请求
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.recognize_audio_data, audio_data)
+        
+        # 取一次引用，识别全程使用同一组客户端；切换服务时旧客户端等本次识别结束后才释放
+        active = self.acquire_active()
+        try:
+            return await self._recognize_async_with(active, audio_data)
+        finally:
+            active.release()
+    
+    async def _recognize_async_with(self, active, audio_data):
+        clients, async_clients, service_type = active.clients, active.async_clients, active.service_type
+        if service_type not in async_clients:
             raise Exception("ASR客户端未初始化")
         
-        if self.service_type == 'volcengine':
-            result = self.client.recognize_audio_data(audio_data)
-            return self.client.get_text_result(result)
-        else:  # tencent
-            return self.client.recognize_audio_data(audio_data)
+        # 实时听写的音频不会重复，不查询也不写入结果缓存（缓存只用于文件和批量识别）
+        digest = None
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(ClientConfig.max_concurrent_recognitions)
+        
+        secondary = next((service for service in async_clients if service != service_type), None)
+        async with self._semaphore:
+            if ClientConfig.auto_route and secondary:
+                # 每次尝试各自限时
+                return await self._recognize_routed(audio_data, service_type, clients, async_clients, digest)
+            if ClientConfig.hedge and secondary:
+                recognition = self._recognize_hedged(
+                    audio_data, service_type, secondary, clients, async_clients, digest
+                )
+            else:
+                recognition = self._recognize_with(
+                    service_type, clients[service_type], async_clients[service_type], audio_data, digest
+                )
+            return await asyncio.wait_for(recognition, timeout=ClientConfig.recognition_timeout)
 
 
 # 全局ASR管理器实例
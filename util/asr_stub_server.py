@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+ASR本地替身服务 - 模拟火山引擎极速版和腾讯云一句话识别的HTTP接口，
+可配置延迟和慢请求比例，用于离线测试对冲请求、路由等逻辑
+
+用法:
+    python -m util.asr_stub_server --backend volcengine --port 8801 --latency 0.3
+    python -m util.asr_stub_server --backend tencent --port 8802 --slow-ratio 0.1 --slow-latency 3
+然后在 .env 中设置:
+    VOLCENGINE_URL=http://127.0.0.1:8801/
+    TENCENT_ENDPOINT=http://127.0.0.1:8802
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ASRStubServer:
+    """ASR替身服务"""
+
+    def __init__(self, backend='volcengine', host='127.0.0.1', port=8801, text=None,
+                 latency=0.2, slow_ratio=0.0, slow_latency=3.0, error_ratio=0.0):
+        """
+        Args:
+            backend: 'volcengine' 或 'tencent'
+            host/port: 监听地址
+            text: 固定返回的识别文本，为空时返回后端名和请求序号
+            latency: 正常响应延迟（秒）
+            slow_ratio: 慢响应比例
+            slow_latency: 慢响应延迟（秒）
+            error_ratio: 返回错误的比例
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.text = text
+        self.latency = latency
+        self.slow_ratio = slow_ratio
+        self.slow_latency = slow_latency
+        self.error_ratio = error_ratio
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def _next_text(self):
+        with self.lock:
+            self.requests += 1
+            index = self.requests
+        if self.text is not None:
+            return self.text
+        return f"{self.backend}识别结果{index}"
+
+    def _delay(self):
+        if random.random() < self.slow_ratio:
+            time.sleep(self.slow_latency)
+        else:
+            time.sleep(self.latency)
+
+    def _volcengine_response(self, body):
+        if random.random() < self.error_ratio:
+            return 200, {'X-Api-Status-Code': '55000031', 'X-Api-Message': 'stub error'}, {}
+        json.loads(body)
+        return 200, {'X-Api-Status-Code': '20000000'}, {"result": {"text": self._next_text()}}
+
+    def _tencent_response(self, body):
+        request_id = str(uuid.uuid4())
+        if random.random() < self.error_ratio:
+            return 200, {}, {"Response": {
+                "Error": {"Code": "InternalError", "Message": "stub error"},
+                "RequestId": request_id,
+            }}
+        json.loads(body)
+        return 200, {}, {"Response": {
+            "Result": self._next_text(),
+            "AudioDuration": 0,
+            "RequestId": request_id,
+        }}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                stub._delay()
+
+                if stub.backend == 'volcengine':
+                    status, headers, payload = stub._volcengine_response(body)
+                else:
+                    status, headers, payload = stub._tencent_response(body)
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端已取消请求（如对冲请求的落败方）
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """在后台线程启动服务"""
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"{self.backend} 替身服务已启动: {self.url}")
+        return self
+
+    def stop(self):
+        """停止服务"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASR本地替身服务")
+    parser.add_argument('--backend', choices=['volcengine', 'tencent'], default='volcengine')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8801)
+    parser.add_argument('--text', default=None, help="固定返回的识别文本")
+    parser.add_argument('--latency', type=float, default=0.2, help="正常响应延迟（秒）")
+    parser.add_argument('--slow-ratio', type=float, default=0.0, help="慢响应比例")
+    parser.add_argument('--slow-latency', type=float, default=3.0, help="慢响应延迟（秒）")
+    parser.add_argument('--error-ratio', type=float, default=0.0, help="返回错误的比例")
+    args = parser.parse_args()
+
+    stub = ASRStubServer(
+        args.backend, args.host, args.port, args.text,
+        args.latency, args.slow_ratio, args.slow_latency, args.error_ratio
+    ).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+异步ASR客户端 - 运行在CapsWriterSingle持有的事件循环线程上
+
+火山引擎HTTP接口使用aiohttp原生异步请求；腾讯云SDK为同步接口，
+通过事件循环的线程池包装为协程。未安装aiohttp时火山引擎同样走包装方式。
+"""
+
+import asyncio
+import json
+import time
+import types
+
+# 可选：aiohttp 提供原生异步HTTP
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+
+class AsyncClientWrapper:
+    """把同步ASR客户端包装为协程接口（在事件循环的线程池中执行）"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def recognize_audio_data(self, audio_data, audio_format='wav'):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.client.recognize_audio_data, audio_data, audio_format
+        )
+
+    async def warm_up(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class AsyncVolcengineASRClient:
+    """
+    火山引擎ASR的aiohttp异步客户端，请求体构造和结果检查复用同步客户端
+
+    与同步客户端的连接池一样空闲时定期保活，建连、复用和保活计入同一份连接池统计
+    """
+
+    def __init__(self, sync_client, pool_maxsize=4, keepalive_interval=25, keepalive_timeout=60, timeout=30):
+        """
+        Args:
+            sync_client: VolcengineASRClient 实例
+            pool_maxsize: 每个主机的最大连接数
+            keepalive_interval: 空闲保活间隔（秒），0 表示不保活
+            keepalive_timeout: 空闲连接保留时间（秒），应大于保活间隔
+            timeout: 单次请求超时（秒）
+        """
+        self.sync_client = sync_client
+        self.base_url = sync_client.base_url
+        self.stats = sync_client.http.stats
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = max(keepalive_timeout, keepalive_interval * 2)
+        self.timeout = timeout
+        self.session = None
+        self.keepalive_task = None
+        self.last_used = 0.0
+
+    def _trace_config(self):
+        """记录建连耗时，并在请求上下文中标记本次请求新建了连接"""
+        stats = self.stats
+
+        async def on_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_create_end(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx.connected = True
+            stats.record_connect(time.perf_counter() - context.connect_start)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        return trace_config
+
+    def _get_session(self):
+        """在事件循环内延迟创建会话"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            # trust_env=False：禁用代理
+            self.session = aiohttp.ClientSession(
+                connector=connector, trust_env=False, trace_configs=[self._trace_config()]
+            )
+        return self.session
+
+    async def _ping(self):
+        """发送轻量请求以建立/保持连接"""
+        self.last_used = time.time()
+        try:
+            session = self._get_session()
+            async with session.head(self.base_url, timeout=aiohttp.ClientTimeout(total=5)):
+                pass
+            self.stats.record_ping()
+        except Exception:
+            pass
+
+    async def warm_up(self):
+        """预热连接并启动空闲保活"""
+        await self._ping()
+        if self.keepalive_interval and self.keepalive_task is None:
+            self.keepalive_task = asyncio.ensure_future(self._keepalive_loop())
+
+    async def _keepalive_loop(self):
+        """空闲时定期发送保活请求"""
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if time.time() - self.last_used >= self.keepalive_interval:
+                await self._ping()
+
+    async def recognize_audio_data(self, audio_data, audio_format='wav'):
+        """
+        识别音频数据
+
+        Returns:
+            dict: 识别结果
+        """
+        session = self._get_session()
+        request_body = self.sync_client.build_request_body(audio_data, audio_format)
+        headers = self.sync_client._prepare_headers()
+
+        for attempt in range(2):
+            self.last_used = time.time()
+            request = types.SimpleNamespace(connected=False)
+            try:
+                async with session.post(
+                    self.base_url,
+                    json=request_body,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                    trace_request_ctx=request
+                ) as response:
+                    text = await response.text()
+                    self.stats.record_request(connected=request.connected)
+                    self.sync_client.check_response(response.status, response.headers, text)
+                    return json.loads(text)
+            except aiohttp.ServerDisconnectedError:
+                # 服务端关闭了复用的空闲连接且没有返回响应，重连后重试一次；新建的连接断开时不重试
+                if attempt or request.connected:
+                    raise
+                self.stats.record_reconnect()
+
+    async def close(self):
+        if self.keepalive_task is not None:
+            self.keepalive_task.cancel()
+            self.keepalive_task = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def create_async_client(service_type, client, pool_maxsize=4, keepalive_interval=25, timeout=30):
+    """为同步客户端创建对应的异步客户端"""
+    if service_type == 'volcengine' and HAS_AIOHTTP:
+        return AsyncVolcengineASRClient(
+            client, pool_maxsize=pool_maxsize, keepalive_interval=keepalive_interval, timeout=timeout
+        )
+    return AsyncClientWrapper(client)
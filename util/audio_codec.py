@@ -0,0 +1,171 @@
+"""
+音频编码 - 上传前把WAV压缩为FLAC/Opus等格式，按ASR服务选择支持的编码并发送体积更小的数据
+
+用法（编码耗时与体积对比）:
+    python -m util.audio_codec
+"""
+
+import io
+import time
+import wave
+import numpy as np
+
+# 可选：soundfile（libsndfile）提供FLAC/Ogg Opus编码
+try:
+    import soundfile as sf
+    HAS_SOUNDFILE = True
+except (ImportError, OSError):
+    HAS_SOUNDFILE = False
+
+
+# 各服务支持的编码 -> 接口中的格式名
+BACKEND_FORMATS = {
+    'volcengine': {'opus': 'ogg', 'wav': 'wav'},
+    'tencent': {'opus': 'ogg-opus', 'flac': 'flac', 'wav': 'wav'},
+}
+
+# 自动选择时各服务的编码优先级
+# FLAC编码约0.3ms/秒音频、体积减少约30%；Opus体积减少近90%但编码约15~40ms/秒音频，
+# 对几秒的短句来说编码耗时超过上传节省，因此只在显式配置时使用
+BACKEND_PREFERENCE = {
+    'volcengine': ['wav'],
+    'tencent': ['flac', 'wav'],
+}
+
+
+def read_wav(wav_data):
+    """解析WAV数据，返回 (int16采样, 采样率, 声道数)"""
+    with wave.open(io.BytesIO(wav_data), 'rb') as wf:
+        rate = wf.getframerate()
+        channels = wf.getnchannels()
+        pcm = wf.readframes(wf.getnframes())
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return samples, rate, channels
+
+
+def _encode_wav(wav_data):
+    return wav_data
+
+
+def _encode_soundfile(wav_data, file_format, subtype):
+    samples, rate, _ = read_wav(wav_data)
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, rate, format=file_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+def _encode_flac(wav_data):
+    return _encode_soundfile(wav_data, 'FLAC', 'PCM_16')
+
+
+def _encode_opus(wav_data):
+    return _encode_soundfile(wav_data, 'OGG', 'OPUS')
+
+
+ENCODERS = {
+    'wav': _encode_wav,
+    'flac': _encode_flac,
+    'opus': _encode_opus,
+}
+
+
+def available_codecs():
+    """当前环境可用的编码"""
+    if HAS_SOUNDFILE:
+        return list(ENCODERS)
+    return ['wav']
+
+
+def choose_codec(backend, codec='auto'):
+    """为服务选择编码，不支持时回退到wav"""
+    supported = BACKEND_FORMATS.get(backend, {'wav': 'wav'})
+    available = available_codecs()
+
+    if codec == 'auto':
+        for name in BACKEND_PREFERENCE.get(backend, ['wav']):
+            if name in supported and name in available:
+                return name
+        return 'wav'
+
+    if codec in supported and codec in available:
+        return codec
+    return 'wav'
+
+
+def encode_audio(wav_data, backend, codec='auto'):
+    """
+    按服务编码音频，编码失败或体积没有变小时发送原始WAV
+
+    Args:
+        wav_data: WAV格式音频数据
+        backend: ASR服务类型（'volcengine' / 'tencent'）
+        codec: 'auto' / 'wav' / 'flac' / 'opus'
+
+    Returns:
+        tuple: (音频数据, 接口格式名, 统计信息dict)
+    """
+    name = choose_codec(backend, codec)
+    stats = {
+        'codec': 'wav',
+        'original_bytes': len(wav_data),
+        'encoded_bytes': len(wav_data),
+        'encode_ms': 0.0,
+    }
+    if name == 'wav':
+        return wav_data, 'wav', stats
+
+    start = time.perf_counter()
+    try:
+        encoded = ENCODERS[name](wav_data)
+    except Exception as e:
+        print(f"音频编码失败，使用WAV: {e}")
+        return wav_data, 'wav', stats
+    stats['encode_ms'] = (time.perf_counter() - start) * 1000
+
+    if len(encoded) >= len(wav_data):
+        return wav_data, 'wav', stats
+
+    stats['codec'] = name
+    stats['encoded_bytes'] = len(encoded)
+    return encoded, BACKEND_FORMATS[backend][name], stats
+
+
+def _synthetic_wav(seconds, rate=16000):
+    """生成近似语音的测试音频：带包络的谐波加噪声"""
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    noise = np.random.default_rng(0).normal(0, 0.05, len(t))
+    samples = ((voice * envelope * 0.3 + noise) * 8000).clip(-32768, 32767).astype(np.int16)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def benchmark(lengths=(1, 5, 15, 30, 60), repeat=3):
+    """对比各编码在不同时长下的编码耗时和上传体积（base64后）"""
+    print(f"{'时长':>6} {'编码':>6} {'编码耗时ms':>10} {'上传字节':>10} {'节省':>7}")
+    for seconds in lengths:
+        wav_data = _synthetic_wav(seconds)
+        wav_upload = (len(wav_data) + 2) // 3 * 4
+        for name in available_codecs():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                encoded = ENCODERS[name](wav_data)
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+            upload = (len(encoded) + 2) // 3 * 4
+            saved = 1 - upload / wav_upload
+            print(f"{seconds:>5}s {name:>6} {elapsed:>10.1f} {upload:>10} {saved:>6.0%}")
+
+
+if __name__ == "__main__":
+    if not HAS_SOUNDFILE:
+        print("soundfile 未安装，只能对比WAV：pip install soundfile")
+    benchmark()
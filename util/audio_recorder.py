@@ -1,11 +1,17 @@
-import wave
 import pyaudio
+import math
 import threading
 import time
 import os
-import numpy as np
+from collections import deque
 from pathlib import Path
 from util.cosmic import cosmic
+from util.capture_buffer import CaptureBuffer, pcm_to_wav
+from util.vad import trim_silence
+from util.latency import LatencyHistogram
+from util.meter import LevelMeter
+from util.ring_buffer import SpscRing
+from util.waveform_display import update_waveform_level
 from config import ClientConfig
 
 
@@ -15,144 +21,407 @@ class AudioRecorder:
     def __init__(self):
         self.audio = pyaudio.PyAudio()
         self.stream = None
-        self.frames = []
         self.is_recording = False
         self.thread = None
+        self.chunk_listener = None  # 每采集一块音频时回调（流式/推测式识别用）
 
         # 音频参数
         self.format = pyaudio.paInt16
         self.channels = 1
         self.rate = 16000  # 16kHz采样率，适合语音识别
         self.chunk = 1024
+        self.sample_width = pyaudio.get_sample_size(self.format)
+        self.chunk_seconds = self.chunk / self.rate
+
+        # 录音缓冲区（每次录音新建，识别线程持有的视图不会被下次录音覆盖）
+        self.buffer = self._new_buffer()
+
+        # 电平测量：按固定频率更新波形，并累计本次录音的响度
+        self.meter = LevelMeter(self.rate, ClientConfig.level_update_rate, listener=self._on_level)
+
+        # 回调模式采集：PortAudio回调线程只把数据写入环形缓冲区，
+        # 写缓冲区、识别回调、电平计算都在消费线程中完成，不会拖慢音频回调
+        self.ring = SpscRing(64, self.chunk * self.channels * self.sample_width)  # 约4秒
+        self.data_ready = threading.Event()
+        self.consumer_stop = threading.Event()
+        self.input_overflows = 0  # PortAudio报告的输入溢出次数（回调线程修改）
+        self.reported_overflows = 0
+        self.reported_dropped = 0
+
+        # 输入设备缓存：只在打开或读取设备出错（设备拔出/更换）后重新枚举
+        self.device_index = None
+        self.device_stale = False
+        self.device_lock = threading.Lock()
+
+        # 常开输入流：未录音时只保留最近的音频块 (到达时间, 数据)，
+        # 多留0.5秒覆盖按下快捷键到开始录音之间的耗时，开始录音时再按按键时刻截取 preroll 秒
+        self.warm = False
+        self.lock = threading.Lock()
+        self.preroll = deque(maxlen=math.ceil((ClientConfig.preroll + 0.5) / self.chunk_seconds))
+        self.preroll_pending = []  # 已写入缓冲区、尚未交给回调的预录音块
+        self.stopping = False
+        self.tail_done = threading.Event()
+
+        # 启动延迟：按下快捷键到录音中第一个采样的时间差，预录音覆盖按键时刻时为0
+        self.start_latency = LatencyHistogram(min_latency=0.001, max_latency=5.0)
+        self.start_time = None
+        self.awaiting_first_chunk = False
+        self.last_start_delay = None
+        self.last_preroll_seconds = 0.0
+
+    def _new_buffer(self):
+        return CaptureBuffer(self.rate, self.channels, self.sample_width)
 
     def find_input_device(self):
-        """查找可用的输入设备"""
-        for i in range(self.audio.get_device_count()):
-            device_info = self.audio.get_device_info_by_index(i)
-            if device_info.get('maxInputChannels') > 0:
-                print(f"找到输入设备: {device_info.get('name')}")
-                return i
-        return None
+        """查找可用的输入设备（结果缓存，设备出错后重新枚举）"""
+        with self.device_lock:
+            if self.device_stale:
+                # PortAudio的设备列表在初始化时确定，重新初始化才能看到热插拔后的设备
+                self.audio.terminate()
+                self.audio = pyaudio.PyAudio()
+                self.device_index = None
+                self.device_stale = False
+
+            if self.device_index is not None:
+                return self.device_index
+
+            for i in range(self.audio.get_device_count()):
+                device_info = self.audio.get_device_info_by_index(i)
+                if device_info.get('maxInputChannels') > 0:
+                    print(f"找到输入设备: {device_info.get('name')}")
+                    self.device_index = i
+                    return i
+            return None
+
+    def invalidate_device(self):
+        """标记设备缓存失效，下次打开输入流时重新枚举设备"""
+        with self.device_lock:
+            self.device_stale = True
+
+    def _open_stream(self):
+        """以回调模式打开输入流，失败时重新枚举设备再试一次"""
+        for attempt in range(2):
+            device_index = self.find_input_device()
+            if device_index is None:
+                raise Exception("未找到音频输入设备")
+            try:
+                stream = self.audio.open(
+                    format=self.format,
+                    channels=self.channels,
+                    rate=self.rate,
+                    input=True,
+                    input_device_index=device_index,
+                    frames_per_buffer=self.chunk,
+                    stream_callback=self._stream_callback
+                )
+                return stream, device_index
+            except Exception:
+                self.invalidate_device()
+                if attempt:
+                    raise
+
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        """PortAudio回调（音频线程）：只做计数和写入环形缓冲区"""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        self.ring.write(in_data, time.time())
+        self.data_ready.set()
+        return None, pyaudio.paContinue
+
+    def _start_consumer(self):
+        self.ring.clear()
+        self.consumer_stop.clear()
+        self.thread = threading.Thread(target=self._consume_loop, daemon=True)
+        self.thread.start()
+
+    def _stop_consumer(self):
+        """通知消费线程处理完剩余数据后退出"""
+        self.consumer_stop.set()
+        self.data_ready.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def _close_stream(self):
+        if self.stream:
+            try:
+                self.stream.stop_stream()  # 等待正在执行的回调结束
+                self.stream.close()
+            except Exception as e:
+                print(f"关闭输入流失败: {e}")
+            self.stream = None
+
+    def set_chunk_listener(self, listener):
+        """设置音频块回调，参数为PCM bytes；传入None取消"""
+        with self.lock:
+            self.chunk_listener = listener
+
+    def clear_chunk_listener(self, listener):
+        """取消音频块回调，仅当当前回调仍是 listener 时（下一次录音可能已设置了自己的回调）"""
+        with self.lock:
+            if self.chunk_listener == listener:
+                self.chunk_listener = None
+
+    def open_warm_stream(self):
+        """打开常开输入流（常开麦克风模式），按下快捷键时无需打开设备，并可录入按键前的音频"""
+        if self.warm:
+            return
+        self.stream, device_index = self._open_stream()
+        self.warm = True
+        self._start_consumer()
+        print(f"常开输入流已打开 (设备: {device_index}, 预录音: {ClientConfig.preroll}秒)")
+
+    def close_warm_stream(self):
+        """关闭常开输入流"""
+        if not self.warm:
+            return
+        self.warm = False
+        self._close_stream()
+        self._stop_consumer()
+        self.preroll.clear()
 
     def start_recording(self):
         """开始录音"""
         if self.is_recording:
             return
 
-        device_index = self.find_input_device()
-        if device_index is None:
-            raise Exception("未找到音频输入设备")
+        if ClientConfig.warm_stream and not self.warm:
+            try:
+                self.open_warm_stream()
+            except Exception as e:
+                print(f"打开常开输入流失败，改为每次录音打开设备: {e}")
 
-        self.frames = []
-        self.is_recording = True
-        
         # 设置 cosmic 状态
         cosmic.start_recording()
+        self.start_time = cosmic.recording_start_time or time.time()
+        self.reported_overflows = self.input_overflows
+        self.reported_dropped = self.ring.dropped
+        self.meter.reset()
+
+        if self.warm:
+            with self.lock:
+                self.buffer = self._new_buffer()
+                # 预录音中早于按键 preroll 秒的部分丢弃
+                chunks = [(arrival, data) for arrival, data in self.preroll
+                          if arrival > self.start_time - ClientConfig.preroll]
+                self.preroll.clear()
+                for _, data in chunks:
+                    self.buffer.append(data)
+                self.preroll_pending = [data for _, data in chunks]
+                self.stopping = False
+                self.tail_done.clear()
+                self.awaiting_first_chunk = not chunks
+                if chunks:
+                    self._record_start_delay(chunks[0][0])
+                self.is_recording = True
+            if chunks:
+                print(f"音频录制已启动（常开输入流，预录音 {self.last_preroll_seconds:.2f}秒）")
+            return
+
+        self.buffer = self._new_buffer()
+        self.awaiting_first_chunk = True
+        self.is_recording = True
 
         try:
-            self.stream = self.audio.open(
-                format=self.format,
-                channels=self.channels,
-                rate=self.rate,
-                input=True,
-                input_device_index=device_index,
-                frames_per_buffer=self.chunk
-            )
-
-            self.thread = threading.Thread(target=self._record_loop)
-            self.thread.start()
+            self._start_consumer()
+            self.stream, device_index = self._open_stream()
             print(f"音频录制已启动 (设备: {device_index}, 采样率: {self.rate}Hz)")
 
         except Exception as e:
             self.is_recording = False
+            self._stop_consumer()
             cosmic.stop_recording()
             raise Exception(f"启动录音失败: {str(e)}")
 
-    def _record_loop(self):
-        """录音循环"""
+    def _record_start_delay(self, arrival):
+        """记录启动延迟，arrival为录音中第一块音频的到达时间"""
+        first_sample = arrival - self.chunk_seconds
+        delay = max(0.0, first_sample - self.start_time)
+        self.last_start_delay = delay
+        self.last_preroll_seconds = max(0.0, self.start_time - first_sample)
+        self.start_latency.record(delay)
+        self.awaiting_first_chunk = False
+
+    def get_start_stats(self):
+        """
+        录音启动延迟统计
+
+        Returns:
+            dict: 延迟分位数（秒），last（最近一次延迟），preroll（最近一次录入的按键前时长），warm（是否常开输入流）
+        """
+        stats = self.start_latency.snapshot()
+        stats.update(last=self.last_start_delay, preroll=self.last_preroll_seconds, warm=self.warm)
+        return stats
+
+    def get_capture_stats(self):
+        """
+        采集统计
+
+        Returns:
+            dict: input_overflows（设备输入溢出次数），dropped（环形缓冲区写满丢弃的块数），
+                  high_water（环形缓冲区最多积压的块数），capacity（槽位数）
+        """
+        return {
+            'input_overflows': self.input_overflows,
+            'dropped': self.ring.dropped,
+            'high_water': self.ring.high_water,
+            'capacity': self.ring.slots,
+        }
+
+    def _consume_loop(self):
+        """消费线程：从环形缓冲区取出音频块，未录音时写入预录音，录音时写入缓冲区并交给后续处理"""
+        while True:
+            item = self.ring.read()
+            if item is None:
+                # 先清除再检查一次，避免错过清除前刚写入的数据
+                self.data_ready.clear()
+                item = self.ring.read()
+            if item is None:
+                if self.consumer_stop.is_set():
+                    break
+                if not self.data_ready.wait(1.0) and self.warm and not self._stream_active():
+                    print("输入设备已停止，重新打开")
+                    self._reopen_warm_stream()
+                continue
+
+            data, arrival = item
+            with self.lock:
+                if not self.is_recording:
+                    if self.warm:
+                        self.preroll.append((arrival, data))
+                    continue
+                self.buffer.append(data)
+                if self.awaiting_first_chunk:
+                    self._record_start_delay(arrival)
+                    if not self.warm:
+                        print(f"启动延迟: {self.last_start_delay * 1000:.0f}ms")
+                chunks = self.preroll_pending + [data]
+                self.preroll_pending = []
+                finishing = self.stopping
+
+            for chunk in chunks:
+                self._on_chunk(chunk)
+
+            if finishing:
+                # 按键松开时正在采集的一块也属于本次录音
+                with self.lock:
+                    self.is_recording = False
+                    self.stopping = False
+                self.tail_done.set()
+
+    def _stream_active(self):
         try:
-            while self.is_recording:
-                if self.stream:
-                    data = self.stream.read(self.chunk, exception_on_overflow=False)
-                    self.frames.append(data)
-                    
-                    # 计算实时音频电平
-                    audio_data = np.frombuffer(data, dtype=np.int16)
-                    
-                    # 安全计算RMS，避免无效值
-                    if len(audio_data) > 0:
-                        audio_squared = audio_data.astype(np.float64) ** 2
-                        mean_squared = np.mean(audio_squared)
-                        if mean_squared > 0 and not np.isnan(mean_squared):
-                            rms = np.sqrt(mean_squared)
-                        else:
-                            rms = 0
-                    else:
-                        rms = 0
-                    
-                    # 增强灵敏度：使用对数缩放 + 放大系数
-                    if rms > 0:
-                        power_level = min(100, max(0, np.log10(rms + 1) * 25))  # 对数缩放，更敏感
-                    else:
-                        power_level = 0
-                    
-                    # 简化的调试输出（去掉RMS和Power信息）
-                    # if power_level > 2:  # 降低阈值
-                    #     print(f"🎵 RMS: {rms:.1f}, Power: {power_level:.1f}%")
-                    
-                    # 更新波形显示（平滑过渡）
-                    try:
-                        from util.waveform_display import update_waveform_level
-                        update_waveform_level(power_level)
-                    except Exception as e:
-                        print(f"波形更新失败: {e}")
-        except Exception as e:
-            print(f"录音过程出错: {str(e)}")
+            return self.stream is not None and self.stream.is_active()
+        except Exception:
+            return False
+
+    def _reopen_warm_stream(self):
+        """设备出错（如被拔出）后重新枚举设备并打开输入流，失败时每秒重试"""
+        self._close_stream()
+        self.invalidate_device()
+        while self.warm and not self.consumer_stop.wait(1.0):
+            try:
+                self.stream, device_index = self._open_stream()
+                print(f"输入流已重新打开 (设备: {device_index})")
+                return
+            except Exception as e:
+                print(f"重新打开输入设备失败: {e}")
+
+    def _on_chunk(self, data):
+        """把一块录音交给流式/推测式识别，并计算电平"""
+        # 推送给流式/推测式识别
+        listener = self.chunk_listener
+        if listener:
+            try:
+                listener(data)
+            except Exception as e:
+                print(f"音频块回调失败: {e}")
+
+        self.meter.add(data)
+
+    def _on_level(self, rms, peak, clipped):
+        """电平回调：更新波形显示"""
+        # 增强灵敏度：使用对数缩放 + 放大系数
+        power_level = min(100, math.log10(rms + 1) * 25) if rms > 0 else 0
+        update_waveform_level(power_level)
+
+    def get_loudness(self):
+        """
+        本次录音的响度统计（停止录音后调用）
+
+        Returns:
+            dict: rms_dbfs, peak_dbfs, clipped
+        """
+        return self.meter.loudness()
+
+    def _report_overflows(self):
+        """报告本次录音期间的输入溢出和丢弃"""
+        overflows = self.input_overflows - self.reported_overflows
+        dropped = self.ring.dropped - self.reported_dropped
+        if overflows or dropped:
+            print(f"录音期间输入溢出 {overflows} 次，缓冲区写满丢弃 {dropped} 块"
+                  f"（{dropped * self.chunk_seconds:.2f}秒）")
 
     def stop_recording(self, output_path=None):
-        """停止录音并保存文件"""
+        """
+        停止录音并保存文件
+
+        Returns:
+            tuple: (保存的文件路径或None, 本次录音的缓冲区, 响度统计)；未在录音时均为None。
+                之后开始的下一次录音会替换 self.buffer 并重置电平统计，收尾时应使用这里返回的值
+        """
         if not self.is_recording:
-            return None
+            return None, None, None
+        buffer = self.buffer
 
-        self.is_recording = False
         cosmic.stop_recording()
 
-        if self.thread:
-            self.thread.join(timeout=1.0)
+        if self.warm:
+            # 等消费线程写完按键松开时正在采集的一块后结束本次录音，输入流保持打开
+            with self.lock:
+                self.stopping = True
+            if not self.tail_done.wait(self.chunk_seconds * 4):
+                with self.lock:
+                    self.is_recording = False
+                    self.stopping = False
+        else:
+            # 先停止输入流（不再有新回调），消费线程处理完已采集的数据后退出
+            self._close_stream()
+            self._stop_consumer()
+            self.is_recording = False
 
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
+        self._report_overflows()
+        loudness = self.meter.loudness()
+        if loudness['clipped']:
+            print(f"录音有削波（{loudness['clipped']} 个采样），可调低麦克风增益")
 
         # 检查是否需要保存音频文件
         if not ClientConfig.save_audio:
             print("音频保存已禁用，不保存录音文件")
-            return None
+            return None, buffer, loudness
 
         # 保存音频文件
-        if output_path and self.frames:
-            return self.save_audio_file(output_path)
-        elif self.frames:
+        saved_file = None
+        if output_path and len(buffer):
+            saved_file = self.save_audio_file(output_path, buffer)
+        elif len(buffer):
             # 使用默认文件名
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             default_path = f"recordings/recording_{timestamp}.wav"
-            return self.save_audio_file(default_path)
+            saved_file = self.save_audio_file(default_path, buffer)
 
-        return None
+        return saved_file, buffer, loudness
 
-    def save_audio_file(self, file_path):
-        """保存音频文件"""
+    def save_audio_file(self, file_path, buffer=None):
+        """保存音频文件，buffer为空时使用当前录音"""
+        if buffer is None:
+            buffer = self.buffer
         try:
             # 确保目录存在
             Path(file_path).parent.mkdir(parents=True, exist_ok=True)
 
-            # 保存WAV文件
-            wf = wave.open(file_path, 'wb')
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.audio.get_sample_size(self.format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(self.frames))
-            wf.close()
+            # 保存WAV文件（直接写出缓冲区）
+            with open(file_path, 'wb') as f:
+                f.write(buffer.wav_view())
 
             print(f"音频文件已保存: {file_path}")
             return file_path
@@ -164,40 +433,71 @@ class AudioRecorder:
 
     def cleanup(self):
         """清理资源"""
-        if self.stream:
-            self.stream.close()
+        self.close_warm_stream()
+        self._close_stream()
         self.audio.terminate()
 
     def get_audio_data(self):
-        """获取音频数据（用于直接处理）"""
-        if self.frames:
-            return b''.join(self.frames)
+        """获取PCM音频数据视图（用于直接处理）"""
+        if len(self.buffer):
+            return self.buffer.pcm_view()
         return None
     
-    def get_wav_data(self):
-        """获取WAV格式的音频数据"""
-        if not self.frames:
+    def trim_pcm(self, pcm_data):
+        """按配置裁剪静音"""
+        if not ClientConfig.vad_trim:
+            return pcm_data
+        
+        pcm_data, stats = trim_silence(
+            pcm_data,
+            rate=self.rate,
+            threshold=ClientConfig.vad_threshold,
+            padding=ClientConfig.vad_padding,
+            max_pause=ClientConfig.vad_max_pause
+        )
+        if stats['saved_bytes']:
+            print(f"静音裁剪: 减少 {stats['saved_bytes']} 字节 / {stats['saved_seconds']:.2f}秒")
+        return pcm_data
+    
+    def get_wav_data(self, buffer=None):
+        """获取WAV格式的音频数据，buffer为空时使用当前录音"""
+        if buffer is None:
+            buffer = self.buffer
+        if not len(buffer):
             return None
         
         try:
-            import io
-            # 创建内存中的WAV文件
-            wav_buffer = io.BytesIO()
-            wf = wave.open(wav_buffer, 'wb')
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.audio.get_sample_size(self.format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(self.frames))
-            wf.close()
-            
-            # 返回WAV数据
-            wav_data = wav_buffer.getvalue()
-            wav_buffer.close()
-            return wav_data
+            pcm_data = self.trim_pcm(buffer.pcm_view())
+            if len(pcm_data) == len(buffer):
+                # 未裁剪：在缓冲区头部原地写WAV头，不复制音频数据
+                return buffer.wav_view()
+            return pcm_to_wav(pcm_data, self.rate, self.channels, self.sample_width)
             
         except Exception as e:
             print(f"生成WAV数据失败: {e}")
             return None
+    
+    def get_merged_wav_data(self, buffers, gap=0.3):
+        """把多次录音拼接为一段WAV（识别积压时合并识别），录音之间插入 gap 秒静音"""
+        silence = bytes(int(self.rate * gap) * self.channels * self.sample_width)
+        parts = []
+        for buffer in buffers:
+            if parts:
+                parts.append(silence)
+            parts.append(self.trim_pcm(buffer.pcm_view()))
+        return pcm_to_wav(b''.join(parts), self.rate, self.channels, self.sample_width)
+    
+    def get_segment_wav_data(self, pcm_data):
+        """把一段PCM数据（如推测式识别的分段）封装为WAV"""
+        if not len(pcm_data):
+            return None
+        
+        try:
+            pcm_data = self.trim_pcm(pcm_data)
+            return pcm_to_wav(pcm_data, self.rate, self.channels, self.sample_width)
+        except Exception as e:
+            print(f"生成WAV数据失败: {e}")
+            return None
 
 
 # 全局录音器实例
@@ -210,5 +510,5 @@ def start_recording():
 
 
 def stop_recording(output_path=None):
-    """便捷的停止录音函数"""
+    """便捷的停止录音函数，返回值同 AudioRecorder.stop_recording"""
     return audio_recorder.stop_recording(output_path)
\ No newline at end of file
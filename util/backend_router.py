@@ -0,0 +1,240 @@
+"""
+自适应路由 - 根据各ASR服务的实时延迟和错误率选择最快的健康服务，
+连续失败的服务被熔断，冷却后放行一次探测请求
+
+用法（检查熔断、探测和探测被取消后的状态转换）:
+    python -m util.backend_router
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """熔断器：closed（正常）-> open（熔断）-> half_open（探测）"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, cooldown=30.0):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断后多久允许探测（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self):
+        """是否允许向该服务发送请求"""
+        if self.state == self.OPEN and time.time() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self.probing = False
+        if self.state == self.HALF_OPEN:
+            return not self.probing
+        return self.state == self.CLOSED
+
+    def on_dispatch(self):
+        """请求已发出（半开状态下只放行一个探测请求）"""
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+
+    def on_release(self):
+        """请求没有得出结果（被取消或未发出），半开状态下不算用掉探测机会"""
+        self.probing = False
+
+    def on_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+
+    def on_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+
+class BackendRouter:
+    """按延迟和健康状况为每次请求选择服务"""
+
+    def __init__(self, latency, window=20, min_samples=5, explore_ratio=0.05,
+                 failure_threshold=3, cooldown=30.0, max_error_rate=0.5):
+        """
+        Args:
+            latency: 服务类型 -> LatencyHistogram
+            window: 错误率统计窗口（请求数）
+            min_samples: 参与延迟比较所需的最少样本数
+            explore_ratio: 随机探索其他服务的比例，用于持续采集延迟
+            failure_threshold/cooldown: 熔断参数
+            max_error_rate: 近期错误率超过该值时同样熔断
+        """
+        self.latency = latency
+        self.min_samples = min_samples
+        self.explore_ratio = explore_ratio
+        self.max_error_rate = max_error_rate
+        self.outcomes = {service: deque(maxlen=window) for service in latency}
+        self.breakers = {
+            service: CircuitBreaker(failure_threshold, cooldown) for service in latency
+        }
+        self.routed = {service: 0 for service in latency}
+        self.last_decision = None
+        self.lock = threading.Lock()
+
+    def error_rate(self, service):
+        outcomes = self.outcomes[service]
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def choose(self, available, preferred):
+        """
+        选择服务
+
+        Args:
+            available: 已初始化客户端的服务列表
+            preferred: 配置的首选服务（延迟样本不足时使用）
+
+        Returns:
+            str: 服务类型
+        """
+        with self.lock:
+            healthy = [service for service in available if self.breakers[service].allow()]
+            probing = [
+                service for service in healthy
+                if self.breakers[service].state == CircuitBreaker.HALF_OPEN
+            ]
+
+            if not healthy:
+                service = preferred if preferred in available else available[0]
+                reason = '无健康服务'
+            elif probing:
+                service, reason = probing[0], '熔断探测'
+            else:
+                measured = [
+                    service for service in healthy
+                    if self.latency[service].count() >= self.min_samples
+                ]
+                # 样本不足的服务提高探索比例，尽快建立延迟统计
+                explore_ratio = self.explore_ratio if len(measured) == len(healthy) else max(self.explore_ratio, 0.2)
+                if len(healthy) > 1 and random.random() < explore_ratio:
+                    service, reason = random.choice(healthy), '探索'
+                elif len(measured) > 1:
+                    service = min(measured, key=lambda name: self.latency[name].percentile(50))
+                    reason = '延迟最低'
+                elif preferred in healthy:
+                    service, reason = preferred, '首选'
+                else:
+                    service, reason = healthy[0], '首选不可用'
+
+            self.breakers[service].on_dispatch()
+            self.routed[service] += 1
+            self.last_decision = (service, reason)
+            return service
+
+    def record_success(self, service):
+        with self.lock:
+            if self.breakers[service].state == CircuitBreaker.HALF_OPEN:
+                # 探测成功，熔断前的错误不再计入
+                self.outcomes[service].clear()
+            self.outcomes[service].append(True)
+            self.breakers[service].on_success()
+
+    def record_release(self, service):
+        """请求被取消（对冲落败、被新录音取代等）或未发出，不计入成功或失败"""
+        with self.lock:
+            self.breakers[service].on_release()
+
+    def record_failure(self, service):
+        with self.lock:
+            self.outcomes[service].append(False)
+            breaker = self.breakers[service]
+            was_open = breaker.state == CircuitBreaker.OPEN
+            breaker.on_failure()
+            outcomes = self.outcomes[service]
+            if (breaker.state == CircuitBreaker.CLOSED and len(outcomes) >= self.min_samples
+                    and self.error_rate(service) > self.max_error_rate):
+                breaker.trip()
+            if breaker.state == CircuitBreaker.OPEN and not was_open:
+                print(f"{service} 识别失败过多，已熔断 {breaker.cooldown:.0f} 秒")
+
+    def get_stats(self):
+        """各服务的路由统计"""
+        with self.lock:
+            return {
+                service: {
+                    'p50': self.latency[service].percentile(50),
+                    'p95': self.latency[service].percentile(95),
+                    'samples': self.latency[service].count(),
+                    'error_rate': self.error_rate(service),
+                    'breaker': self.breakers[service].state,
+                    'routed': self.routed[service],
+                }
+                for service in self.latency
+            }
+
+
+def check():
+    """按熔断、探测的典型顺序调用路由，检查每一步选择的服务和熔断状态"""
+    from util.latency import LatencyHistogram
+
+    def new_router():
+        latency = {'volcengine': LatencyHistogram(), 'tencent': LatencyHistogram()}
+        router = BackendRouter(latency, explore_ratio=0.0, failure_threshold=1, cooldown=0.0)
+        router.record_failure('tencent')   # 熔断 tencent，冷却时间为0，下一次选择即探测
+        return router
+
+    def probe_success():
+        router = new_router()
+        probed = router.choose(['volcengine', 'tencent'], 'volcengine') == 'tencent'
+        router.record_success('tencent')
+        return probed and router.breakers['tencent'].state == CircuitBreaker.CLOSED
+
+    def probe_failure():
+        router = new_router()
+        router.choose(['volcengine', 'tencent'], 'volcengine')
+        router.record_failure('tencent')
+        return router.breakers['tencent'].state == CircuitBreaker.OPEN
+
+    def single_probe():
+        router = new_router()
+        router.choose(['volcengine', 'tencent'], 'volcengine')
+        # 探测未返回时其他请求不发往该服务
+        return router.choose(['volcengine', 'tencent'], 'volcengine') == 'volcengine'
+
+    def probe_cancelled():
+        router = new_router()
+        router.choose(['volcengine', 'tencent'], 'volcengine')
+        router.record_release('tencent')
+        # 探测被取消后仍处于半开状态，下一次请求重新探测
+        breaker = router.breakers['tencent']
+        return (breaker.state == CircuitBreaker.HALF_OPEN and breaker.allow()
+                and router.choose(['volcengine', 'tencent'], 'volcengine') == 'tencent')
+
+    scenarios = [
+        ('探测成功后恢复', probe_success),
+        ('探测失败后重新熔断', probe_failure),
+        ('半开时只放行一个探测', single_probe),
+        ('探测被取消后重新探测', probe_cancelled),
+    ]
+    failed = 0
+    for name, scenario in scenarios:
+        ok = scenario()
+        failed += not ok
+        print(f"{'通过' if ok else '失败'} {name}")
+    print(f"{len(scenarios) - failed}/{len(scenarios)} 通过")
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+批量转写 - 把目录或通配符匹配的录音文件边遍历边送入有界并发线程池识别，
+每个实际发往服务的请求按服务限速，结果写入结果日志和历史库；已完成的文件记录在状态文件中，中断后重新运行会跳过
+
+用法:
+    python -m util.batch_transcribe recordings/
+    python -m util.batch_transcribe "recordings/2024*.wav" --workers 4 --rate 5
+    python -m util.batch_transcribe recordings/ --restart     # 忽略状态文件，全部重新识别
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class BatchState:
+    """已完成文件的状态文件（JSONL，只追加），用于中断后续传"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.done = set()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)['key'])
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # 崩溃时写了一半的行
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def key(path, service):
+        """文件路径 + 大小 + 修改时间 + 服务，文件变化或换服务后会重新识别"""
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}|{service}"
+
+    def is_done(self, key):
+        return key in self.done
+
+    def mark_done(self, key, text):
+        with self.lock:
+            self.done.add(key)
+            self.file.write(json.dumps({'key': key, 'text': text}, ensure_ascii=False) + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def iter_audio_files(pattern):
+    """
+    逐个产出文件，不预先列出全部文件：目录逐层按名称顺序递归查找 .wav，
+    通配符按文件系统返回的顺序（续传按状态文件判断，与顺序无关）
+    """
+    if os.path.isdir(pattern):
+        for root, dirs, files in os.walk(pattern):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith('.wav'):
+                    yield os.path.join(root, name)
+        return
+    for path in glob.iglob(pattern, recursive=True):
+        if os.path.isfile(path):
+            yield path
+
+
+def audio_duration(path):
+    """WAV文件时长（秒），无法解析时返回0"""
+    try:
+        with wave.open(path, 'rb') as wf:
+            return wf.getnframes() / wf.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return 0.0
+
+
+def run_batch(pattern, workers=4, rate=0, state_path=None, restart=False):
+    """
+    批量识别
+
+    Args:
+        pattern: 目录或通配符
+        workers: 并发识别数
+        rate: 每个服务每秒最多请求数（长音频的每个分段都计为一次请求），0 表示不限速
+        state_path: 状态文件路径
+        restart: 是否忽略已有状态
+
+    Returns:
+        dict: 统计信息
+    """
+    from util.asr_manager import asr_manager
+    from util.result_handler import result_handler
+
+    if restart and state_path and Path(state_path).exists():
+        Path(state_path).unlink()
+    state = BatchState(state_path)
+    # 限速在识别路径中按实际收到请求的服务生效，覆盖长音频分段和路由到其他服务的请求
+    asr_manager.set_rate_limit(rate)
+    stats = {'files': 0, 'skipped': 0, 'failed': 0, 'audio_seconds': 0.0}
+    stats_lock = threading.Lock()
+    # 限制已提交未完成的任务数，文件列表边遍历边提交，内存占用与文件总数无关
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def transcribe(path, key):
+        try:
+            duration = audio_duration(path)
+            text = asr_manager.recognize_audio_file(path)
+            if text:
+                result_handler.save_result(path, text, duration)
+            state.mark_done(key, text)
+            with stats_lock:
+                stats['files'] += 1
+                stats['audio_seconds'] += duration
+        except Exception as e:
+            print(f"识别失败 {path}: {e}")
+            with stats_lock:
+                stats['failed'] += 1
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    last_report = start
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path in iter_audio_files(pattern):
+                service = asr_manager.service_type
+                key = BatchState.key(path, service)
+                if state.is_done(key):
+                    stats['skipped'] += 1
+                    continue
+
+                slots.acquire()
+                executor.submit(transcribe, path, key)
+
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    last_report = now
+                    _report(stats, now - start, final=False)
+    finally:
+        asr_manager.set_rate_limit(0)
+
+    elapsed = time.perf_counter() - start
+    state.close()
+    result_handler.journal.flush()
+    stats['elapsed'] = elapsed
+    _report(stats, elapsed, final=True)
+    return stats
+
+
+def _report(stats, elapsed, final):
+    files_per_second = stats['files'] / elapsed if elapsed else 0.0
+    audio_per_second = stats['audio_seconds'] / elapsed if elapsed else 0.0
+    prefix = "完成" if final else "进度"
+    print(f"{prefix}: 识别 {stats['files']} 个，跳过 {stats['skipped']} 个，失败 {stats['failed']} 个，"
+          f"耗时 {elapsed:.1f}s，{files_per_second:.2f} 文件/秒，{audio_per_second:.1f} 音频秒/秒")
+
+
+def main():
+    from config import ProjectPaths
+
+    parser = argparse.ArgumentParser(description="批量转写录音文件")
+    parser.add_argument('pattern', help="目录（递归查找 .wav）或通配符，如 \"recordings/*.wav\"")
+    parser.add_argument('--workers', type=int, default=4, help="并发识别数")
+    parser.add_argument('--rate', type=float, default=0, help="每个服务每秒最多请求数（长音频每个分段计一次），0 表示不限速")
+    parser.add_argument('--state', default=str(ProjectPaths.results_dir / 'batch_state.jsonl'), help="状态文件")
+    parser.add_argument('--restart', action='store_true', help="忽略状态文件，全部重新识别")
+    args = parser.parse_args()
+
+    run_batch(args.pattern, args.workers, args.rate, args.state, args.restart)
+
+
+if __name__ == "__main__":
+    main()
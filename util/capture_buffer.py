@@ -0,0 +1,135 @@
+"""
+录音缓冲区 - 预分配、可增长的连续内存，直接在缓冲区头部写WAV文件头，
+对外只提供memoryview，避免 frames 列表 + b''.join + WAV封装带来的多次复制
+
+用法（60秒录音的复制耗时与峰值内存对比）:
+    python -m util.capture_buffer
+"""
+
+import struct
+
+WAV_HEADER_SIZE = 44
+
+
+def write_wav_header(buffer, data_size, rate=16000, channels=1, sample_width=2):
+    """在buffer开头原地写入WAV文件头"""
+    byte_rate = rate * channels * sample_width
+    struct.pack_into(
+        '<4sI4s4sIHHIIHH4sI', buffer, 0,
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, rate, byte_rate, channels * sample_width, sample_width * 8,
+        b'data', data_size
+    )
+
+
+def pcm_to_wav(pcm_data, rate=16000, channels=1, sample_width=2):
+    """把PCM数据封装为WAV（一次复制）"""
+    wav = bytearray(WAV_HEADER_SIZE + len(pcm_data))
+    write_wav_header(wav, len(pcm_data), rate, channels, sample_width)
+    wav[WAV_HEADER_SIZE:] = pcm_data
+    return wav
+
+
+class CaptureBuffer:
+    """一次录音的PCM缓冲区，头部预留WAV文件头空间"""
+
+    def __init__(self, rate=16000, channels=1, sample_width=2, initial_seconds=30):
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        capacity = WAV_HEADER_SIZE + rate * channels * sample_width * initial_seconds
+        self.buffer = bytearray(capacity)
+        self.size = 0  # 已写入的PCM字节数
+
+    def __len__(self):
+        return self.size
+
+    def duration(self):
+        """已录音时长（秒）"""
+        return self.size / (self.rate * self.channels * self.sample_width)
+
+    def append(self, data):
+        """追加PCM数据，容量不足时按倍数扩容"""
+        end = WAV_HEADER_SIZE + self.size + len(data)
+        if end > len(self.buffer):
+            # 新建缓冲区而不是原地resize：已导出的memoryview仍指向旧内存，保持有效
+            new_buffer = bytearray(max(end, len(self.buffer) * 2))
+            new_buffer[:WAV_HEADER_SIZE + self.size] = memoryview(self.buffer)[:WAV_HEADER_SIZE + self.size]
+            self.buffer = new_buffer
+        self.buffer[WAV_HEADER_SIZE + self.size:end] = data
+        self.size += len(data)
+
+    def pcm_view(self, start=0, end=None):
+        """PCM数据的只读视图（字节偏移）"""
+        if end is None:
+            end = self.size
+        return memoryview(self.buffer)[WAV_HEADER_SIZE + start:WAV_HEADER_SIZE + end].toreadonly()
+
+    def wav_view(self):
+        """原地写入WAV文件头，返回完整WAV数据的只读视图"""
+        write_wav_header(self.buffer, self.size, self.rate, self.channels, self.sample_width)
+        return memoryview(self.buffer)[:WAV_HEADER_SIZE + self.size].toreadonly()
+
+
+def benchmark(seconds=60, rate=16000, chunk=1024, repeat=5):
+    """
+    对比 frames列表 与 CaptureBuffer：
+    录音阶段（按住期间）的追加耗时、松开后生成WAV并base64的耗时，以及整个过程的峰值内存
+    """
+    import base64
+    import io
+    import os
+    import time
+    import tracemalloc
+    import wave
+
+    chunks = [os.urandom(chunk * 2) for _ in range(seconds * rate // chunk)]
+
+    def frames_capture():
+        frames = []
+        for data in chunks:
+            frames.append(data)
+        return frames
+
+    def frames_finalize(frames):
+        wav_buffer = io.BytesIO()
+        wf = wave.open(wav_buffer, 'wb')
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(b''.join(frames))
+        wf.close()
+        return base64.b64encode(wav_buffer.getvalue())
+
+    def buffer_capture():
+        buffer = CaptureBuffer(rate)
+        for data in chunks:
+            buffer.append(data)
+        return buffer
+
+    def buffer_finalize(buffer):
+        return base64.b64encode(buffer.wav_view())
+
+    print(f"{seconds}秒录音（{len(chunks)}块）:")
+    for name, capture, finalize in (('frames列表', frames_capture, frames_finalize),
+                                    ('CaptureBuffer', buffer_capture, buffer_finalize)):
+        capture_ms = finalize_ms = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            captured = capture()
+            middle = time.perf_counter()
+            finalize(captured)
+            capture_ms += (middle - start) * 1000
+            finalize_ms += (time.perf_counter() - middle) * 1000
+        del captured
+
+        tracemalloc.start()
+        finalize(capture())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:<14} 录音阶段 {capture_ms / repeat:5.1f}ms  "
+              f"松开后 {finalize_ms / repeat:5.1f}ms  峰值内存 {peak / 1024 / 1024:5.1f}MB")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,8 +1,7 @@
 import asyncio
 import multiprocessing
 import time
-from queue import Queue
-from threading import Lock
+from threading import Condition, Lock
 
 
 class Cosmic:
@@ -28,10 +27,9 @@ class Cosmic:
         # 录音状态控制
         self.on = False  # 是否正在录音
         self.recording_start_time = None
-
-        # 队列用于进程间通信
-        self.audio_queue = Queue()  # 音频数据队列
-        self.result_queue = Queue()  # 识别结果队列
+        self.generation = 0  # 录音序号，每次开始录音加1
+        # 录音开始/结束时通知等待方，替代轮询 is_recording()
+        self.state_changed = Condition()
 
         # WebSocket连接
         self.websocket = None
@@ -50,15 +48,50 @@ class Cosmic:
         self.loop = loop
 
     def start_recording(self):
-        """开始录音"""
-        self.on = True
-        self.recording_start_time = time.time()
+        """开始录音（重复调用不会开始新的录音）"""
+        with self.state_changed:
+            if not self.on:
+                self.on = True
+                self.generation += 1
+                self.recording_start_time = time.time()
+                self.state_changed.notify_all()
+            return self.generation
 
     def stop_recording(self):
         """停止录音"""
-        self.on = False
+        with self.state_changed:
+            self.on = False
+            self.state_changed.notify_all()
         return self.recording_start_time
 
+    def wait_for_start(self, timeout=None):
+        """
+        等待录音开始
+
+        Returns:
+            bool: 是否正在录音（超时返回False）
+        """
+        with self.state_changed:
+            return self.state_changed.wait_for(lambda: self.on, timeout)
+
+    def wait_for_stop(self, generation=None, timeout=None):
+        """
+        等待录音结束
+
+        Args:
+            generation: 要等待的录音序号，该次录音结束（或已开始新的录音）即返回；默认为当前录音
+            timeout: 超时（秒）
+
+        Returns:
+            bool: 录音是否已结束（超时返回False）
+        """
+        with self.state_changed:
+            if generation is None:
+                generation = self.generation
+            return self.state_changed.wait_for(
+                lambda: not self.on or self.generation != generation, timeout
+            )
+
     def is_recording(self):
         """检查是否正在录音"""
         return self.on
@@ -81,7 +114,9 @@ class Cosmic:
 
     def reset(self):
         """重置状态"""
-        self.on = False
+        with self.state_changed:
+            self.on = False
+            self.state_changed.notify_all()
         self.recording_start_time = None
         self.current_audio_file = None
         self.current_result = None
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+识别历史库 - SQLite存储全部识别结果，FTS5全文索引（trigram分词，支持中文任意子串检索）
+
+由结果日志的后台写入线程批量写入，不影响粘贴延迟
+
+用法:
+    python -m util.history_store search 关键词 [--backend volcengine] [--since 2024-01-01] [--limit 20]
+    python -m util.history_store import          # 导入 results/ 下已有的日志和旧版JSON文件
+    python -m util.history_store stats
+    python -m util.history_store bench --records 1000000
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id         INTEGER PRIMARY KEY,
+    timestamp  TEXT NOT NULL,
+    backend    TEXT,
+    duration   REAL,
+    audio_file TEXT,
+    text       TEXT NOT NULL,
+    UNIQUE (timestamp, text)
+);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_backend ON records (backend, timestamp);
+"""
+
+# 外部内容FTS表，由触发器与records表同步
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    text, content='records', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# trigram分词只能匹配3个字符及以上的子串，更短的关键词改用LIKE
+TRIGRAM_MIN_LENGTH = 3
+
+
+class HistoryStore:
+    """识别历史库"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = Path(path)
+        self.conn = None
+        self.tokenizer = None
+
+    def _connect(self):
+        """在首次使用的线程上打开连接（写入只发生在结果日志的后台线程）"""
+        if self.conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self.tokenizer = self._create_fts(conn)
+            self.conn = conn
+        return self.conn
+
+    def _create_fts(self, conn):
+        """创建全文索引，SQLite不支持trigram分词（3.34之前）时退回unicode61"""
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'records_fts'"
+        ).fetchone()
+        if row:
+            return 'trigram' if 'trigram' in row['sql'] else 'unicode61'
+
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                conn.executescript(FTS_SCHEMA.format(tokenizer=tokenizer))
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        raise Exception("SQLite不支持FTS5全文索引")
+
+    def add_records(self, records):
+        """
+        批量写入识别结果（一个事务），已存在的记录忽略
+
+        Args:
+            records: 结果日志格式的记录列表
+        """
+        conn = self._connect()
+        rows = [
+            (
+                record['timestamp'],
+                record.get('asr_model'),
+                record.get('duration'),
+                record.get('audio_file'),
+                record['recognition_result'],
+            )
+            for record in records
+            if record.get('recognition_result')
+        ]
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO records (timestamp, backend, duration, audio_file, text) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def search(self, query=None, backend=None, since=None, until=None, limit=20):
+        """
+        检索识别历史，按时间倒序
+
+        Args:
+            query: 关键词，为空时只按条件过滤
+            backend: 服务类型
+            since/until: 时间范围（ISO格式前缀，如 2024-01-01）
+            limit: 最多返回条数
+
+        Returns:
+            list[dict]: 匹配的记录
+        """
+        conn = self._connect()
+        conditions = []
+        params = []
+
+        if query:
+            if self.tokenizer == 'trigram' and len(query) < TRIGRAM_MIN_LENGTH:
+                conditions.append("r.text LIKE ?")
+                params.append(f"%{query}%")
+            else:
+                # 关键词整体作为短语匹配
+                conditions.append("r.id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)")
+                params.append('"' + query.replace('"', '""') + '"')
+        if backend:
+            conditions.append("r.backend = ?")
+            params.append(backend)
+        if since:
+            conditions.append("r.timestamp >= ?")
+            params.append(since)
+        if until:
+            # until 为日期时包含当天
+            conditions.append("r.timestamp < ?")
+            params.append(until + '\uffff')
+
+        sql = "SELECT r.* FROM records r"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY r.timestamp DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in conn.execute(sql, params)]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def stats(self):
+        """各服务的记录数和总时长"""
+        rows = self._connect().execute(
+            "SELECT backend, COUNT(*) AS records, SUM(duration) AS duration, "
+            "MIN(timestamp) AS first, MAX(timestamp) AS last FROM records GROUP BY backend"
+        )
+        return [dict(row) for row in rows]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def import_results(store, directory, batch_size=5000):
+    """
+    一次性导入结果目录：各日期目录下的 results.jsonl 和旧版 result_*.json，重复导入不会产生重复记录
+
+    Returns:
+        int: 读取的记录数
+    """
+    from util.result_journal import iter_days, read_records
+
+    directory = Path(directory)
+    total = 0
+    batch = []
+
+    def legacy_records(day):
+        for path in sorted((directory / day).glob('result_*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+
+    for day in iter_days(directory):
+        for source in (read_records(directory, [day]), legacy_records(day)):
+            for record in source:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    store.add_records(batch)
+                    total += len(batch)
+                    batch = []
+    if batch:
+        store.add_records(batch)
+        total += len(batch)
+    return total
+
+
+def benchmark(path, records=1000000, queries=('天气', '今天天气很好', '会议纪要', '不存在的内容')):
+    """生成合成数据并测量检索耗时"""
+    import random
+
+    store = HistoryStore(path)
+    existing = store.count()
+    if existing < records:
+        words = ['今天', '天气', '很好', '我们', '明天', '开会', '会议', '纪要', '项目', '进度',
+                 '下午', '提交', '代码', '评审', '需要', '修改', '测试', '通过', '发布', '上线']
+        start = time.perf_counter()
+        batch = []
+        for index in range(existing, records):
+            day = 1 + index % 28
+            batch.append({
+                'timestamp': f"2024-{1 + index % 12:02d}-{day:02d}T{index % 24:02d}:00:00.{index:07d}",
+                'asr_model': random.choice(('volcengine', 'tencent')),
+                'duration': round(random.uniform(1, 20), 2),
+                'audio_file': 'audio_data',
+                'recognition_result': ''.join(random.choice(words) for _ in range(random.randint(4, 16))),
+            })
+            if len(batch) >= 10000:
+                store.add_records(batch)
+                batch = []
+        if batch:
+            store.add_records(batch)
+        print(f"写入 {records - existing} 条，耗时 {time.perf_counter() - start:.1f}s")
+
+    print(f"{store.count()} 条记录（分词: {store.tokenizer}）:")
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search(query, limit=20)
+        print(f"  '{query}': {len(hits)} 条，{(time.perf_counter() - start) * 1000:.1f}ms")
+    store.close()
+
+
+def main():
+    from config import ProjectPaths
+
+    parser = argparse.ArgumentParser(description="识别历史检索")
+    parser.add_argument('--db', default=str(ProjectPaths.results_dir / 'history.db'), help="数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    search_parser = subparsers.add_parser('search', help="检索识别历史")
+    search_parser.add_argument('query', nargs='?', help="关键词")
+    search_parser.add_argument('--backend', choices=['volcengine', 'tencent'])
+    search_parser.add_argument('--since', help="起始日期，如 2024-01-01")
+    search_parser.add_argument('--until', help="结束日期（含），如 2024-01-31")
+    search_parser.add_argument('--limit', type=int, default=20)
+
+    subparsers.add_parser('import', help="导入 results/ 下已有的识别结果")
+    subparsers.add_parser('stats', help="统计")
+
+    bench_parser = subparsers.add_parser('bench', help="合成数据检索测试")
+    bench_parser.add_argument('--records', type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        # 使用单独的数据库，不污染真实历史
+        benchmark(Path(args.db).with_name('history_bench.db'), args.records)
+        return
+
+    store = HistoryStore(args.db)
+    if args.command == 'search':
+        start = time.perf_counter()
+        hits = store.search(args.query, args.backend, args.since, args.until, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for hit in hits:
+            duration = f" {hit['duration']:.1f}s" if hit['duration'] else ''
+            print(f"{hit['timestamp'][:19].replace('T', ' ')} [{hit['backend']}{duration}] {hit['text']}")
+        print(f"共 {len(hits)} 条，耗时 {elapsed:.1f}ms")
+    elif args.command == 'import':
+        start = time.perf_counter()
+        total = import_results(store, ProjectPaths.results_dir)
+        print(f"已读取 {total} 条结果，库中共 {store.count()} 条，耗时 {time.perf_counter() - start:.1f}s")
+    else:
+        for row in store.stats():
+            print(f"{row['backend']}: {row['records']} 条，总时长 {(row['duration'] or 0) / 60:.1f} 分钟，"
+                  f"{row['first'][:10]} ~ {row['last'][:10]}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+HTTP连接池 - 长连接复用，避免每次识别都重新做DNS/TCP/TLS握手
+"""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class PoolStats:
+    """连接池统计信息"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()   # 当前线程的请求是否新建了连接
+        self.requests = 0            # 业务请求数（不含预热和保活）
+        self.reused = 0              # 复用已有连接的业务请求数
+        self.pings = 0               # 预热和保活请求数
+        self.connections = 0         # 新建连接数（含预热和保活）
+        self.reconnects = 0          # 空闲断开后的重连次数
+        self.connect_time_total = 0.0
+        self.last_connect_time = 0.0
+
+    def begin_request(self):
+        """开始一次请求（在发起请求的线程中调用）"""
+        self.local.connected = False
+
+    def record_request(self, connected=None):
+        """
+        业务请求完成：未新建连接即为复用
+
+        Args:
+            connected: 本次请求是否新建了连接，None 表示取当前线程的记录（异步请求在同一线程中并发，需自行传入）
+        """
+        if connected is None:
+            connected = getattr(self.local, 'connected', False)
+        with self.lock:
+            self.requests += 1
+            if not connected:
+                self.reused += 1
+
+    def record_ping(self):
+        with self.lock:
+            self.pings += 1
+
+    def record_connect(self, elapsed):
+        self.local.connected = True
+        with self.lock:
+            self.connections += 1
+            self.connect_time_total += elapsed
+            self.last_connect_time = elapsed
+
+    def record_reconnect(self):
+        with self.lock:
+            self.reconnects += 1
+
+    def snapshot(self):
+        """获取统计快照"""
+        with self.lock:
+            avg_connect = self.connect_time_total / self.connections if self.connections else 0.0
+            return {
+                'requests': self.requests,
+                'pings': self.pings,
+                'connections': self.connections,
+                'reuse_count': self.reused,
+                'reconnects': self.reconnects,
+                'last_connect_ms': self.last_connect_time * 1000,
+                'avg_connect_ms': avg_connect * 1000,
+            }
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """记录建连耗时的HTTPAdapter"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        class TimedHTTPConnection(HTTPConnection):
+            def connect(self):
+                start = time.perf_counter()
+                super().connect()
+                stats.record_connect(time.perf_counter() - start)
+
+        class TimedHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                start = time.perf_counter()
+                super().connect()
+                stats.record_connect(time.perf_counter() - start)
+
+        class TimedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TimedHTTPConnection
+
+        class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = TimedHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class PooledSession:
+    """长连接会话：启动预热、空闲保活、断线透明重连"""
+
+    def __init__(self, base_url, pool_maxsize=4, keepalive_interval=25):
+        """
+        初始化连接池会话
+
+        Args:
+            base_url: 预热和保活使用的地址
+            pool_maxsize: 每个主机保留的最大连接数
+            keepalive_interval: 空闲保活间隔（秒），0 表示不保活
+        """
+        self.base_url = base_url
+        self.keepalive_interval = keepalive_interval
+        self.stats = PoolStats()
+        self.last_used = 0.0
+
+        self.session = requests.Session()
+        # 禁用代理（与原先 proxies={'http': None, 'https': None} 一致）
+        self.session.trust_env = False
+        adapter = TimedHTTPAdapter(self.stats, pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stop_event = threading.Event()
+        self._keepalive_thread = None
+
+    def _request(self, method, url, ping=False, **kwargs):
+        self.last_used = time.time()
+        self.stats.begin_request()
+        response = self.session.request(method, url, **kwargs)
+        if ping:
+            self.stats.record_ping()
+        else:
+            self.stats.record_request()
+        return response
+
+    def post(self, url, **kwargs):
+        """
+        发送POST请求，复用的空闲连接已被服务端关闭时重连重试一次
+
+        识别请求不是幂等的（按次计费），只在确定服务端没有处理时重试：连接超时、
+        新建的连接被重置等其他错误直接抛出
+        """
+        try:
+            return self._request('POST', url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if not self._stale_connection(e):
+                raise
+            self.stats.record_reconnect()
+            return self._request('POST', url, **kwargs)
+
+    def _stale_connection(self, error):
+        """请求复用了连接池中的连接（本次没有新建连接），且在收到响应前连接被对方关闭"""
+        if getattr(self.stats.local, 'connected', True):
+            return False
+        cause = error.args[0] if error.args else None
+        return isinstance(cause, ProtocolError)
+
+    def _ping(self):
+        """发送轻量请求以建立/保持连接"""
+        try:
+            self._request('HEAD', self.base_url, ping=True, timeout=5)
+        except Exception:
+            pass
+
+    def warm_up(self, background=True):
+        """预热连接池，提前完成DNS解析和TLS握手"""
+        if background:
+            threading.Thread(target=self._warm_up_worker, daemon=True).start()
+        else:
+            self._warm_up_worker()
+
+        if self.keepalive_interval and self._keepalive_thread is None:
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self._keepalive_thread.start()
+
+    def _warm_up_worker(self):
+        self._ping()
+        stats = self.stats.snapshot()
+        if stats['connections']:
+            print(f"连接池已预热，建连耗时: {stats['last_connect_ms']:.0f}ms")
+
+    def _keepalive_loop(self):
+        """空闲时定期发送保活请求"""
+        while not self._stop_event.wait(self.keepalive_interval):
+            if time.time() - self.last_used >= self.keepalive_interval:
+                self._ping()
+
+    def get_stats(self):
+        """获取连接池统计"""
+        return self.stats.snapshot()
+
+    def close(self):
+        """关闭连接池"""
+        self._stop_event.set()
+        self.session.close()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+空闲开销测量 - 统计进程的CPU时间和线程唤醒次数（上下文切换），
+对比轮询等待与条件变量等待录音结束的空闲开销和松开按键后的唤醒延迟
+
+用法:
+    python -m util.idle_stats [--seconds 5]
+"""
+
+import argparse
+import glob
+import os
+import random
+import threading
+import time
+
+
+def context_switches():
+    """进程所有线程的上下文切换总次数（主动+被动），不支持时返回None"""
+    paths = glob.glob(f'/proc/{os.getpid()}/task/*/status')
+    if paths:
+        total = 0
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    for line in f:
+                        if line.startswith(('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches')):
+                            total += int(line.split()[1])
+            except OSError:
+                continue  # 线程已退出
+        return total
+
+    try:
+        import psutil
+        switches = psutil.Process().num_ctx_switches()
+        return switches.voluntary + switches.involuntary
+    except (ImportError, AttributeError):
+        return None
+
+
+def measure(seconds):
+    """
+    测量一段时间内的空闲开销
+
+    Returns:
+        dict: cpu_ms（进程CPU时间）, wakeups_per_second
+    """
+    cpu_start = time.process_time()
+    switches_start = context_switches()
+    time.sleep(seconds)
+    cpu_ms = (time.process_time() - cpu_start) * 1000
+    switches_end = context_switches()
+    wakeups = None
+    if switches_start is not None and switches_end is not None:
+        wakeups = (switches_end - switches_start) / seconds
+    return {'cpu_ms': cpu_ms, 'wakeups_per_second': wakeups}
+
+
+def benchmark(seconds=5, releases=50):
+    """对比轮询与条件变量：录音中空闲等待的开销，以及结束录音到工作线程醒来的延迟"""
+    from util.cosmic import cosmic
+
+    def polling_worker(woke):
+        while not cosmic.is_recording():
+            time.sleep(0.01)
+        while cosmic.is_recording():
+            time.sleep(0.01)
+        woke.append(time.perf_counter())
+
+    def event_worker(woke):
+        generation = cosmic.generation
+        cosmic.wait_for_stop(generation)
+        woke.append(time.perf_counter())
+
+    def main_polling(stop):
+        while not stop.is_set():
+            time.sleep(1)
+
+    def main_event(stop):
+        stop.wait()
+
+    for name, worker, main_wait in (('轮询 (10ms/1s)', polling_worker, main_polling),
+                                    ('条件变量', event_worker, main_event)):
+        # 空闲开销：一次很长的录音期间工作线程等待结束，主线程等待退出
+        stop = threading.Event()
+        main_thread = threading.Thread(target=main_wait, args=(stop,), daemon=True)
+        main_thread.start()
+        cosmic.start_recording()
+        woke = []
+        thread = threading.Thread(target=worker, args=(woke,), daemon=True)
+        thread.start()
+        idle = measure(seconds)
+        cosmic.stop_recording()
+        thread.join()
+        stop.set()
+        main_thread.join()
+
+        # 唤醒延迟
+        latencies = []
+        for _ in range(releases):
+            cosmic.start_recording()
+            woke = []
+            thread = threading.Thread(target=worker, args=(woke,), daemon=True)
+            thread.start()
+            # 随机化松开时刻，避免与轮询周期同相
+            time.sleep(0.02 + random.uniform(0, 0.01))
+            released = time.perf_counter()
+            cosmic.stop_recording()
+            thread.join()
+            latencies.append((woke[0] - released) * 1000)
+        latencies.sort()
+
+        wakeups = idle['wakeups_per_second']
+        wakeups_text = f"{wakeups:6.1f} 次/秒" if wakeups is not None else "不支持"
+        print(f"{name:<14} 空闲CPU {idle['cpu_ms'] / seconds:6.2f}ms/秒  唤醒 {wakeups_text}  "
+              f"松开后唤醒延迟 p50 {latencies[len(latencies) // 2]:.2f}ms / "
+              f"max {latencies[-1]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空闲开销测量")
+    parser.add_argument('--seconds', type=float, default=5, help="每种方式的空闲测量时长")
+    args = parser.parse_args()
+    benchmark(args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,88 @@
 import keyboard
 import time
 import asyncio
-from threading import Event
+from threading import Lock, Timer
 from concurrent.futures import ThreadPoolExecutor
 from config import ClientConfig
 from util.cosmic import cosmic
+from util.latency import LatencyHistogram
+from util.shortcut_state import (
+    ShortcutStateMachine, START, CANCEL, FINISH, SEND_KEY, RESTORE
+)
 from util.waveform_display import show_waveform, hide_waveform
 
+# 前台窗口进程查询（Windows）
+try:
+    import win32gui
+    import win32process
+    import psutil
+    HAS_WIN32 = True
+except ImportError:
+    HAS_WIN32 = False
+
+# 前台为这些输入法进程时不恢复按键
+INPUT_METHOD_PROCESSES = (
+    'sogouinput.exe', 'qqpinyin.exe', 'baiduinput.exe',
+    'microsoftpinyin.exe', 'ctfmon.exe', 'inputmethod.exe'
+)
+
+
+class ProcessClassifier:
+    """按PID缓存前台进程是否为输入法，过期后重新查询（PID可能被新进程复用）"""
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.entries = {}  # pid -> (进程名, 是否输入法, 过期时间)
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, pid):
+        """
+        Returns:
+            tuple: (进程名, 是否输入法进程)
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(pid)
+            if entry and entry[2] > now:
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+
+        process_name = psutil.Process(pid).name().lower()
+        is_input_method = any(ime in process_name for ime in INPUT_METHOD_PROCESSES)
+        with self.lock:
+            if len(self.entries) >= 64:
+                self.entries = {key: value for key, value in self.entries.items() if value[2] > now}
+            self.entries[pid] = (process_name, is_input_method, now + self.ttl)
+        return process_name, is_input_method
+
 
 class KeyboardHandler:
-    """键盘监听处理器"""
+    """键盘监听处理器：钩子只注册一次，按键含义由状态机决定"""
 
     def __init__(self):
-        self.pressed = False
-        self.released = True
-        self.event = Event()
+        self.hook = None
+        self.lock = Lock()
+        self.machine = self._new_machine()
+        self.timer = None
+        self.timer_deadline = None
         self.pool = ThreadPoolExecutor(max_workers=2)
-        self.task = None
+        # 钩子回调只做状态转换，动作按顺序交给单独的线程执行；恢复按键有自己的线程，其等待不影响下次录音
+        self.actions = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shortcut')
+        self.restorer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='key-restore')
+        self.processes = ProcessClassifier()
+        # 钩子回调耗时（回调返回前系统的键盘事件处理被阻塞）和动作执行耗时
+        self.hook_time = LatencyHistogram(min_latency=0.000001, max_latency=1.0)
+        self.action_time = LatencyHistogram(min_latency=0.0001, max_latency=10.0)
+
+    def _new_machine(self):
+        return ShortcutStateMachine(
+            hold_mode=ClientConfig.hold_mode,
+            threshold=ClientConfig.threshold,
+            restore_key=ClientConfig.restore_key
+        )
 
     def shortcut_correct(self, e):
         """验证按键是否正确"""
@@ -30,10 +96,11 @@ class KeyboardHandler:
         cosmic.start_recording()
         cosmic.set_audio_file(self.generate_audio_filename())
         
-        # 延迟显示波形（超过0.5秒阈值后）
+        generation = cosmic.generation
+        
+        # 延迟显示波形（超过0.5秒阈值后仍在录音）
         def delayed_waveform():
-            time.sleep(ClientConfig.threshold)
-            if cosmic.is_recording():
+            if not cosmic.wait_for_stop(generation, timeout=ClientConfig.threshold):
                 show_waveform()
         
         self.pool.submit(delayed_waveform)
@@ -45,9 +112,6 @@ class KeyboardHandler:
         cosmic.reset()
         if ClientConfig.show_waveform:
             hide_waveform()  # 隐藏波形窗口
-        
-        # 取消录音后也重启键盘监听
-        self.restart()
 
     def finish_recording(self):
         """完成录音"""
@@ -61,9 +125,6 @@ class KeyboardHandler:
         else:
             print("录音完成")
         
-        # 录音完成后重启键盘监听
-        self.restart()
-        
         return cosmic.get_audio_file()
 
     def generate_audio_filename(self):
@@ -72,116 +133,112 @@ class KeyboardHandler:
         return f"recordings/recording_{timestamp}.wav"
 
     def smart_restore_key(self):
-        """智能恢复按键状态，避免干扰输入法"""
+        """智能恢复按键状态，避免干扰输入法（在恢复线程中执行）"""
         try:
-            import win32gui
-            import win32process
-            import psutil
-            
-            # 获取当前活动窗口
-            hwnd = win32gui.GetForegroundWindow()
-            if hwnd:
-                _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                process = psutil.Process(pid)
-                process_name = process.name().lower()
-                
-                # 如果是输入法相关进程，不恢复按键
-                input_method_processes = [
-                    'sogouinput.exe', 'qqpinyin.exe', 'baiduinput.exe',
-                    'microsoftpinyin.exe', 'ctfmon.exe', 'inputmethod.exe'
-                ]
-                
-                if any(ime in process_name for ime in input_method_processes):
-                    print(f"检测到输入法进程 {process_name}，跳过按键恢复")
-                    return
+            if HAS_WIN32:
+                # 获取当前活动窗口
+                hwnd = win32gui.GetForegroundWindow()
+                if hwnd:
+                    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                    process_name, is_input_method = self.processes.classify(pid)
+                    
+                    # 如果是输入法相关进程，不恢复按键
+                    if is_input_method:
+                        print(f"检测到输入法进程 {process_name}，跳过按键恢复")
+                        return
             
             # 延迟后恢复按键
             time.sleep(0.1)  # 增加延迟时间
             keyboard.send(ClientConfig.shortcut)
             
-        except ImportError:
-            # 如果没有win32库，使用简单延迟
-            time.sleep(0.1)
-            keyboard.send(ClientConfig.shortcut)
         except Exception as e:
             print(f"智能恢复按键失败: {e}")
             # 失败时使用原始方法
             time.sleep(0.01)
             keyboard.send(ClientConfig.shortcut)
 
-    def count_down(self, e):
-        """按下后开始倒数"""
-        time.sleep(ClientConfig.threshold)
-        e.set()
+    def keyboard_event_handler(self, e):
+        """键盘事件处理器"""
+        if not self.shortcut_correct(e):
+            return
+
+        start = time.perf_counter()
+        with self.lock:
+            actions = self.machine.on_key(e.event_type, time.monotonic())
+            self._schedule_timeout()
+        if actions:
+            self.submit(actions)
+        self.hook_time.record(time.perf_counter() - start)
+
+    def _schedule_timeout(self):
+        """按状态机的超时时间设置定时器（调用方持有锁）"""
+        deadline = self.machine.deadline
+        if deadline == self.timer_deadline:
+            return
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.timer_deadline = deadline
+        if deadline is not None:
+            self.timer = Timer(max(0.0, deadline - time.monotonic()), self._on_timeout)
+            self.timer.daemon = True
+            self.timer.start()
 
-    def manage_task(self, e):
-        """管理录音任务"""
-        was_recording = cosmic.is_recording()
+    def _on_timeout(self):
+        """阈值倒计时到期"""
+        with self.lock:
+            self.timer = None
+            self.timer_deadline = None
+            actions = self.machine.on_timeout(time.monotonic())
+            self._schedule_timeout()
+        if actions:
+            self.submit(actions)
 
-        # 启动录音
-        if not was_recording:
-            self.launch_recording()
+    def submit(self, actions):
+        """把动作交给动作线程（恢复按键交给恢复线程），不在钩子回调中执行"""
+        if RESTORE in actions:
+            self.restorer.submit(self._timed, self.smart_restore_key)
+            actions = [action for action in actions if action != RESTORE]
+        if actions:
+            self.actions.submit(self._timed, self.perform, actions)
 
-        # 检查是否是单击（及时松开）
-        if e.wait(timeout=ClientConfig.threshold * 0.8):
-            if cosmic.is_recording() and was_recording:
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"快捷键动作执行失败: {e}")
+        self.action_time.record(time.perf_counter() - start)
+
+    def perform(self, actions):
+        """执行状态机输出的动作"""
+        for action in actions:
+            if action == START:
+                self.launch_recording()
+            elif action == CANCEL:
+                self.cancel_recording()
+            elif action == FINISH:
                 audio_file = self.finish_recording()
                 # 异步处理识别
                 asyncio.run_coroutine_threadsafe(
                     self.process_recognition(audio_file),
                     cosmic.loop
                 )
-        else:
-            # 长按，取消录音并发送按键
-            if not was_recording:
-                self.cancel_recording()
-            keyboard.send(ClientConfig.shortcut)
-
-    def click_mode_handler(self, e):
-        """单击模式处理器"""
-        if e.event_type == 'down' and self.released:
-            self.pressed, self.released = True, False
-            self.event = Event()
-            self.pool.submit(self.count_down, self.event)
-            self.pool.submit(self.manage_task, self.event)
-
-        elif e.event_type == 'up' and self.pressed:
-            self.pressed, self.released = False, True
-            self.event.set()
-
-    def hold_mode_handler(self, e):
-        """长按模式处理器"""
-        if e.event_type == 'down' and not cosmic.is_recording():
-            self.launch_recording()
-
-        elif e.event_type == 'up':
-            start_time = cosmic.recording_start_time
-            if start_time:
-                duration = time.time() - start_time
-
-                if duration < ClientConfig.threshold:
-                    self.cancel_recording()
-                else:
-                    audio_file = self.finish_recording()
-                    # 异步处理识别
-                    asyncio.run_coroutine_threadsafe(
-                        self.process_recognition(audio_file),
-                        cosmic.loop
-                    )
-
-                    # 智能恢复按键状态
-                    if ClientConfig.restore_key:
-                        self.smart_restore_key()
-
-    def keyboard_event_handler(self, e):
-        """键盘事件处理器"""
-        if not self.shortcut_correct(e):
-            return
+            elif action == SEND_KEY:
+                # 单击模式长按：转发原按键
+                keyboard.send(ClientConfig.shortcut)
+            elif action == RESTORE:
+                # 智能恢复按键状态
+                self.smart_restore_key()
 
-        if ClientConfig.hold_mode:
-            self.hold_mode_handler(e)
-        else:
-            self.click_mode_handler(e)
+    def get_stats(self):
+        """状态机统计、钩子回调耗时、动作执行耗时和进程分类缓存命中"""
+        with self.lock:
+            stats = self.machine.get_stats()
+        stats['hook'] = self.hook_time.snapshot()
+        stats['action'] = self.action_time.snapshot()
+        stats['process_cache'] = {'hits': self.processes.hits, 'misses': self.processes.misses}
+        return stats
 
     async def process_recognition(self, audio_file):
         """处理语音识别（由服务端完成，此处仅占位）"""
@@ -193,37 +250,38 @@ class KeyboardHandler:
             })
 
     def start(self):
-        """启动键盘监听"""
+        """启动键盘监听（钩子只注册一次，直到 stop）"""
+        if self.hook is not None:
+            return
+        with self.lock:
+            self.machine = self._new_machine()
         suppress = ClientConfig.suppress or not ClientConfig.hold_mode
-        keyboard.hook_key(
+        self.hook = keyboard.hook_key(
             ClientConfig.shortcut,
             self.keyboard_event_handler,
             suppress=suppress
         )
         print(f"键盘监听已启动，使用按键: {ClientConfig.shortcut}")
         print("长按模式" if ClientConfig.hold_mode else "单击模式")
-
-    def restart(self):
-        """重启键盘监听，确保下次按键正常"""
-        try:
-            # 停止当前监听
-            keyboard.unhook_all()
-            
-            # 重新启动监听
-            suppress = ClientConfig.suppress or not ClientConfig.hold_mode
-            keyboard.hook_key(
-                ClientConfig.shortcut,
-                self.keyboard_event_handler,
-                suppress=suppress
-            )
-            
-        except Exception as e:
-            print(f"重启键盘监听失败: {e}")
     
     def stop(self):
-        """停止键盘监听"""
-        keyboard.unhook_all()
+        """停止键盘监听（只移除自己的钩子，不影响其他钩子）"""
+        if self.hook is not None:
+            keyboard.unhook(self.hook)
+            self.hook = None
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+                self.timer_deadline = None
+        self.actions.shutdown(wait=True)
+        self.restorer.shutdown(wait=True)
         self.pool.shutdown(wait=True)
+        stats = self.get_stats()
+        hook = stats['hook']
+        if hook['count']:
+            print(f"键盘事件 {hook['count']} 次，钩子回调耗时 p50 {hook['p50'] * 1e6:.0f}us / "
+                  f"p99 {hook['p99'] * 1e6:.0f}us")
         print("键盘监听已停止")
 
 
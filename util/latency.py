@@ -0,0 +1,73 @@
+"""
+延迟统计 - 对数分桶直方图，用于估算各ASR服务的延迟分位数
+"""
+
+import math
+import threading
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图，样本过多时整体减半以跟随近期变化"""
+
+    def __init__(self, min_latency=0.01, max_latency=60.0, growth=1.2, max_count=1000):
+        """
+        Args:
+            min_latency: 第一个桶的上界（秒）
+            max_latency: 最后一个桶的上界（秒）
+            growth: 相邻桶上界的倍数
+            max_count: 样本数超过该值时所有桶计数减半
+        """
+        self.bounds = []
+        bound = min_latency
+        while bound < max_latency:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_latency)
+
+        self.counts = [0] * len(self.bounds)
+        self.total = 0
+        self.max_count = max_count
+        self.log_min = math.log(min_latency)
+        self.log_growth = math.log(growth)
+        self.lock = threading.Lock()
+
+    def _bucket(self, latency):
+        if latency <= self.bounds[0]:
+            return 0
+        index = int(math.ceil((math.log(latency) - self.log_min) / self.log_growth))
+        return min(index, len(self.bounds) - 1)
+
+    def record(self, latency):
+        """记录一次延迟（秒）"""
+        with self.lock:
+            self.counts[self._bucket(latency)] += 1
+            self.total += 1
+            if self.total > self.max_count:
+                self.counts = [count // 2 for count in self.counts]
+                self.total = sum(self.counts)
+
+    def percentile(self, percent):
+        """估算分位数（秒），无样本时返回None"""
+        with self.lock:
+            if not self.total:
+                return None
+            target = self.total * percent / 100
+            cumulative = 0
+            for bound, count in zip(self.bounds, self.counts):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+            return self.bounds[-1]
+
+    def count(self):
+        with self.lock:
+            return self.total
+
+    def snapshot(self):
+        """获取常用分位数"""
+        return {
+            'count': self.count(),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
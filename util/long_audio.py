@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+长音频分段识别 - 在静音处切分长录音，并行识别各段后拼接文本
+
+一句话识别接口（腾讯云SentenceRecognition限60秒）和火山引擎极速版都有时长/大小限制，
+会议长度的录音需要分段。文件通过内存映射读取，只在每个切分点附近的搜索窗口内计算能量，
+同时在识别中的分段数受线程数限制，内存占用与文件长度无关。
+
+用法:
+    python -m util.long_audio meeting.wav [--workers 4] [--chunk 55]
+    python -m util.long_audio meeting.wav --plan        # 只输出切分点，不识别
+"""
+
+import argparse
+import mmap
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from util.capture_buffer import pcm_to_wav
+from util.vad import frame_rms
+
+# 分段结尾的标点，拼接时比较重叠前先去掉
+TRAILING_PUNCTUATION = '。，！？、；：,.!?;: '
+
+
+def parse_wav_header(data):
+    """
+    解析WAV文件头，按块查找 fmt 和 data（不假设文件头固定44字节）
+
+    Returns:
+        dict: rate, channels, sample_width, data_offset, data_size
+    """
+    if len(data) < 12 or bytes(data[:4]) != b'RIFF' or bytes(data[8:12]) != b'WAVE':
+        raise Exception("不是有效的WAV文件")
+
+    info = {}
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            audio_format, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', data, body)
+            if audio_format != 1 or bits != 16:
+                raise Exception("只支持16位PCM格式的WAV文件")
+            info.update(rate=rate, channels=channels, sample_width=bits // 8)
+        elif chunk_id == b'data':
+            # 录音中断的文件data长度可能不准，以实际文件大小为上限
+            info.update(data_offset=body, data_size=min(chunk_size, len(data) - body))
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+
+    if 'rate' not in info or 'data_offset' not in info:
+        raise Exception("WAV文件缺少fmt或data块")
+    return info
+
+
+def wav_duration(data):
+    """WAV数据的时长（秒），无法解析时返回0"""
+    try:
+        info = parse_wav_header(data)
+    except Exception:
+        return 0.0
+    return info['data_size'] / (info['rate'] * info['channels'] * info['sample_width'])
+
+
+def plan_chunks(samples, rate, max_chunk=55.0, min_chunk=20.0, overlap=1.0,
+                silence_rms=300, min_silence=0.3, frame_ms=20):
+    """
+    计算切分点：在 [min_chunk, max_chunk] 窗口内找最长的静音段，从其中点切开；
+    窗口内没有静音时在能量最低处切开，并让相邻两段重叠 overlap 秒，拼接时去重
+
+    Args:
+        samples: 单声道int16采样（可为内存映射的视图）
+        rate: 采样率
+
+    Returns:
+        list: [(起始采样, 结束采样, 是否与上一段重叠), ...]
+    """
+    total = len(samples)
+    max_len = int(max_chunk * rate)
+    min_len = int(min_chunk * rate)
+    overlap_len = int(overlap * rate)
+    frame_size = int(rate * frame_ms / 1000)
+    min_silence_frames = max(1, int(min_silence * 1000 / frame_ms))
+
+    chunks = []
+    start = 0
+    overlapped = False
+    while total - start > max_len:
+        window_start = start + min_len
+        frame_count = (max_len - min_len) // frame_size
+        frames = samples[window_start:window_start + frame_count * frame_size].reshape(frame_count, frame_size)
+        rms = frame_rms(frames)
+
+        silent = rms < silence_rms
+        split = None
+        if silent.any():
+            # 找最长的连续静音段
+            edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+            run_starts = np.flatnonzero(edges == 1)
+            run_ends = np.flatnonzero(edges == -1)
+            longest = np.argmax(run_ends - run_starts)
+            if run_ends[longest] - run_starts[longest] >= min_silence_frames:
+                middle = int(run_starts[longest] + run_ends[longest]) // 2
+                split = window_start + middle * frame_size
+
+        if split is not None:
+            chunks.append((max(0, start - overlap_len) if overlapped else start, split, overlapped))
+            start = split
+            overlapped = False
+        else:
+            split = window_start + int(np.argmin(rms)) * frame_size
+            chunks.append((max(0, start - overlap_len) if overlapped else start, split + overlap_len, overlapped))
+            start = split
+            overlapped = True
+
+    chunks.append((max(0, start - overlap_len) if overlapped else start, total, overlapped))
+    return chunks
+
+
+def merge_overlap(previous, text, max_overlap=30):
+    """拼接两段文本，去掉前一段结尾与后一段开头重复的部分（至少2个字）"""
+    head = previous.rstrip(TRAILING_PUNCTUATION)
+    for size in range(min(len(head), len(text), max_overlap), 1, -1):
+        if head[-size:] == text[:size]:
+            return head + text[size:]
+    return previous + text
+
+
+def transcribe_samples(samples, rate, recognize_fn, workers=4, max_chunk=55.0, channels=1, **plan_options):
+    """
+    分段并行识别
+
+    Args:
+        samples: int16采样（多声道为交错排列）
+        rate: 采样率
+        recognize_fn: 识别函数，参数为WAV数据，返回文本
+        workers: 并行识别的分段数
+        max_chunk: 分段最长时长（秒）
+        channels: 声道数
+
+    Returns:
+        tuple: (文本, 统计信息dict)
+    """
+    if channels > 1:
+        # 交错排列的多声道采样按帧重排为二维视图（不复制）
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels)
+    mono = samples[:, 0] if channels > 1 else samples
+    chunks = plan_chunks(mono, rate, max_chunk=max_chunk, **plan_options)
+
+    def recognize_chunk(chunk):
+        start, end, _ = chunk
+        if channels > 1:
+            # 分段内混为单声道
+            pcm = samples[start:end].mean(axis=1).astype(np.int16)
+        else:
+            pcm = samples[start:end]
+        return recognize_fn(pcm_to_wav(pcm.tobytes(), rate)) or ''
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map按提交顺序返回结果；线程数限制了同时存在的分段数据
+        texts = list(executor.map(recognize_chunk, chunks))
+
+    text = ''
+    for (_, _, overlapped), chunk_text in zip(chunks, texts):
+        text = merge_overlap(text, chunk_text) if overlapped else text + chunk_text
+
+    stats = {
+        'chunks': len(chunks),
+        'overlapped': sum(1 for chunk in chunks if chunk[2]),
+        'audio_seconds': len(mono) / rate,
+        'elapsed': time.perf_counter() - begin,
+    }
+    return text, stats
+
+
+def transcribe_wav_data(wav_data, recognize_fn, **options):
+    """分段识别内存中的WAV数据（bytes / memoryview，不复制）"""
+    info = parse_wav_header(wav_data)
+    samples = np.frombuffer(
+        wav_data, dtype=np.int16,
+        count=info['data_size'] // 2, offset=info['data_offset']
+    )
+    return transcribe_samples(samples, info['rate'], recognize_fn, channels=info['channels'], **options)
+
+
+@contextmanager
+def map_file(path):
+    """
+    只读内存映射文件
+
+    出错时异常回溯（包括其他分段的识别异常）仍引用映射上的采样视图，此时关闭映射会抛出
+    BufferError 并掩盖原来的异常；这种情况下不强制关闭，视图释放后映射随对象回收
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                pass
+
+
+def transcribe_file(path, recognize_fn, **options):
+    """分段识别WAV文件，通过内存映射读取"""
+    with map_file(path) as mm:
+        return transcribe_wav_data(mm, recognize_fn, **options)
+
+
+def file_duration(path):
+    """WAV文件时长（秒），只读取文件头"""
+    with open(path, 'rb') as f:
+        header = f.read(4096)
+        size = f.seek(0, 2)
+    try:
+        info = parse_wav_header(header)
+    except Exception:
+        return 0.0
+    data_size = size - info['data_offset']
+    return data_size / (info['rate'] * info['channels'] * info['sample_width'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长音频分段识别")
+    parser.add_argument('path', help="WAV文件")
+    parser.add_argument('--workers', type=int, default=4, help="并行识别的分段数")
+    parser.add_argument('--chunk', type=float, default=55.0, help="分段最长时长（秒）")
+    parser.add_argument('--plan', action='store_true', help="只输出切分点，不识别")
+    args = parser.parse_args()
+
+    if args.plan:
+        with map_file(args.path) as mm:
+            info = parse_wav_header(mm)
+            samples = np.frombuffer(mm, dtype=np.int16, count=info['data_size'] // 2,
+                                    offset=info['data_offset'])
+            mono = samples[::info['channels']]
+            for start, end, overlapped in plan_chunks(mono, info['rate'], max_chunk=args.chunk):
+                print(f"{start / info['rate']:8.2f}s - {end / info['rate']:8.2f}s"
+                      f"{'  (重叠)' if overlapped else ''}")
+            del samples, mono
+        return
+
+    from util.asr_manager import asr_manager
+    text, stats = transcribe_file(
+        args.path, asr_manager.recognize_audio_data, workers=args.workers, max_chunk=args.chunk
+    )
+    print(text)
+    print(f"{stats['audio_seconds']:.1f}秒音频，{stats['chunks']} 段（{stats['overlapped']} 处重叠），"
+          f"耗时 {stats['elapsed']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+电平测量 - 用整数运算计算RMS、峰值和削波，按固定频率（与音频块大小无关）输出电平，
+同时累计整段录音的响度统计，随识别结果一起保存
+
+用法（每块音频的测量耗时对比）:
+    python -m util.meter
+"""
+
+import math
+
+import numpy as np
+
+FULL_SCALE = 32768
+
+
+def to_dbfs(value):
+    """int16幅度转换为dBFS，0返回None"""
+    if value <= 0:
+        return None
+    return round(20 * math.log10(value / FULL_SCALE), 1)
+
+
+class LevelMeter:
+    """按固定频率输出电平的测量器（单线程使用，由录音消费线程调用）"""
+
+    def __init__(self, rate=16000, update_rate=30, clip_level=32767, listener=None):
+        """
+        Args:
+            rate: 采样率
+            update_rate: 电平输出频率（次/秒），0 表示只累计整段统计
+            clip_level: 幅度达到该值视为削波
+            listener: 电平回调，参数为 (rms, peak, clipped)，均为整数/布尔值
+        """
+        self.window = rate // update_rate if update_rate else 0
+        self.clip_level = clip_level
+        self.listener = listener
+        self.segments = {}  # (窗口内已有采样数, 块长度) -> (切段起点, 各段长度)，块长度固定时只有少数几种
+        self.reset()
+
+    def reset(self):
+        """开始新的一段录音"""
+        # 当前未满的输出窗口
+        self.window_sum = 0
+        self.window_count = 0
+        self.window_peak = 0
+        self.window_clipped = 0
+        # 整段统计
+        self.total_sum = 0
+        self.total_count = 0
+        self.total_peak = 0
+        self.total_clipped = 0
+
+    def add(self, data):
+        """处理一块int16 PCM数据，每凑满一个窗口输出一次电平"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples)
+        if not n:
+            return
+
+        # 只生成一个int64副本用于平方和与峰值，削波直接在int16上计数，不生成绝对值数组
+        wide = samples.astype(np.int64)
+
+        if not self.window:
+            square_sum = int(np.dot(wide, wide))
+            peak = max(int(samples[samples.argmax()]), -int(samples[samples.argmin()]))
+            clipped = self._count_clipped(samples) if peak >= self.clip_level else 0
+        else:
+            # 原地平方后分段求和与求最大值：平方的最大值开方即为峰值
+            starts, bounds = self._segments(n)
+            squares = np.multiply(wide, wide, out=wide)
+            sums = np.add.reduceat(squares, starts).tolist()
+            peak_squares = np.maximum.reduceat(squares, starts).tolist()
+            square_sum = sum(sums)
+            peak = clipped = 0
+            for (begin, end), total, peak_square in zip(bounds, sums, peak_squares):
+                segment_peak = math.isqrt(peak_square)
+                if segment_peak > peak:
+                    peak = segment_peak
+                self.window_sum += total
+                self.window_count += end - begin
+                if segment_peak > self.window_peak:
+                    self.window_peak = segment_peak
+                if segment_peak >= self.clip_level:
+                    # 削波很少出现，只在峰值达到削波电平时才计数
+                    segment_clipped = self._count_clipped(samples[begin:end])
+                    self.window_clipped += segment_clipped
+                    clipped += segment_clipped
+                if self.window_count >= self.window:
+                    self._emit()
+
+        # 整段统计
+        self.total_sum += square_sum
+        self.total_count += n
+        if peak > self.total_peak:
+            self.total_peak = peak
+        self.total_clipped += clipped
+
+    def _count_clipped(self, samples):
+        """幅度达到削波电平的采样数（在int16上分别比较正负两侧）"""
+        return int(np.count_nonzero(samples >= self.clip_level)) + int(np.count_nonzero(samples <= -self.clip_level))
+
+    def _segments(self, n):
+        """按输出窗口边界切段：第一段补满上一块剩下的窗口，最后一段可能留到下一块"""
+        key = (self.window_count, n)
+        if key not in self.segments:
+            first = self.window - self.window_count
+            starts = np.concatenate(([0], np.arange(first, n, self.window)))
+            ends = np.append(starts[1:], n)
+            self.segments[key] = (starts, list(zip(starts.tolist(), ends.tolist())))
+        return self.segments[key]
+
+    def _emit(self):
+        rms = math.isqrt(self.window_sum // self.window_count)
+        if self.listener:
+            self.listener(rms, self.window_peak, self.window_clipped > 0)
+        self.window_sum = self.window_count = self.window_peak = self.window_clipped = 0
+
+    def loudness(self):
+        """
+        整段录音的响度统计
+
+        Returns:
+            dict: rms_dbfs, peak_dbfs（无声时为None），clipped（削波采样数）
+        """
+        rms = math.isqrt(self.total_sum // self.total_count) if self.total_count else 0
+        return {
+            'rms_dbfs': to_dbfs(rms),
+            'peak_dbfs': to_dbfs(self.total_peak),
+            'clipped': self.total_clipped,
+        }
+
+
+def benchmark(chunk=1024, rate=16000, repeat=20000):
+    """对比每块音频的电平计算耗时：原浮点实现（每块输出一次）与整数实现（不同输出频率）"""
+    import time
+    from util.vad import chunk_rms
+
+    rng = np.random.default_rng(0)
+    data = (rng.standard_normal(chunk) * 3000).astype(np.int16).tobytes()
+
+    def float_meter():
+        rms = chunk_rms(np.frombuffer(data, dtype=np.int16))
+        if rms > 0:
+            return min(100, max(0, np.log10(rms + 1) * 25))
+        return 0
+
+    def measure(fn, rounds=5):
+        """取多轮中最快的一轮，减少其他进程的干扰"""
+        for _ in range(100):
+            fn()
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(repeat // rounds):
+                fn()
+            best = min(best, (time.perf_counter() - start) / (repeat // rounds))
+        return best * 1e6
+
+    print(f"每块 {chunk} 个采样（{chunk / rate * 1000:.0f}ms）:")
+    print(f"  {'浮点 (chunk_rms + log10)':<28} {measure(float_meter):6.1f}us")
+    for update_rate in (0, 15, 30, 60):
+        meter = LevelMeter(rate, update_rate, listener=lambda rms, peak, clipped: None)
+        name = f"整数 输出{update_rate}次/秒" if update_rate else "整数 只累计整段统计"
+        print(f"  {name:<28} {measure(lambda: meter.add(data)):6.1f}us")
+
+
+if __name__ == "__main__":
+    benchmark()
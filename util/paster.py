@@ -0,0 +1,304 @@
+"""
+结果输出 - 把识别结果粘贴或键入到当前窗口
+
+剪贴板由一把锁串行占用：连续的多次粘贴只在第一次保存原剪贴板内容，最后一次粘贴后
+经过 restore_clip_delay 没有新的粘贴才恢复。Windows 下以延迟渲染写入剪贴板，前台窗口
+读取剪贴板时才提供内容，由此得知粘贴完成；无法检测时每次粘贴后保持剪贴板内容 PASTE_HOLD 秒。
+等待只推迟下一次改写和恢复，不阻塞本次粘贴。短结果可直接模拟键入，不经过剪贴板
+"""
+
+import os
+import threading
+import time
+
+from config import ClientConfig
+from util.latency import LatencyHistogram
+
+try:
+    import keyboard
+    import pyperclip
+    HAS_CLIPBOARD = True
+except ImportError:
+    HAS_CLIPBOARD = False
+
+# 延迟渲染检测粘贴完成（Windows）
+try:
+    import win32api
+    import win32clipboard
+    import win32con
+    import win32gui
+    import win32process
+    HAS_WIN32 = True
+except ImportError:
+    HAS_WIN32 = False
+
+PASTE_HOLD = 0.5   # 等待目标窗口读取剪贴板的最长时间（秒）；无法检测时粘贴后固定保持这段时间
+
+
+class ClipboardOwner:
+    """
+    以延迟渲染占有剪贴板（Windows）：写入时只声明文本格式，有程序读取时窗口收到
+    WM_RENDERFORMAT 才提供内容；读取者属于前台窗口的进程即视为粘贴完成
+    """
+
+    def __init__(self):
+        self.hwnd = None
+        self.text = None                  # 待渲染的文本
+        self.rendered = threading.Event() # 前台窗口已读取本次写入的内容
+        self.rendered_at = None
+        self.lost = False                 # 读取前剪贴板已被其他程序清空
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait(2.0)
+
+    def _run(self, ready):
+        """创建仅消息窗口并处理剪贴板消息"""
+        try:
+            window_class = win32gui.WNDCLASS()
+            window_class.lpszClassName = 'CapsWriterClipboardOwner'
+            window_class.lpfnWndProc = self._window_proc
+            window_class.hInstance = win32api.GetModuleHandle(None)
+            win32gui.RegisterClass(window_class)
+            self.hwnd = win32gui.CreateWindow(
+                window_class.lpszClassName, '', 0, 0, 0, 0, 0,
+                win32con.HWND_MESSAGE, 0, window_class.hInstance, None
+            )
+        except Exception as e:
+            print(f"剪贴板延迟渲染不可用，粘贴后固定保持{PASTE_HOLD}秒: {str(e)}")
+            self.hwnd = None
+        finally:
+            ready.set()
+        if self.hwnd:
+            win32gui.PumpMessages()
+
+    def _window_proc(self, hwnd, message, wparam, lparam):
+        if message == win32con.WM_RENDERFORMAT:
+            self._render()
+            return 0
+        if message == win32con.WM_RENDERALLFORMATS:
+            # 窗口销毁前仍占有剪贴板，把内容实际写入
+            try:
+                win32clipboard.OpenClipboard(hwnd)
+                try:
+                    if win32clipboard.GetClipboardOwner() == hwnd:
+                        self._render()
+                finally:
+                    win32clipboard.CloseClipboard()
+            except Exception:
+                pass
+            return 0
+        if message == win32con.WM_DESTROYCLIPBOARD:
+            if not self.rendered.is_set():
+                self.lost = True
+            return 0
+        return win32gui.DefWindowProc(hwnd, message, wparam, lparam)
+
+    def _render(self):
+        """提供文本内容，读取者是前台窗口的进程时记为粘贴完成"""
+        if self.text is None:
+            return
+        try:
+            win32clipboard.SetClipboardData(win32con.CF_UNICODETEXT, self.text)
+        except Exception:
+            return
+        if self._read_by_foreground():
+            self.rendered_at = time.perf_counter()
+            self.rendered.set()
+
+    def _read_by_foreground(self):
+        """当前打开剪贴板的窗口是否属于前台窗口的进程（剪贴板管理器、本程序自己的读取不算）"""
+        try:
+            opener = win32clipboard.GetOpenClipboardWindow()
+            foreground = win32gui.GetForegroundWindow()
+            if not opener or not foreground:
+                return False
+            _, opener_pid = win32process.GetWindowThreadProcessId(opener)
+            _, foreground_pid = win32process.GetWindowThreadProcessId(foreground)
+            return opener_pid == foreground_pid and opener_pid != os.getpid()
+        except Exception:
+            return False
+
+    def copy(self, text):
+        """以延迟渲染写入文本（失败时抛出异常）"""
+        win32clipboard.OpenClipboard(self.hwnd)
+        try:
+            # 清空时上一次的内容会收到 WM_DESTROYCLIPBOARD，之后再重置状态
+            win32clipboard.EmptyClipboard()
+            self.text = text
+            self.rendered.clear()
+            self.rendered_at = None
+            self.lost = False
+            win32clipboard.SetClipboardData(win32con.CF_UNICODETEXT, None)
+        finally:
+            win32clipboard.CloseClipboard()
+
+    def owns(self):
+        """剪贴板是否仍由本窗口占有（不触发渲染）"""
+        try:
+            return win32clipboard.GetClipboardOwner() == self.hwnd
+        except Exception:
+            return False
+
+
+class Paster:
+    """串行输出识别结果，按方式统计输出耗时（不含等待上一次粘贴完成的时间）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()   # 剪贴板占用（键入也需等待上一次粘贴完成）
+        self.original = None           # 第一次粘贴前的剪贴板内容，恢复后清空
+        self.pasted = None             # 最后一次写入剪贴板的内容
+        self.restore_timer = None
+        self.burst = 0                 # 剪贴板粘贴次数，恢复时据此判断之后是否又有粘贴
+        self.pasted_at = None          # 最近一次发送 Ctrl+V 的时间，确认完成或保持期结束前不改写剪贴板
+        self.owner = None              # ClipboardOwner，不可用时为 False
+        self.detecting = False         # 最近一次粘贴是否以延迟渲染写入
+        self.latency = {
+            'clipboard': LatencyHistogram(min_latency=0.001, max_latency=5.0),
+            'type': LatencyHistogram(min_latency=0.001, max_latency=5.0),
+        }
+        self.read_time = LatencyHistogram(min_latency=0.001, max_latency=5.0)   # Ctrl+V 到目标窗口读取剪贴板
+        self.detected = 0    # 检测到目标窗口读取剪贴板的次数
+        self.clobbered = 0   # 读取前剪贴板已被其他程序改写的次数（该次粘贴可能不正确）
+        self.restores = 0
+
+    def choose_method(self, text):
+        """短的单行结果直接键入，其余经过剪贴板"""
+        if len(text) <= ClientConfig.type_max_chars and '\n' not in text:
+            return 'type'
+        return 'clipboard'
+
+    def paste(self, text):
+        """
+        输出结果到当前窗口（上一次粘贴尚未完成时先等待）
+
+        Returns:
+            str: 使用的方式 'clipboard' 或 'type'
+        """
+        if not HAS_CLIPBOARD:
+            raise Exception("pyperclip 或 keyboard 未安装，无法自动粘贴")
+
+        method = self.choose_method(text)
+        with self.lock:
+            if method == 'clipboard':
+                self._hold()
+            start = time.perf_counter()
+            if method == 'type':
+                keyboard.write(text)
+            else:
+                self._paste_clipboard(text)
+            self.latency[method].record(time.perf_counter() - start)
+
+            if method == 'clipboard' and self.original is not None:
+                # 连续粘贴时推迟恢复，只在最后一次粘贴后恢复（恢复前同样等待粘贴完成）
+                self.restore_timer = threading.Timer(
+                    ClientConfig.restore_clip_delay, self._restore, args=(self.burst,)
+                )
+                self.restore_timer.daemon = True
+                self.restore_timer.start()
+        return method
+
+    def _get_owner(self):
+        """延迟创建剪贴板占有窗口，不可用时返回None"""
+        if self.owner is None:
+            self.owner = False
+            if HAS_WIN32:
+                owner = ClipboardOwner()
+                if owner.hwnd:
+                    self.owner = owner
+        return self.owner or None
+
+    def _paste_clipboard(self, text):
+        if self.restore_timer:
+            self.restore_timer.cancel()
+            self.restore_timer = None
+        if ClientConfig.restore_clip and self.original is None:
+            try:
+                self.original = pyperclip.paste()
+            except Exception:
+                self.original = None
+
+        owner = self._get_owner()
+        self.detecting = False
+        if owner:
+            try:
+                owner.copy(text)
+                self.detecting = True
+            except Exception as e:
+                print(f"延迟渲染写入剪贴板失败: {str(e)}")
+        if not self.detecting:
+            pyperclip.copy(text)
+        self.pasted = text
+        self.pasted_at = time.perf_counter()
+        self.burst += 1
+        keyboard.send('ctrl+v')
+
+    def _hold(self):
+        """
+        等上一次粘贴完成（持有锁时调用）：能检测时等到目标窗口读取剪贴板，最长 PASTE_HOLD 秒；
+        否则保持到 PASTE_HOLD 秒，之后检查剪贴板是否被改写
+        """
+        if self.pasted_at is None:
+            return
+        pasted_at, self.pasted_at = self.pasted_at, None
+        remaining = max(pasted_at + PASTE_HOLD - time.perf_counter(), 0)
+        if self.detecting:
+            owner = self.owner
+            if owner.rendered.wait(remaining):
+                self.detected += 1
+                self.read_time.record(max(owner.rendered_at - pasted_at, 0.001))
+            elif owner.lost or not owner.owns():
+                self.clobbered += 1
+                print("警告: 粘贴前剪贴板被其他程序改写，上一次粘贴的内容可能不正确")
+            return
+
+        time.sleep(remaining)
+        try:
+            if pyperclip.paste() != self.pasted:
+                self.clobbered += 1
+                print("警告: 粘贴后剪贴板被其他程序改写，上一次粘贴的内容可能不正确")
+        except Exception:
+            pass
+
+    def _restore(self, burst):
+        """恢复剪贴板（之后又有粘贴时跳过；用户在此期间复制了其他内容时不覆盖）"""
+        with self.lock:
+            if burst != self.burst:
+                return
+            self._hold()
+            original, self.original = self.original, None
+            self.restore_timer = None
+            if original is None:
+                return
+            try:
+                if self.detecting:
+                    unchanged = self.owner.owns()
+                else:
+                    unchanged = pyperclip.paste() == self.pasted
+                if unchanged:
+                    pyperclip.copy(original)
+                    self.restores += 1
+                    print("剪贴板已恢复到原始内容")
+            except Exception as e:
+                print(f"恢复剪贴板失败: {str(e)}")
+
+    def flush(self):
+        """立即恢复待恢复的剪贴板（退出前调用）"""
+        timer = self.restore_timer
+        if timer:
+            timer.cancel()
+            self._restore(self.burst)
+
+    def get_stats(self):
+        """各输出方式的耗时分布、目标窗口读取剪贴板的耗时、剪贴板被改写次数和恢复次数"""
+        return {
+            'clipboard': self.latency['clipboard'].snapshot(),
+            'type': self.latency['type'].snapshot(),
+            'read': self.read_time.snapshot(),
+            'detected': self.detected,
+            'clobbered': self.clobbered,
+            'restores': self.restores,
+        }
+
+
+# 全局实例
+paster = Paster()
@@ -0,0 +1,48 @@
+"""
+限速器 - 按固定间隔放行请求，由 ASR 管理器在每次实际发往服务的请求前调用
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """按固定间隔放行请求的限速器（线程安全）"""
+
+    def __init__(self, rate):
+        """
+        Args:
+            rate: 每秒最多请求数，0 表示不限速
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        预约下一个放行时间
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        if not self.interval:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+        return slot - now
+
+    def acquire(self):
+        """阻塞到放行时间"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """在事件循环中等待到放行时间"""
+        import asyncio
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
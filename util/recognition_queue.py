@@ -0,0 +1,279 @@
+"""
+识别任务队列 - 固定数量的工作协程处理识别任务，结果严格按录音顺序输出
+
+录音开始时预留序号，录音结束后按该序号提交识别任务（没有音频时跳过序号）。
+多个识别可以同时进行，先完成的结果暂存，等前面的录音都输出后再依次保存、粘贴；
+后端请求数由工作协程数限制。未输出的录音数达到 max_pending 后，新提交的录音若紧接着
+一个尚未开始识别的录音，就与它合并为一次识别（结果在前一个序号输出），排队的任务数因此有上限
+"""
+
+import asyncio
+import threading
+import time
+
+from util.latency import LatencyHistogram
+
+
+class RecognitionQueue:
+    """按录音顺序输出结果的识别任务队列（工作协程运行在识别事件循环上）"""
+
+    def __init__(self, loop, workers=2, max_pending=4, deliver=None, cancel_superseded=False, coalesce=None):
+        """
+        Args:
+            loop: 识别事件循环（在另一个线程中运行）
+            workers: 同时处理的识别任务数
+            max_pending: 已预留序号但结果尚未输出的录音数达到该值时视为积压，开始合并排队的录音
+            deliver: 输出结果的阻塞函数，参数为任务的返回值，在线程池中按序号依次调用
+            cancel_superseded: 提交新任务时取消序号更早且尚未完成的任务（结果被丢弃）
+            coalesce: 合并函数，参数为按顺序排列的多个录音数据（submit 的 payload），返回合并后的任务；
+                为None时不合并
+        """
+        self.loop = loop
+        self.workers = workers
+        self.max_pending = max_pending
+        self.deliver = deliver
+        self.cancel_superseded = cancel_superseded
+        self.coalesce = coalesce
+
+        # 序号在录音线程中预留、在事件循环中输出，由锁保护
+        self.lock = threading.Lock()
+        self.next_sequence = 0   # 下一个预留的序号
+        self.next_deliver = 0    # 下一个等待输出的序号
+        self.max_depth = 0
+        self.backlogged = 0      # 预留时已积压的次数
+        self.coalesced = 0       # 并入前一个排队录音的次数
+
+        # 以下只在事件循环中访问
+        self.jobs = None         # 按序号排序的待处理任务 (序号, 提交时间)
+        self.ready = None        # 有任务完成时通知输出协程
+        self.finished = {}       # 序号 -> (任务返回值, 完成时间)，等待前面的序号输出
+        self.queued = {}         # 序号 -> [任务, 录音数据列表]，尚未开始识别
+        self.merged = None       # (最近一个并入其他任务的序号, 并入的序号)，连续的录音据此并入同一个任务
+        self.running = {}        # 序号 -> 正在执行的任务
+        self.cancelled = set()   # 被新任务取代、尚未开始的序号
+        self.superseded = set()  # 被新任务取代、执行中被取消的序号
+        self.tasks = []
+
+        self.wait_time = LatencyHistogram(min_latency=1e-4)   # 提交到开始识别
+        self.run_time = LatencyHistogram()                    # 识别耗时
+        self.hold_time = LatencyHistogram(min_latency=1e-4)   # 识别完成到按顺序输出
+
+    def start(self):
+        """在事件循环中启动工作协程和输出协程"""
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        self.jobs = asyncio.PriorityQueue()
+        self.ready = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._deliver_in_order()))
+
+    def close(self):
+        """取消工作协程，未输出的结果被丢弃（事件循环停止前调用）"""
+        async def cancel():
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        if self.tasks and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(cancel(), self.loop).result(timeout=2.0)
+
+    def depth(self):
+        """已预留序号但结果尚未输出的录音数"""
+        with self.lock:
+            return self.next_sequence - self.next_deliver
+
+    def reserve(self):
+        """
+        录音开始时预留序号（线程安全）
+
+        Returns:
+            tuple: (序号, 是否积压)，积压时结果会延后，并可能与前一个排队的录音合并识别
+        """
+        with self.lock:
+            depth = self.next_sequence - self.next_deliver
+            backlogged = depth >= self.max_pending
+            if backlogged:
+                self.backlogged += 1
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            self.max_depth = max(self.max_depth, depth + 1)
+            return sequence, backlogged
+
+    def submit(self, sequence, job, payload=None):
+        """
+        提交识别任务（线程安全）
+
+        Args:
+            sequence: reserve 返回的序号
+            job: 无参数的协程函数，返回值传给 deliver，返回None表示没有结果需要输出
+            payload: 可合并的录音数据，积压时传给 coalesce；为None时该任务不参与合并
+        """
+        self.loop.call_soon_threadsafe(self._enqueue, sequence, job, payload, time.perf_counter())
+
+    def skip(self, sequence):
+        """放弃预留的序号（没有音频需要识别时调用，线程安全）"""
+        self.loop.call_soon_threadsafe(self._complete, sequence, None)
+
+    def _enqueue(self, sequence, job, payload, submitted):
+        if self._coalesce(sequence, payload):
+            return
+        if self.cancel_superseded:
+            for earlier, task in self.running.items():
+                if earlier < sequence and earlier not in self.superseded:
+                    self.superseded.add(earlier)
+                    task.cancel()
+            self.cancelled.update(earlier for earlier in self.queued if earlier < sequence)
+        self.queued[sequence] = [job, [payload] if payload is not None else None]
+        self.jobs.put_nowait((sequence, submitted))
+
+    def _coalesce(self, sequence, payload):
+        """积压时把录音并入紧挨着的前一个排队任务，本序号不再单独识别"""
+        if self.coalesce is None or self.cancel_superseded or payload is None:
+            return False
+        head = sequence - 1
+        if self.merged and self.merged[0] == head:
+            head = self.merged[1]
+        previous = self.queued.get(head)
+        if previous is None or previous[1] is None:
+            return False
+        with self.lock:
+            if self.next_sequence - self.next_deliver < self.max_pending:
+                return False
+
+        payloads = previous[1] + [payload]
+        try:
+            previous[0] = self.coalesce(payloads)
+        except Exception as e:
+            print(f"合并排队的录音失败: {str(e)}")
+            return False
+        # 合并后的任务沿用前一个序号的队列位置；本序号直接完成、没有结果
+        previous[1] = payloads
+        self.merged = (sequence, head)
+        self.coalesced += 1
+        print(f"识别积压，本次录音与前 {len(payloads) - 1} 次排队的录音合并识别")
+        self._complete(sequence, None)
+        return True
+
+    async def _work(self):
+        while True:
+            sequence, submitted = await self.jobs.get()
+            job, _ = self.queued.pop(sequence)
+            self.wait_time.record(max(time.perf_counter() - submitted, 1e-4))
+
+            result = None
+            if sequence in self.cancelled:
+                self.cancelled.discard(sequence)
+                print("上一次识别尚未开始，已取消")
+            else:
+                start = time.perf_counter()
+                task = asyncio.ensure_future(job())
+                self.running[sequence] = task
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    # 关闭队列时工作协程本身被取消，取消会传到正在等待的任务，不能吞掉
+                    if sequence not in self.superseded:
+                        raise
+                    print("上一次识别尚未完成，已取消")
+                except Exception as e:
+                    print(f"识别过程出错: {str(e)}")
+                finally:
+                    self.running.pop(sequence, None)
+                    self.superseded.discard(sequence)
+                self.run_time.record(time.perf_counter() - start)
+            self._complete(sequence, result)
+
+    def _complete(self, sequence, result):
+        self.finished[sequence] = (result, time.perf_counter())
+        self.ready.set()
+
+    async def _deliver_in_order(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.next_deliver in self.finished:
+                result, finished_at = self.finished.pop(self.next_deliver)
+                self.hold_time.record(max(time.perf_counter() - finished_at, 1e-4))
+                if result is not None and self.deliver:
+                    try:
+                        await loop.run_in_executor(None, self.deliver, *result)
+                    except Exception as e:
+                        print(f"输出识别结果失败: {str(e)}")
+                with self.lock:
+                    self.next_deliver += 1
+
+    def get_stats(self):
+        """队列深度、积压次数，以及排队、识别和等待按序输出的耗时分布"""
+        with self.lock:
+            depth = self.next_sequence - self.next_deliver
+            submitted = self.next_sequence
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'submitted': submitted,
+            'backlogged': self.backlogged,
+            'coalesced': self.coalesced,
+            'wait': self.wait_time.snapshot(),
+            'run': self.run_time.snapshot(),
+            'hold': self.hold_time.snapshot(),
+        }
+
+
+def benchmark(jobs=20, workers=2, max_pending=4, interval=0.15):
+    """模拟识别耗时随机的连续录音：结果按录音顺序输出，积压时排队的录音合并识别而不丢弃"""
+    import random
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    completed = []
+    delivered = []
+    done = threading.Event()
+
+    def make_job(recordings):
+        """recordings: [(序号, 识别耗时)]，合并识别的耗时按最长的一段计"""
+        async def job():
+            await asyncio.sleep(max(seconds for _, seconds in recordings))
+            completed.append(recordings[0][0])
+            return [sequence for sequence, _ in recordings],
+
+        return job
+
+    def deliver(sequences):
+        delivered.extend(sequences)
+        if len(delivered) == jobs:
+            done.set()
+
+    queue = RecognitionQueue(loop, workers, max_pending, deliver, coalesce=make_job)
+    queue.start()
+
+    random.seed(0)
+    for index in range(jobs):
+        sequence, _ = queue.reserve()
+        recording = (sequence, random.uniform(0.05, 0.6))
+        queue.submit(sequence, make_job([recording]), payload=recording)
+        time.sleep(interval)  # 连续录音的间隔
+
+    done.wait(5)
+    stats = queue.get_stats()
+    queue.close()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+    in_order = delivered == sorted(delivered)
+    overtaken = sum(1 for actual, expected in zip(completed, sorted(completed)) if actual != expected)
+    print(f"录音 {jobs} 次，积压时开始录音 {stats['backlogged']} 次，合并 {stats['coalesced']} 次，"
+          f"最大积压 {stats['max_depth']}")
+    print(f"识别完成顺序 {completed}（{overtaken} 个不在原位）")
+    print(f"结果输出顺序 {delivered}（{'按录音顺序' if in_order else '乱序'}，"
+          f"{len(delivered)}/{jobs} 次录音有结果）")
+    for name in ('wait', 'run', 'hold'):
+        snapshot = stats[name]
+        print(f"  {name:<5} p50 {snapshot['p50'] * 1000:7.1f}ms  p95 {snapshot['p95'] * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    benchmark()
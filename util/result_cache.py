@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+识别结果缓存 - 以音频PCM内容哈希 + 服务 + 模型为键，内存和磁盘（SQLite）两级LRU，支持过期时间
+
+相同音频（重试、重复识别同一文件、测试样本）直接返回缓存结果，不再请求云端接口。
+写入磁盘和淘汰由后台线程批量完成，不阻塞返回识别结果
+
+用法:
+    python -m util.result_cache stats
+    python -m util.result_cache clear
+"""
+
+import argparse
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from util.capture_buffer import WAV_HEADER_SIZE
+
+
+def audio_digest(wav_data):
+    """WAV音频的PCM内容哈希（跳过文件头，避免头部字段差异影响命中）"""
+    view = memoryview(wav_data)
+    if len(view) > WAV_HEADER_SIZE and bytes(view[:4]) == b'RIFF':
+        view = view[WAV_HEADER_SIZE:]
+    return hashlib.blake2b(view, digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """两级LRU识别结果缓存"""
+
+    def __init__(self, path, memory_entries=256, disk_entries=10000, ttl=7 * 24 * 3600):
+        """
+        Args:
+            path: 磁盘缓存数据库路径，为None时只使用内存
+            memory_entries: 内存中保留的条目数
+            disk_entries: 磁盘中保留的条目数
+            ttl: 过期时间（秒）
+        """
+        self.path = Path(path) if path else None
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()  # 键 -> (结果, 写入时间)
+        self.conn = None
+        self.disk_count = None       # 磁盘条目数（后台写入线程维护，淘汰时不必每次 COUNT）
+        self.lock = threading.Lock()
+        self.pending = None   # 当前写入线程的队列：待写入磁盘的 (键, 结果, 时间)，None 表示退出
+        self.writer = None    # 每个写入线程有自己的队列，flush 后新启动的线程不会取走旧线程的退出标记
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(digest, service, model):
+        return f"{service}:{model}:{digest}"
+
+    def _connect(self):
+        if self.conn is None and self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        return self.conn
+
+    def _remember(self, key, text, created):
+        self.memory[key] = (text, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """查找缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[0]
+            if entry:
+                del self.memory[key]
+
+            conn = self._connect()
+            if conn is not None:
+                row = conn.execute("SELECT text, created FROM results WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] < self.ttl:
+                    with conn:
+                        conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], row[1])
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+                if row:
+                    with conn:
+                        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    if self.disk_count is not None:
+                        self.disk_count -= 1
+
+            self.stats['misses'] += 1
+            return None
+
+    def lookup(self, digest, candidates):
+        """
+        按顺序查找多个服务的缓存
+
+        Args:
+            digest: 音频哈希
+            candidates: [(服务类型, 模型), ...]
+
+        Returns:
+            (服务类型, 结果) 或 (None, None)
+        """
+        for service, model in candidates:
+            text = self.get(self.make_key(digest, service, model))
+            if text is not None:
+                return service, text
+        return None, None
+
+    def put(self, key, text):
+        """写入缓存（空结果不缓存）：内存立即可见，磁盘由后台线程写入"""
+        if not text:
+            return
+        now = time.time()
+        with self.lock:
+            self._remember(key, text, now)
+            self.stats['stores'] += 1
+            if self.path is None:
+                return
+            if self.writer is None:
+                self.pending = queue.SimpleQueue()
+                self.writer = threading.Thread(
+                    target=self._write_loop, args=(self.pending,), name='result-cache', daemon=True
+                )
+                self.writer.start()
+            self.pending.put((key, text, now))
+
+    def _write_loop(self, pending):
+        """后台写入线程：一次取出所有待写条目，在一个事务中写入并按需淘汰"""
+        while True:
+            entries = [pending.get()]
+            while True:
+                try:
+                    entries.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in entries
+            entries = [entry for entry in entries if entry is not None]
+            if entries:
+                try:
+                    self._write(entries)
+                except sqlite3.Error as e:
+                    print(f"写入识别缓存失败: {e}")
+            if stop:
+                return
+
+    def _write(self, entries):
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                if self.disk_count is None:
+                    self.disk_count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                for key, text, now in entries:
+                    inserted = conn.execute(
+                        "INSERT OR IGNORE INTO results (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+                        (key, text, now, now)
+                    ).rowcount
+                    if inserted:
+                        self.disk_count += 1
+                    else:
+                        conn.execute(
+                            "UPDATE results SET text = ?, created = ?, accessed = ? WHERE key = ?",
+                            (text, now, now, key)
+                        )
+                # 超出容量时淘汰最久未访问的条目（每超出10%批量淘汰一次）
+                if self.disk_count > self.disk_entries * 1.1:
+                    evicted = conn.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                        (self.disk_count - self.disk_entries,)
+                    ).rowcount
+                    self.disk_count -= evicted
+                    self.stats['evictions'] += evicted
+
+    def flush(self):
+        """等待后台线程写完已提交的条目"""
+        with self.lock:
+            writer, self.writer = self.writer, None
+            if writer is None:
+                return
+            # 持有锁时放入退出标记：之前的条目都在它前面，之后的 put 会启动新线程和新队列
+            self.pending.put(None)
+            self.pending = None
+        writer.join()
+
+    def get_stats(self):
+        """命中统计"""
+        self.flush()
+        with self.lock:
+            stats = dict(self.stats)
+            conn = self._connect()
+            stats['memory_entries'] = len(self.memory)
+            stats['disk_entries'] = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] if conn else 0
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        self.flush()
+        with self.lock:
+            self.memory.clear()
+            conn = self._connect()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM results")
+                self.disk_count = 0
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def main():
+    from config import ProjectPaths
+
+    parser = argparse.ArgumentParser(description="识别结果缓存")
+    parser.add_argument('command', choices=['stats', 'clear'])
+    args = parser.parse_args()
+
+    cache = ResultCache(ProjectPaths.cache_dir / 'results.db')
+    if args.command == 'stats':
+        print(f"磁盘缓存: {cache.get_stats()['disk_entries']} 条")
+    else:
+        cache.clear()
+        print("缓存已清空")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-import json
-import time
+import atexit
 import os
 from pathlib import Path
 from datetime import datetime
-from config import ProjectPaths
+from config import ClientConfig, ProjectPaths
+from util.history_store import HistoryStore
+from util.paster import paster
+from util.result_journal import ResultJournal
 
 
 class ResultHandler:
@@ -12,9 +14,17 @@ class ResultHandler:
     def __init__(self):
         # 确保结果目录存在
         ProjectPaths.results_dir.mkdir(parents=True, exist_ok=True)
-
-    def save_result(self, audio_file, recognition_result):
-        """保存识别结果"""
+        self.history = None
+        sinks = []
+        if ClientConfig.save_history:
+            self.history = HistoryStore(ProjectPaths.results_dir / 'history.db')
+            sinks.append(self.history.add_records)
+        self.journal = ResultJournal(ProjectPaths.results_dir, sinks=sinks)
+        # 退出时写完剩余结果
+        atexit.register(self.close)
+
+    def save_result(self, audio_file, recognition_result, duration=None, loudness=None):
+        """保存识别结果（入队由后台线程写入，不阻塞粘贴）"""
         timestamp = datetime.now()
 
         # 创建结果数据
@@ -24,92 +34,44 @@ class ResultHandler:
             'recognition_result': recognition_result,
             'asr_model': os.getenv('ASR_SERVICE', 'volcengine'),  # 使用实时环境变量
             'date': timestamp.strftime('%Y-%m-%d'),
-            'time': timestamp.strftime('%H:%M:%S')
+            'time': timestamp.strftime('%H:%M:%S'),
+            'duration': round(duration, 2) if duration is not None else None,  # 录音时长（秒）
+            'loudness': loudness  # 录音响度（rms_dbfs, peak_dbfs, clipped）
         }
 
-        # 保存JSON格式结果
-        self.save_json_result(result_data)
-
-        # 保存文本格式结果
-        self.save_text_result(result_data)
+        # 追加到当天的结果日志（JSONL + 文本）
+        self.journal.append(result_data)
 
         print(f"识别结果已保存: {recognition_result}")
 
-    def save_json_result(self, result_data):
-        """保存JSON格式结果"""
-        date_str = result_data['date']
-        date_dir = ProjectPaths.results_dir / date_str
-        date_dir.mkdir(exist_ok=True)
-
-        timestamp_short = result_data['time'].replace(':', '')
-        json_file = date_dir / f"result_{timestamp_short}.json"
-
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(result_data, f, ensure_ascii=False, indent=2)
-
-    def save_text_result(self, result_data):
-        """保存文本格式结果"""
-        date_str = result_data['date']
-        date_dir = ProjectPaths.results_dir / date_str
-        date_dir.mkdir(exist_ok=True)
-
-        text_file = date_dir / f"results_{date_str}.txt"
-
-        # 添加到文本文件（追加模式）
-        time_str = result_data['time']
-        result_text = result_data['recognition_result']
-
-        with open(text_file, 'a', encoding='utf-8') as f:
-            f.write(f"[{time_str}] {result_text}\n")
+    def close(self):
+        """恢复剪贴板，写完剩余结果并关闭日志"""
+        paster.flush()
+        stats = paster.get_stats()
+        for method, name in (('clipboard', '剪贴板粘贴'), ('type', '直接键入')):
+            latency = stats[method]
+            if latency['count']:
+                print(f"{name} {latency['count']} 次，耗时 p50 {latency['p50'] * 1000:.0f}ms / "
+                      f"p95 {latency['p95'] * 1000:.0f}ms")
+        if stats['detected']:
+            print(f"目标窗口读取剪贴板 {stats['detected']} 次，粘贴后 p50 {stats['read']['p50'] * 1000:.0f}ms / "
+                  f"p95 {stats['read']['p95'] * 1000:.0f}ms")
+        self.journal.close()
+        if self.history:
+            self.history.close()
 
     def paste_to_clipboard(self, text):
-        """将结果粘贴到剪贴板并模拟粘贴"""
+        """将结果输出到当前界面（剪贴板粘贴或直接键入，见 util.paster）"""
         try:
-            import pyperclip
-            import keyboard
-            import time
-            from config import ClientConfig
-
-            # 保存当前剪贴板内容（如果需要恢复）
-            original_clipboard = None
-            if ClientConfig.restore_clip:
-                try:
-                    original_clipboard = pyperclip.paste()
-                except:
-                    original_clipboard = None
-
-            # 复制识别结果到剪贴板
-            pyperclip.copy(text)
-
-            # 模拟Ctrl+V粘贴
-            keyboard.press_and_release('ctrl+v')
-
-            print(f"已粘贴到剪贴板和当前界面: {text}")
-
-            # 如果需要恢复剪贴板，延迟后恢复原内容
-            if ClientConfig.restore_clip and original_clipboard is not None:
-                def restore_clipboard():
-                    try:
-                        time.sleep(0.5)  # 等待粘贴完成
-                        pyperclip.copy(original_clipboard)
-                        print("剪贴板已恢复到原始内容")
-                    except Exception as e:
-                        print(f"恢复剪贴板失败: {str(e)}")
-
-                # 在后台线程中恢复剪贴板，避免阻塞主程序
-                import threading
-                restore_thread = threading.Thread(target=restore_clipboard, daemon=True)
-                restore_thread.start()
-
-        except ImportError:
-            print("警告: pyperclip未安装，无法自动粘贴")
+            method = paster.paste(text)
+            print(f"已{'键入' if method == 'type' else '粘贴'}到当前界面: {text}")
         except Exception as e:
             print(f"自动粘贴失败: {str(e)}")
 
-    def process_result(self, audio_file, recognition_result, auto_paste=True):
+    def process_result(self, audio_file, recognition_result, auto_paste=True, duration=None, loudness=None):
         """处理识别结果"""
         # 保存结果
-        self.save_result(audio_file, recognition_result)
+        self.save_result(audio_file, recognition_result, duration, loudness)
 
         # 自动粘贴
         if auto_paste:
@@ -122,6 +84,6 @@ class ResultHandler:
 result_handler = ResultHandler()
 
 
-def save_recognition_result(audio_file, result, auto_paste=True):
+def save_recognition_result(audio_file, result, auto_paste=True, duration=None, loudness=None):
     """便捷的保存结果函数"""
-    result_handler.process_result(audio_file, result, auto_paste)
\ No newline at end of file
+    result_handler.process_result(audio_file, result, auto_paste, duration, loudness)
\ No newline at end of file
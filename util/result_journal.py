@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+识别结果日志 - 每天一个只追加的JSONL文件（results/YYYY-MM-DD/results.jsonl），
+由后台线程批量写入：一次写入队列中积压的所有记录（group commit），fsync按时间间隔合并，
+调用方只需入队，不等待磁盘I/O
+
+用法:
+    python -m util.result_journal read [--date 2024-01-01] [--text]
+    python -m util.result_journal compact [--date 2024-01-01] [--remove-legacy]
+    python -m util.result_journal bench
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+JOURNAL_NAME = 'results.jsonl'
+
+
+class ResultJournal:
+    """后台批量写入的结果日志"""
+
+    def __init__(self, directory, fsync_interval=1.0, max_batch=256, write_text=True, sinks=None):
+        """
+        Args:
+            directory: 结果根目录，按日期分子目录
+            fsync_interval: 两次fsync的最短间隔（秒），0 表示每批都fsync
+            max_batch: 单批最多写入的记录数
+            write_text: 是否同时追加每日的文本结果（results_YYYY-MM-DD.txt）
+            sinks: 每批记录写入后在后台线程调用的函数列表（如写入历史库）
+        """
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self.write_text = write_text
+        self.sinks = sinks or []
+        self.queue = queue.Queue()
+        self.files = {}  # 日期 -> (jsonl文件, txt文件)
+        self.last_fsync = 0.0
+        self.dirty = set()
+        self.stats = {'records': 0, 'batches': 0, 'fsyncs': 0}
+        self.thread = None
+        self.closed = False
+
+    def _ensure_thread(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self.thread.start()
+
+    def append(self, record):
+        """记录入队（非阻塞）；record需包含 'date' 字段"""
+        if self.closed:
+            raise Exception("结果日志已关闭")
+        self._ensure_thread()
+        self.queue.put(record)
+
+    def flush(self):
+        """等待已入队的记录全部写入文件（fsync仍按间隔进行）"""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """写完剩余记录后停止后台线程"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _open(self, day):
+        if day not in self.files:
+            day_dir = self.directory / day
+            day_dir.mkdir(parents=True, exist_ok=True)
+            journal = open(day_dir / JOURNAL_NAME, 'a', encoding='utf-8')
+            text = open(day_dir / f"results_{day}.txt", 'a', encoding='utf-8') if self.write_text else None
+            # 只保留当天和新的一天的文件句柄
+            for old_day in [d for d in self.files if d < day]:
+                self._close_day(old_day)
+            self.files[day] = (journal, text)
+        return self.files[day]
+
+    def _close_day(self, day):
+        journal, text = self.files.pop(day)
+        if day in self.dirty:
+            self._sync(journal)
+        journal.close()
+        if text:
+            text.close()
+        self.dirty.discard(day)
+
+    def _sync(self, journal):
+        journal.flush()
+        os.fsync(journal.fileno())
+        self.stats['fsyncs'] += 1
+
+    def _write_batch(self, records):
+        for record in records:
+            journal, text = self._open(record['date'])
+            journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if text:
+                text.write(f"[{record['time']}] {record['recognition_result']}\n")
+            self.dirty.add(record['date'])
+
+        for day in self.dirty:
+            journal, text = self.files[day]
+            journal.flush()
+            if text:
+                text.flush()
+        self.stats['records'] += len(records)
+        self.stats['batches'] += 1
+
+    def _sync_dirty(self, force=False):
+        if not self.dirty:
+            return
+        if not force and time.time() - self.last_fsync < self.fsync_interval:
+            return
+        for day in list(self.dirty):
+            self._sync(self.files[day][0])
+        self.dirty.clear()
+        self.last_fsync = time.time()
+
+    def _writer_loop(self):
+        stop = False
+        while not stop:
+            # 有待fsync的数据时限时等待，超时后补上fsync
+            timeout = self.fsync_interval if self.dirty else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._sync_dirty(force=True)
+                continue
+
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not None]
+            stop = len(records) != len(batch)
+            try:
+                if records:
+                    self._write_batch(records)
+                self._sync_dirty(force=stop)
+            except Exception as e:
+                print(f"写入结果日志失败: {e}")
+            try:
+                for sink in self.sinks:
+                    if records:
+                        sink(records)
+            except Exception as e:
+                print(f"写入结果失败: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+        # 退出前落盘并关闭文件
+        self._sync_dirty(force=True)
+        for day in list(self.files):
+            self._close_day(day)
+
+
+def iter_days(directory):
+    """按日期顺序列出有结果的日期目录"""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(path.name for path in directory.iterdir() if path.is_dir())
+
+
+def read_records(directory, days=None):
+    """
+    流式读取结果记录，跳过崩溃时写了一半的行
+
+    Args:
+        directory: 结果根目录
+        days: 要读取的日期列表，默认全部
+    """
+    directory = Path(directory)
+    for day in days or iter_days(directory):
+        journal = directory / day / JOURNAL_NAME
+        if not journal.exists():
+            continue
+        with open(journal, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def compact(directory, day, remove_legacy=False):
+    """
+    压缩一天的结果：合并旧版 result_*.json 文件，去掉损坏的行和重复记录，按时间排序后原子替换
+
+    Returns:
+        dict: 压缩前后的记录数
+    """
+    day_dir = Path(directory) / day
+    legacy_files = sorted(day_dir.glob('result_*.json'))
+
+    records = list(read_records(directory, [day]))
+    original = len(records)
+    for path in legacy_files:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                records.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+
+    seen = set()
+    unique = []
+    for record in records:
+        key = (record.get('timestamp'), record.get('recognition_result'))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(record)
+    unique.sort(key=lambda record: record.get('timestamp', ''))
+
+    temp_path = day_dir / (JOURNAL_NAME + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for record in unique:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, day_dir / JOURNAL_NAME)
+
+    if remove_legacy:
+        for path in legacy_files:
+            path.unlink()
+
+    return {'journal_records': original, 'legacy_files': len(legacy_files), 'records': len(unique)}
+
+
+def benchmark(count=200):
+    """对比每条结果单独写JSON文件与入队写日志时调用方的耗时"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        record = {
+            'timestamp': '', 'audio_file': 'audio_data', 'recognition_result': '测试结果' * 10,
+            'asr_model': 'volcengine', 'date': '2024-01-01', 'time': '12:00:00'
+        }
+
+        start = time.perf_counter()
+        for index in range(count):
+            path = Path(directory) / f"result_{index}.json"
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False, indent=2)
+            with open(Path(directory) / 'results.txt', 'a', encoding='utf-8') as f:
+                f.write(f"[{record['time']}] {record['recognition_result']}\n")
+        per_file_ms = (time.perf_counter() - start) * 1000 / count
+
+        journal = ResultJournal(directory)
+        start = time.perf_counter()
+        for index in range(count):
+            journal.append(dict(record, timestamp=str(index)))
+        append_ms = (time.perf_counter() - start) * 1000 / count
+        journal.close()
+
+        print(f"{count}条结果，调用方平均耗时:")
+        print(f"  每条写JSON文件 {per_file_ms:.3f}ms")
+        print(f"  入队写日志     {append_ms:.3f}ms  "
+              f"（后台 {journal.stats['batches']} 批，{journal.stats['fsyncs']} 次fsync）")
+
+
+def main():
+    from config import ProjectPaths
+
+    parser = argparse.ArgumentParser(description="识别结果日志工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    read_parser = subparsers.add_parser('read', help="输出结果记录")
+    read_parser.add_argument('--date', help="日期，如 2024-01-01，默认全部")
+    read_parser.add_argument('--text', action='store_true', help="只输出时间和文本")
+
+    compact_parser = subparsers.add_parser('compact', help="压缩结果日志并合并旧版JSON文件")
+    compact_parser.add_argument('--date', help="日期，默认今天以前的所有日期")
+    compact_parser.add_argument('--remove-legacy', action='store_true', help="合并后删除旧版 result_*.json")
+
+    subparsers.add_parser('bench', help="对比写入耗时")
+    args = parser.parse_args()
+
+    directory = ProjectPaths.results_dir
+    if args.command == 'read':
+        for record in read_records(directory, [args.date] if args.date else None):
+            if args.text:
+                print(f"{record['date']} {record['time']} {record['recognition_result']}")
+            else:
+                print(json.dumps(record, ensure_ascii=False))
+    elif args.command == 'compact':
+        # 今天的日志可能正在被写入，默认不压缩
+        today = date.today().isoformat()
+        days = [args.date] if args.date else [day for day in iter_days(directory) if day < today]
+        for day in days:
+            stats = compact(directory, day, args.remove_legacy)
+            print(f"{day}: 日志 {stats['journal_records']} 条 + 旧版文件 {stats['legacy_files']} 个 "
+                  f"-> {stats['records']} 条")
+    else:
+        benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+单生产者/单消费者环形缓冲区 - 录音回调（PortAudio线程）写入，消费线程读出
+
+槽位预先分配，生产者只修改写位置，消费者只修改读位置，两端不需要互相加锁；
+写满时丢弃新数据并计数，由消费端报告，不会阻塞音频回调
+"""
+
+
+class SpscRing:
+    """固定槽位的环形缓冲区，每个槽位保存一块数据及其时间戳"""
+
+    def __init__(self, slots, slot_size):
+        """
+        Args:
+            slots: 槽位数
+            slot_size: 每个槽位的最大字节数
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+        self.data = bytearray(slots * slot_size)
+        self.lengths = [0] * slots
+        self.stamps = [0.0] * slots
+        # 单调递增的读写位置（Python整数赋值是原子的），取模得到槽位
+        self.write_pos = 0
+        self.read_pos = 0
+        self.dropped = 0     # 写满时丢弃的块数（只由生产者修改）
+        self.high_water = 0  # 最多同时积压的块数（只由生产者修改）
+
+    def __len__(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, chunk, stamp=0.0):
+        """
+        写入一块数据（生产者调用）
+
+        Returns:
+            bool: 是否写入，缓冲区已满时返回False
+        """
+        pending = self.write_pos - self.read_pos
+        if pending >= self.slots or len(chunk) > self.slot_size:
+            self.dropped += 1
+            return False
+        slot = self.write_pos % self.slots
+        offset = slot * self.slot_size
+        self.data[offset:offset + len(chunk)] = chunk
+        self.lengths[slot] = len(chunk)
+        self.stamps[slot] = stamp
+        # 数据写完后再移动写位置，消费者看到新位置时数据已完整
+        self.write_pos += 1
+        if pending + 1 > self.high_water:
+            self.high_water = pending + 1
+        return True
+
+    def read(self):
+        """
+        读出一块数据（消费者调用）
+
+        Returns:
+            (bytes, 时间戳)，缓冲区为空时返回None
+        """
+        if self.read_pos == self.write_pos:
+            return None
+        slot = self.read_pos % self.slots
+        offset = slot * self.slot_size
+        # 复制出来后才释放槽位，生产者随后可以覆盖
+        chunk = bytes(self.data[offset:offset + self.lengths[slot]])
+        stamp = self.stamps[slot]
+        self.read_pos += 1
+        return chunk, stamp
+
+    def clear(self):
+        """丢弃未读数据（消费者调用）"""
+        self.read_pos = self.write_pos
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+快捷键状态机 - 长按/单击两种模式下按键事件到录音动作的转换，不依赖 keyboard 库
+
+按键钩子只注册一次，由状态机决定每个事件的含义；阈值倒计时用截止时间表示，
+由驱动方（键盘监听或回放）在到期时调用 on_timeout。附带虚拟时钟回放，可在无键盘环境下验证各种按键序列
+
+用法（回放内置按键序列并输出动作）:
+    python -m util.shortcut_state
+"""
+
+import time
+
+from util.latency import LatencyHistogram
+
+# 状态
+IDLE = 'idle'                              # 空闲
+HOLDING = 'holding'                        # 长按模式：按住录音中
+RESTORING = 'restoring'                    # 长按模式：已发送恢复按键，忽略其回显事件
+PRESSED = 'pressed'                        # 单击模式：空闲时按下，判断单击还是长按
+RECORDING = 'recording'                    # 单击模式：录音中
+PRESSED_RECORDING = 'pressed_recording'    # 单击模式：录音中按下，判断单击还是长按
+PASSTHROUGH = 'passthrough'                # 单击模式：长按已转发原按键，等待松开
+PASSTHROUGH_RECORDING = 'passthrough_recording'
+
+# 动作
+START = 'start'        # 开始录音
+CANCEL = 'cancel'      # 取消录音
+FINISH = 'finish'      # 完成录音并识别
+SEND_KEY = 'send_key'  # 转发原按键（单击模式长按）
+RESTORE = 'restore'    # 恢复按键状态（长按模式录音后）
+
+
+class ShortcutStateMachine:
+    """快捷键状态机（非线程安全，由驱动方加锁）"""
+
+    def __init__(self, hold_mode=True, threshold=0.5, restore_key=True, restore_window=0.5):
+        """
+        Args:
+            hold_mode: 长按模式（按住录音，松开识别），否则为单击模式（单击开始/结束）
+            threshold: 长按模式下短于该时长的按键取消录音；单击模式下按住超过其80%视为长按
+            restore_key: 长按模式录音后是否恢复按键状态
+            restore_window: 发送恢复按键后忽略快捷键事件的最长时间（秒）
+        """
+        self.hold_mode = hold_mode
+        self.threshold = threshold
+        self.restore_key = restore_key
+        self.restore_window = restore_window
+
+        self.state = IDLE
+        self.pressed_at = None
+        self.deadline = None   # 当前状态的超时时间，None表示没有
+        self.restore_echo = set()
+
+        # 计时统计
+        self.transitions = {}
+        self.press_durations = LatencyHistogram(min_latency=0.01, max_latency=60.0)
+
+    def _move(self, state, deadline=None):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.state = state
+        self.deadline = deadline
+
+    def on_key(self, event_type, now):
+        """
+        处理快捷键事件
+
+        Args:
+            event_type: 'down' 或 'up'（按住时系统会重复发送 'down'）
+            now: 事件时间（秒）
+
+        Returns:
+            list: 需要执行的动作
+        """
+        if self.deadline is not None and now >= self.deadline:
+            actions = self.on_timeout(now)
+        else:
+            actions = []
+
+        if self.hold_mode:
+            actions += self._hold_key(event_type, now)
+        else:
+            actions += self._click_key(event_type, now)
+        return actions
+
+    def _hold_key(self, event_type, now):
+        if self.state == IDLE:
+            if event_type == 'down':
+                self.pressed_at = now
+                self._move(HOLDING)
+                return [START]
+            return []
+
+        if self.state == HOLDING:
+            if event_type == 'down':
+                return []  # 按住时的重复按下
+            held = now - self.pressed_at
+            self.press_durations.record(max(held, 0.01))
+            if held < self.threshold:
+                self._move(IDLE)
+                return [CANCEL]
+            if self.restore_key:
+                # 恢复按键会产生一次按下和松开，回显到钩子时忽略
+                self.restore_echo = {'down', 'up'}
+                self._move(RESTORING, now + self.restore_window)
+                return [FINISH, RESTORE]
+            self._move(IDLE)
+            return [FINISH]
+
+        if self.state == RESTORING:
+            self.restore_echo.discard(event_type)
+            if not self.restore_echo:
+                self._move(IDLE)
+            return []
+        return []
+
+    def _click_key(self, event_type, now):
+        long_press = now + self.threshold * 0.8
+
+        if self.state == IDLE:
+            if event_type == 'down':
+                self.pressed_at = now
+                self._move(PRESSED, long_press)
+                return [START]
+            return []
+
+        if self.state == RECORDING:
+            if event_type == 'down':
+                self.pressed_at = now
+                self._move(PRESSED_RECORDING, long_press)
+            return []
+
+        if self.state in (PRESSED, PRESSED_RECORDING):
+            if event_type == 'down':
+                return []  # 按住时的重复按下
+            self.press_durations.record(max(now - self.pressed_at, 0.01))
+            if self.state == PRESSED:
+                # 单击开始录音，继续录音直到下次单击
+                self._move(RECORDING)
+                return []
+            self._move(IDLE)
+            return [FINISH]
+
+        if self.state in (PASSTHROUGH, PASSTHROUGH_RECORDING):
+            # 转发的按键回显和用户松开按键：第一次松开后回到之前的状态
+            if event_type == 'up':
+                self.press_durations.record(max(now - self.pressed_at, 0.01))
+                self._move(IDLE if self.state == PASSTHROUGH else RECORDING)
+            return []
+        return []
+
+    def on_timeout(self, now):
+        """
+        到达超时时间（驱动方在 deadline 到期时调用；过期的调用被忽略）
+
+        Returns:
+            list: 需要执行的动作
+        """
+        if self.deadline is None or now < self.deadline:
+            return []
+
+        if self.state == RESTORING:
+            self._move(IDLE)
+            return []
+        if self.state == PRESSED:
+            # 单击模式空闲时长按：取消刚开始的录音，转发原按键
+            self._move(PASSTHROUGH)
+            return [CANCEL, SEND_KEY]
+        if self.state == PRESSED_RECORDING:
+            # 录音中长按：录音继续，转发原按键
+            self._move(PASSTHROUGH_RECORDING)
+            return [SEND_KEY]
+        self.deadline = None
+        return []
+
+    def get_stats(self):
+        """状态转换次数和按键时长分布"""
+        return {
+            'state': self.state,
+            'transitions': dict(self.transitions),
+            'press': self.press_durations.snapshot(),
+        }
+
+
+def replay(events, hold_mode=True, threshold=0.5, restore_key=True, restore_window=0.5):
+    """
+    用虚拟时钟回放按键序列
+
+    Args:
+        events: [(时间, 'down'/'up'), ...]，按时间排序
+        其余参数同 ShortcutStateMachine
+
+    Returns:
+        tuple: ([(时间, 动作), ...], 状态机)
+    """
+    machine = ShortcutStateMachine(hold_mode, threshold, restore_key, restore_window)
+    actions = []
+    for at, event_type in events:
+        # 先处理在该事件之前到期的超时
+        if machine.deadline is not None and machine.deadline <= at:
+            deadline = machine.deadline
+            actions += [(deadline, action) for action in machine.on_timeout(deadline)]
+        actions += [(at, action) for action in machine.on_key(event_type, at)]
+    if machine.deadline is not None:
+        deadline = machine.deadline
+        actions += [(deadline, action) for action in machine.on_timeout(deadline)]
+    return actions, machine
+
+
+# 内置回放序列：(名称, 模式参数, 按键序列, 期望动作)
+SCENARIOS = [
+    ('长按录音', {'hold_mode': True},
+     [(0, 'down'), (0.03, 'down'), (0.06, 'down'), (2.0, 'up'), (2.1, 'down'), (2.1, 'up')],
+     [START, FINISH, RESTORE]),
+    ('长按模式短按取消', {'hold_mode': True},
+     [(0, 'down'), (0.2, 'up')],
+     [START, CANCEL]),
+    ('恢复按键无回显时超时', {'hold_mode': True},
+     [(0, 'down'), (1.0, 'up'), (3.0, 'down'), (3.2, 'up')],
+     [START, FINISH, RESTORE, START, CANCEL]),
+    ('不恢复按键', {'hold_mode': True, 'restore_key': False},
+     [(0, 'down'), (1.0, 'up'), (1.2, 'down'), (2.0, 'up')],
+     [START, FINISH, START, FINISH]),
+    ('单击开始再单击结束', {'hold_mode': False},
+     [(0, 'down'), (0.1, 'up'), (3.0, 'down'), (3.1, 'up')],
+     [START, FINISH]),
+    ('单击模式空闲时长按转发按键', {'hold_mode': False},
+     [(0, 'down'), (0.2, 'down'), (1.0, 'down'), (1.0, 'up'), (1.5, 'up'), (2.0, 'down'), (2.1, 'up')],
+     [START, CANCEL, SEND_KEY, START]),
+    ('录音中长按转发按键后继续录音', {'hold_mode': False},
+     [(0, 'down'), (0.1, 'up'), (1.0, 'down'), (2.0, 'up'), (3.0, 'down'), (3.1, 'up')],
+     [START, SEND_KEY, FINISH]),
+]
+
+
+def main():
+    failed = 0
+    start = time.perf_counter()
+    for name, options, events, expected in SCENARIOS:
+        actions, machine = replay(events, **options)
+        names = [action for _, action in actions]
+        ok = names == expected
+        failed += not ok
+        timeline = ', '.join(f"{at:.2f}s {action}" for at, action in actions)
+        print(f"{'通过' if ok else '失败'} {name}: {timeline}  (结束状态 {machine.state})")
+        if not ok:
+            print(f"    期望: {expected}")
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(SCENARIOS) - failed}/{len(SCENARIOS)} 通过，耗时 {elapsed:.1f}ms")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+推测式分段识别 - 长录音在停顿处把已采集的前缀提前送去识别，
+松开按键后只需识别剩余尾段，再把各段结果拼接起来
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from util.vad import chunk_rms
+
+
+def _is_ascii_word(char):
+    return char.isascii() and (char.isalnum() or char == '_')
+
+
+def join_segments(texts):
+    """
+    拼接各段识别结果：分界两侧都是英文单词字符（或左侧是英文句末标点）时补一个空格，
+    中文等直接相连
+    """
+    joined = ''
+    for text in texts:
+        if not text:
+            continue
+        if joined and _is_ascii_word(text[0]) and (
+                _is_ascii_word(joined[-1]) or joined[-1] in '.,!?;:'):
+            joined += ' '
+        joined += text
+    return joined
+
+
+class SpeculativeSession:
+    """一次录音的推测式识别会话"""
+
+    # 所有会话共享的识别线程池
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    def __init__(self, recognize_fn, to_wav_fn, buffer_fn, rate=16000, chunk=1024,
+                 min_segment=3.0, min_silence=0.4, silence_rms=300):
+        """
+        初始化会话
+
+        Args:
+            recognize_fn: 识别函数，参数为WAV数据，返回文本
+            to_wav_fn: 把一段PCM数据转换为WAV的函数
+            buffer_fn: 返回当前录音缓冲区（CaptureBuffer）的函数，首个音频块到达时调用
+            rate: 采样率
+            chunk: 每帧采样数
+            min_segment: 分段的最短时长（秒）
+            min_silence: 视为停顿的最短静音时长（秒）
+            silence_rms: 静音判定的RMS阈值
+        """
+        self.recognize_fn = recognize_fn
+        self.to_wav_fn = to_wav_fn
+        self.buffer_fn = buffer_fn
+        self.rate = rate
+        self.chunk = chunk
+        self.silence_rms = silence_rms
+
+        chunk_seconds = chunk / rate
+        self.min_segment_frames = max(1, int(min_segment / chunk_seconds))
+        self.min_silence_frames = max(1, int(min_silence / chunk_seconds))
+
+        self.buffer = None
+        self.size = 0              # 已采集的字节数
+        self.boundary = 0          # 已提交识别的字节数
+        self.silent_run = 0        # 当前连续静音帧数
+        self.segments = []         # [(start, end, future)]，字节偏移
+        self.lock = threading.Lock()
+
+    def on_chunk(self, data):
+        """录音线程回调（数据已写入录音缓冲区）：在停顿处提交前缀"""
+        rms = chunk_rms(np.frombuffer(data, dtype=np.int16))
+
+        with self.lock:
+            if self.buffer is None:
+                self.buffer = self.buffer_fn()
+            self.size += len(data)
+            if rms < self.silence_rms:
+                self.silent_run += 1
+            else:
+                self.silent_run = 0
+
+            # 足够长且处于停顿中，在静音段中点切分
+            if (self.silent_run >= self.min_silence_frames and
+                    self.size - self.boundary >= self.min_segment_frames * len(data)):
+                cut = self.size - self.silent_run // 2 * len(data)
+                self._submit(self.boundary, cut)
+                self.boundary = cut
+                self.silent_run = 0
+
+    def _submit(self, start, end):
+        future = self.pool.submit(self._recognize_range, start, end)
+        self.segments.append((start, end, future))
+
+    def _recognize_range(self, start, end):
+        wav_data = self.to_wav_fn(self.buffer.pcm_view(start, end))
+        if not wav_data:
+            return ''
+        return self.recognize_fn(wav_data) or ''
+
+    def finish(self):
+        """
+        识别剩余尾段并拼接所有结果
+
+        Returns:
+            tuple: (识别文本, 统计信息dict)
+        """
+        with self.lock:
+            segments = list(self.segments)
+            tail_start = self.boundary
+            total_size = self.size
+
+        start = time.time()
+        tail_text = self._recognize_range(tail_start, total_size) if total_size > tail_start else ''
+
+        texts = []
+        for seg_start, seg_end, future in segments:
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                # 预识别失败时同步重试该段
+                print(f"预识别分段失败，重新识别: {e}")
+                texts.append(self._recognize_range(seg_start, seg_end))
+        texts.append(tail_text)
+
+        bytes_per_second = self.rate * 2
+        stats = {
+            'segments': len(segments),
+            'pre_recognized_seconds': tail_start / bytes_per_second,
+            'total_seconds': total_size / bytes_per_second,
+            'finish_ms': (time.time() - start) * 1000,
+        }
+        return join_segments(texts), stats
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+流式识别本地替身服务 - 实现与火山引擎流式识别相同的二进制协议，用于离线测试
+
+用法:
+    python -m util.stream_stub_server --port 8765
+然后在 .env 中设置:
+    VOLCENGINE_STREAM_URL=ws://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import threading
+
+from websockets.sync.server import serve
+
+from util.streaming_asr import (
+    FULL_CLIENT_REQUEST, AUDIO_ONLY_REQUEST, FULL_SERVER_RESPONSE,
+    NEG_WITH_SEQUENCE, POS_SEQUENCE, JSON_SERIALIZATION, GZIP_COMPRESSION,
+    build_packet, parse_packet, is_last_packet
+)
+
+
+class StreamStubServer:
+    """流式识别替身服务"""
+
+    def __init__(self, host='127.0.0.1', port=8765, text=None, delay=0.0):
+        """
+        Args:
+            host/port: 监听地址
+            text: 固定返回的识别文本，为空时返回收到的音频时长描述
+            delay: 返回最终结果前的模拟解码耗时（秒）
+        """
+        self.host = host
+        self.port = port
+        self.text = text
+        self.delay = delay
+        self.server = None
+        self.thread = None
+        self.sessions = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def _respond(self, ws, sequence, result, last=False):
+        payload = json.dumps({"result": result}, ensure_ascii=False).encode('utf-8')
+        flags = NEG_WITH_SEQUENCE if last else POS_SEQUENCE
+        ws.send(build_packet(
+            FULL_SERVER_RESPONSE, flags, payload, -sequence if last else sequence,
+            JSON_SERIALIZATION, GZIP_COMPRESSION
+        ))
+
+    def _handler(self, ws):
+        """处理一个流式会话"""
+        self.sessions += 1
+        audio_config = {}
+        audio_bytes = 0
+
+        for message in ws:
+            packet = parse_packet(message)
+            sequence = abs(packet['sequence'] or 0)
+
+            if packet['message_type'] == FULL_CLIENT_REQUEST:
+                audio_config = packet['payload'].get('audio', {})
+                self._respond(ws, sequence, {"text": ""})
+
+            elif packet['message_type'] == AUDIO_ONLY_REQUEST:
+                audio_bytes += len(packet['payload'])
+                if is_last_packet(packet['flags']):
+                    if self.delay:
+                        threading.Event().wait(self.delay)
+                    rate = audio_config.get('rate', 16000)
+                    bytes_per_second = rate * audio_config.get('bits', 16) // 8 * audio_config.get('channel', 1)
+                    seconds = audio_bytes / bytes_per_second if bytes_per_second else 0
+                    text = self.text if self.text is not None else f"收到{seconds:.2f}秒音频"
+                    self._respond(ws, sequence, {"text": text}, last=True)
+                    break
+
+    def start(self):
+        """在后台线程启动服务"""
+        self.server = serve(self._handler, self.host, self.port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"流式识别替身服务已启动: {self.url}")
+        return self
+
+    def stop(self):
+        """停止服务"""
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式识别本地替身服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--text', default=None, help="固定返回的识别文本")
+    parser.add_argument('--delay', type=float, default=0.0, help="模拟解码耗时（秒）")
+    args = parser.parse_args()
+
+    stub = StreamStubServer(args.host, args.port, args.text, args.delay)
+    stub.server = serve(stub._handler, stub.host, stub.port)
+    print(f"流式识别替身服务已启动: {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+流式识别 - 按住快捷键时边录边传，松开后只需发送最后一包并等待解码结果
+
+使用火山引擎大模型流式识别协议（二进制帧 over WebSocket），
+本地可用 util/stream_stub_server.py 启动替身服务进行离线测试。
+"""
+
+import gzip
+import json
+import queue
+import struct
+import threading
+import time
+import uuid
+
+from websockets.sync.client import connect
+
+
+# 协议常量
+PROTOCOL_VERSION = 0b0001
+HEADER_SIZE = 0b0001  # 以4字节为单位
+
+FULL_CLIENT_REQUEST = 0b0001
+AUDIO_ONLY_REQUEST = 0b0010
+FULL_SERVER_RESPONSE = 0b1001
+SERVER_ERROR_RESPONSE = 0b1111
+
+NO_SEQUENCE = 0b0000
+POS_SEQUENCE = 0b0001
+NEG_SEQUENCE = 0b0010
+NEG_WITH_SEQUENCE = 0b0011
+
+NO_SERIALIZATION = 0b0000
+JSON_SERIALIZATION = 0b0001
+
+NO_COMPRESSION = 0b0000
+GZIP_COMPRESSION = 0b0001
+
+
+def build_header(message_type, flags, serialization, compression):
+    """构造4字节协议头"""
+    return bytes([
+        (PROTOCOL_VERSION << 4) | HEADER_SIZE,
+        (message_type << 4) | flags,
+        (serialization << 4) | compression,
+        0x00,
+    ])
+
+
+def build_packet(message_type, flags, payload, sequence=None,
+                 serialization=NO_SERIALIZATION, compression=NO_COMPRESSION):
+    """构造完整数据包：协议头 + [序号] + 负载长度 + 负载"""
+    if compression == GZIP_COMPRESSION:
+        payload = gzip.compress(payload)
+    packet = bytearray(build_header(message_type, flags, serialization, compression))
+    if sequence is not None:
+        packet += struct.pack('>i', sequence)
+    packet += struct.pack('>I', len(payload))
+    packet += payload
+    return bytes(packet)
+
+
+def parse_packet(data):
+    """
+    解析数据包
+
+    Returns:
+        dict: message_type, flags, sequence, payload(已解压/反序列化), error_code
+    """
+    header_size = data[0] & 0x0f
+    message_type = data[1] >> 4
+    flags = data[1] & 0x0f
+    serialization = data[2] >> 4
+    compression = data[2] & 0x0f
+    body = data[header_size * 4:]
+
+    packet = {
+        'message_type': message_type,
+        'flags': flags,
+        'sequence': None,
+        'error_code': None,
+        'payload': None,
+    }
+
+    if flags & POS_SEQUENCE:
+        packet['sequence'] = struct.unpack('>i', body[:4])[0]
+        body = body[4:]
+
+    if message_type == SERVER_ERROR_RESPONSE:
+        packet['error_code'] = struct.unpack('>I', body[:4])[0]
+        body = body[4:]
+
+    payload_size = struct.unpack('>I', body[:4])[0]
+    payload = body[4:4 + payload_size]
+
+    if compression == GZIP_COMPRESSION:
+        payload = gzip.decompress(payload)
+    if serialization == JSON_SERIALIZATION:
+        payload = json.loads(payload.decode('utf-8'))
+    packet['payload'] = payload
+    return packet
+
+
+def is_last_packet(flags):
+    """是否为最后一包（负序号）"""
+    return bool(flags & NEG_SEQUENCE)
+
+
+class VolcengineStreamSession:
+    """一次流式识别会话（对应一次录音）"""
+
+    def __init__(self, url, app_id, access_key, resource_id="volc.bigasr.sauc.duration",
+                 rate=16000, bits=16, channels=1, timeout=10):
+        """
+        初始化流式会话
+
+        Args:
+            url: WebSocket地址
+            app_id: 火山引擎APP ID
+            access_key: 火山引擎Access Token
+            resource_id: 资源ID
+            rate/bits/channels: PCM音频参数
+            timeout: 连接及等待最终结果的超时时间（秒）
+        """
+        self.url = url
+        self.app_id = app_id
+        self.access_key = access_key
+        self.resource_id = resource_id
+        self.rate = rate
+        self.bits = bits
+        self.channels = channels
+        self.timeout = timeout
+
+        self.ws = None
+        self.sequence = 1
+        self.chunks = queue.Queue()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.bytes_sent = 0
+        self.finish_time = None
+
+        self._sender = None
+        self._receiver = None
+
+    def _connect_headers(self):
+        return {
+            "X-Api-App-Key": self.app_id,
+            "X-Api-Access-Key": self.access_key,
+            "X-Api-Resource-Id": self.resource_id,
+            "X-Api-Connect-Id": str(uuid.uuid4()),
+        }
+
+    def _full_request(self):
+        return {
+            "user": {"uid": self.app_id},
+            "audio": {
+                "format": "pcm",
+                "codec": "raw",
+                "rate": self.rate,
+                "bits": self.bits,
+                "channel": self.channels,
+            },
+            "request": {
+                "model_name": "bigmodel",
+                "enable_punc": True,
+            },
+        }
+
+    def start(self):
+        """后台建立连接并开始发送，send_chunk在连接建立前也可调用"""
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._sender.start()
+
+    def send_chunk(self, pcm_data):
+        """推送一块PCM数据（非阻塞，由录音线程调用）"""
+        self.chunks.put(pcm_data)
+
+    def finish(self):
+        """
+        结束推流并等待最终识别结果
+
+        Returns:
+            str: 识别文本
+        """
+        self.finish_time = time.time()
+        self.chunks.put(None)
+
+        if not self.done.wait(self.timeout):
+            self.close()
+            raise Exception("流式识别等待结果超时")
+
+        self.close()
+        if self.error:
+            raise Exception(self.error)
+        return self.result or ''
+
+    def _send_loop(self):
+        """发送线程：建立连接、发送配置，然后把音频块合并发送"""
+        try:
+            self.ws = connect(
+                self.url,
+                additional_headers=self._connect_headers(),
+                open_timeout=self.timeout,
+                max_size=None,
+            )
+            self._receiver = threading.Thread(target=self._recv_loop, daemon=True)
+            self._receiver.start()
+
+            payload = json.dumps(self._full_request()).encode('utf-8')
+            self.ws.send(build_packet(
+                FULL_CLIENT_REQUEST, POS_SEQUENCE, payload, self.sequence,
+                JSON_SERIALIZATION, GZIP_COMPRESSION
+            ))
+
+            finished = False
+            while not finished:
+                pending = [self.chunks.get()]
+                # 合并积压的音频块，减少小包数量
+                while True:
+                    try:
+                        pending.append(self.chunks.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if pending[-1] is None:
+                    finished = True
+                audio = b''.join(chunk for chunk in pending if chunk is not None)
+
+                if finished:
+                    self.sequence += 1
+                    self.ws.send(build_packet(
+                        AUDIO_ONLY_REQUEST, NEG_WITH_SEQUENCE, audio, -self.sequence
+                    ))
+                elif audio:
+                    self.sequence += 1
+                    self.ws.send(build_packet(
+                        AUDIO_ONLY_REQUEST, POS_SEQUENCE, audio, self.sequence
+                    ))
+                self.bytes_sent += len(audio)
+
+        except Exception as e:
+            self.error = f"流式识别发送失败: {e}"
+            self.done.set()
+
+    def _recv_loop(self):
+        """接收线程：记录最新识别结果，收到最后一包时结束；没收到最后一包连接就关闭时记为出错"""
+        final = False
+        try:
+            for message in self.ws:
+                if not isinstance(message, bytes):
+                    continue
+                packet = parse_packet(message)
+
+                if packet['message_type'] == SERVER_ERROR_RESPONSE:
+                    payload = packet['payload']
+                    if isinstance(payload, bytes):
+                        payload = payload.decode('utf-8', errors='replace')
+                    self.error = f"Stream API Error: {packet['error_code']} - {payload}"
+                    break
+
+                if packet['message_type'] == FULL_SERVER_RESPONSE:
+                    payload = packet['payload'] or {}
+                    text = payload.get('result', {}).get('text')
+                    if text is not None:
+                        self.result = text
+                    if is_last_packet(packet['flags']):
+                        final = True
+                        break
+            if not final and not self.error:
+                # 已收到的只是中间结果，不能当作完整结果粘贴，由调用方回退到整段识别
+                self.error = "流式识别连接在最终结果前关闭"
+        except Exception as e:
+            if not self.done.is_set():
+                self.error = f"流式识别接收失败: {e}"
+        finally:
+            self.done.set()
+
+    def close(self):
+        """关闭连接"""
+        self.chunks.put(None)
+        if self.ws:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+
+class VolcengineStreamingClient:
+    """火山引擎流式识别客户端"""
+
+    def __init__(self, app_id, access_key, url):
+        self.app_id = app_id
+        self.access_key = access_key
+        self.url = url
+
+    def create_session(self, rate=16000, bits=16, channels=1):
+        """创建并启动一次流式会话"""
+        session = VolcengineStreamSession(
+            self.url, self.app_id, self.access_key,
+            rate=rate, bits=bits, channels=channels
+        )
+        session.start()
+        return session
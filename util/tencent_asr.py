@@ -12,6 +12,8 @@ from config import tencent_asr_config as TencentASRConfig
 class TencentASRClient:
     """腾讯云ASR客户端 - 使用官方SDK"""
 
+    model = "16k_zh"  # 引擎类型：16k中文普通话
+
     def __init__(self):
         try:
             # 使用简化的配置
@@ -30,7 +32,12 @@ class TencentASRClient:
             # 使用腾讯云官方SDK
             cred = credential.Credential(self.secret_id, self.secret_key)
             http_profile = HttpProfile()
-            http_profile.endpoint = "asr.tencentcloudapi.com"
+            endpoint = TencentASRConfig.endpoint
+            if endpoint.startswith('http://'):
+                # 本地替身服务
+                http_profile.scheme = 'http'
+                endpoint = endpoint[len('http://'):]
+            http_profile.endpoint = endpoint.rstrip('/')
 
             client_profile = ClientProfile()
             client_profile.httpProfile = http_profile
@@ -67,7 +74,7 @@ class TencentASRClient:
             req = models.SentenceRecognitionRequest()
             req.ProjectId = 0
             req.SubServiceType = 2  # 腾讯云通用版本
-            req.EngSerViceType = "16k_zh"  # 16k中文普通话
+            req.EngSerViceType = self.model
             req.SourceType = 1  # 本地音频文件
             req.VoiceFormat = audio_format
             req.Data = audio_base64
@@ -105,7 +112,7 @@ class TencentASRClient:
             req = models.SentenceRecognitionRequest()
             req.ProjectId = 0
             req.SubServiceType = 2
-            req.EngSerViceType = "16k_zh"
+            req.EngSerViceType = self.model
             req.SourceType = 1
             req.VoiceFormat = audio_format
             req.Data = audio_base64
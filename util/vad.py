@@ -0,0 +1,85 @@
+"""
+语音活动检测 - 基于能量(RMS)的静音裁剪，上传前去掉首尾静音并压缩过长的停顿
+"""
+
+import numpy as np
+
+
+def chunk_rms(samples):
+    """计算一块int16采样的RMS，空数据或异常值返回0"""
+    if len(samples) == 0:
+        return 0
+    mean_squared = np.mean(samples.astype(np.float64) ** 2)
+    if mean_squared > 0 and not np.isnan(mean_squared):
+        return np.sqrt(mean_squared)
+    return 0
+
+
+def frame_rms(frames):
+    """按行计算RMS，frames为二维int16数组 (帧数, 每帧采样数)"""
+    values = frames.astype(np.float32)
+    return np.sqrt(np.mean(values * values, axis=1))
+
+
+def trim_silence(pcm_data, rate=16000, threshold=300, padding=0.2, max_pause=0.6, frame_ms=20):
+    """
+    裁剪静音
+
+    Args:
+        pcm_data: 16位单声道PCM数据（bytes）
+        rate: 采样率
+        threshold: 判定为语音的RMS阈值
+        padding: 语音段前后保留的静音时长（秒）
+        max_pause: 句中停顿保留的最长时长（秒），超出部分被压缩
+        frame_ms: 分析帧长（毫秒）
+
+    Returns:
+        tuple: (裁剪后的PCM bytes, 统计信息dict)
+    """
+    samples = np.frombuffer(pcm_data, dtype=np.int16)
+    frame_size = int(rate * frame_ms / 1000)
+    frame_count = len(samples) // frame_size
+
+    stats = {
+        'original_bytes': len(pcm_data),
+        'trimmed_bytes': len(pcm_data),
+        'saved_bytes': 0,
+        'saved_seconds': 0.0,
+    }
+    if frame_count == 0:
+        return pcm_data, stats
+
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size)
+    voiced = frame_rms(frames) >= threshold
+
+    # 全是静音时保持原样，交给服务端判断
+    if not voiced.any():
+        return pcm_data, stats
+
+    # 语音段向两侧扩展padding帧（滑动窗口内有语音帧即保留）
+    pad_frames = int(padding * 1000 / frame_ms)
+    index = np.arange(frame_count)
+    voiced_count = np.concatenate([[0], np.cumsum(voiced)])
+    upper = np.minimum(index + pad_frames + 1, frame_count)
+    lower = np.maximum(index - pad_frames, 0)
+    keep = voiced_count[upper] - voiced_count[lower] > 0
+
+    # 停顿内每帧距上一个保留帧的距离，超过max_pause的部分丢弃
+    last_keep = np.maximum.accumulate(np.where(keep, index, -1))
+    max_pause_frames = int(max_pause * 1000 / frame_ms)
+    in_pause = ~keep & (last_keep >= 0) & (index - last_keep <= max_pause_frames)
+
+    # 去掉首尾静音
+    final_keep = np.flatnonzero(keep)[-1]
+    mask = (keep | in_pause) & (index <= final_keep)
+
+    trimmed = frames[mask].ravel()
+    if mask[-1]:
+        trimmed = np.concatenate([trimmed, samples[frame_count * frame_size:]])
+
+    trimmed_data = trimmed.tobytes()
+    bytes_per_second = rate * 2
+    stats['trimmed_bytes'] = len(trimmed_data)
+    stats['saved_bytes'] = len(pcm_data) - len(trimmed_data)
+    stats['saved_seconds'] = stats['saved_bytes'] / bytes_per_second
+    return trimmed_data, stats
@@ -1,31 +1,56 @@
 import json
 import uuid
 import base64
-import requests
 from pathlib import Path
+from util.http_pool import PooledSession
 
 
 class VolcengineASRClient:
     """火山引擎大模型ASR客户端"""
     
-    def __init__(self, app_id, access_key):
+    model = "volc.bigasr.auc_turbo"  # 资源ID（识别模型）
+    
+    def __init__(self, app_id, access_key, pool_maxsize=4, keepalive_interval=25,
+                 base_url="https://openspeech.bytedance.com/api/v3/auc/bigmodel/recognize/flash"):
         """
         初始化火山引擎ASR客户端
         
         Args:
             app_id: 火山引擎APP ID
             access_key: 火山引擎Access Token
+            pool_maxsize: 连接池最大连接数
+            keepalive_interval: 空闲保活间隔（秒）
+            base_url: 识别接口地址
         """
         self.app_id = app_id
         self.access_key = access_key
-        self.base_url = "https://openspeech.bytedance.com/api/v3/auc/bigmodel/recognize/flash"
+        self.base_url = base_url
+        
+        # 长连接池，复用TCP/TLS连接
+        self.http = PooledSession(
+            self.base_url,
+            pool_maxsize=pool_maxsize,
+            keepalive_interval=keepalive_interval
+        )
+    
+    def warm_up(self):
+        """后台预热连接池并启动空闲保活"""
+        self.http.warm_up()
+    
+    def get_pool_stats(self):
+        """获取连接池统计（复用次数、建连耗时等）"""
+        return self.http.get_stats()
+    
+    def close(self):
+        """关闭连接池"""
+        self.http.close()
         
     def _prepare_headers(self):
         """准备请求头"""
         return {
             "X-Api-App-Key": self.app_id,
             "X-Api-Access-Key": self.access_key,
-            "X-Api-Resource-Id": "volc.bigasr.auc_turbo",
+            "X-Api-Resource-Id": self.model,
             "X-Api-Request-Id": str(uuid.uuid4()),
             "X-Api-Sequence": "-1",
             "Content-Type": "application/json"
@@ -41,61 +66,38 @@ class VolcengineASRClient:
         Returns:
             dict: 识别结果
         """
-        # 读取音频文件并转换为base64
+        # 读取音频文件
         with open(file_path, 'rb') as f:
             audio_data = f.read()
         
-        base64_data = base64.b64encode(audio_data).decode('utf-8')
-        
-        # 构造请求体
-        request_body = {
-            "user": {
-                "uid": self.app_id
-            },
-            "audio": {
-                "data": base64_data
-            },
-            "request": {
-                "model_name": "bigmodel"
-            }
-        }
-        
-        # 发送请求（禁用代理）
-        headers = self._prepare_headers()
-        proxies = {'http': None, 'https': None}
-        response = requests.post(
-            self.base_url, 
-            json=request_body, 
-            headers=headers, 
-            proxies=proxies,
-            timeout=30
-        )
-        
-        # 检查响应
-        if response.status_code != 200:
-            raise Exception(f"HTTP Error: {response.status_code}, {response.text}")
-        
-        # 检查API状态码
-        status_code = response.headers.get('X-Api-Status-Code')
-        if status_code != '20000000':
-            message = response.headers.get('X-Api-Message', 'Unknown error')
-            raise Exception(f"API Error: {status_code} - {message}")
-        
-        return response.json()
+        return self.recognize_audio_data(audio_data)
     
-    def recognize_audio_data(self, audio_data):
+    def recognize_audio_data(self, audio_data, audio_format='wav'):
         """
         识别音频数据
         
         Args:
             audio_data: 音频数据（bytes）
+            audio_format: 音频格式（'wav' / 'ogg'）
             
         Returns:
             dict: 识别结果
         """
+        # 发送请求（复用连接池，已禁用代理）
+        response = self.http.post(
+            self.base_url, 
+            json=self.build_request_body(audio_data, audio_format), 
+            headers=self._prepare_headers(), 
+            timeout=30
+        )
+        
+        self.check_response(response.status_code, response.headers, response.text)
+        return response.json()
+    
+    def build_request_body(self, audio_data, audio_format='wav'):
+        """构造请求体"""
         base64_data = base64.b64encode(audio_data).decode('utf-8')
         
-        # 构造请求体
         request_body = {
             "user": {
                 "uid": self.app_id
@@ -107,29 +109,21 @@ class VolcengineASRClient:
                 "model_name": "bigmodel"
             }
         }
-        
-        # 发送请求（禁用代理）
-        headers = self._prepare_headers()
-        proxies = {'http': None, 'https': None}
-        response = requests.post(
-            self.base_url, 
-            json=request_body, 
-            headers=headers, 
-            proxies=proxies,
-            timeout=30
-        )
-        
+        if audio_format != 'wav':
+            request_body["audio"]["format"] = audio_format
+        return request_body
+    
+    def check_response(self, http_status, headers, text):
+        """检查HTTP状态和API状态码，失败时抛出异常"""
         # 检查响应
-        if response.status_code != 200:
-            raise Exception(f"HTTP Error: {response.status_code}, {response.text}")
+        if http_status != 200:
+            raise Exception(f"HTTP Error: {http_status}, {text}")
         
         # 检查API状态码
-        status_code = response.headers.get('X-Api-Status-Code')
+        status_code = headers.get('X-Api-Status-Code')
         if status_code != '20000000':
-            message = response.headers.get('X-Api-Message', 'Unknown error')
+            message = headers.get('X-Api-Message', 'Unknown error')
             raise Exception(f"API Error: {status_code} - {message}")
-        
-        return response.json()
     
     def get_text_result(self, result):
         """
@@ -1,14 +1,30 @@
 """
 最终波形显示窗口
 tkinter + 移植的demo算法 = 完美方案
+
+窗口在一个常驻的界面线程中创建一次，平时隐藏；显示/隐藏通过命令队列交给界面线程执行，
+不再每次录音新建 tk.Tk()。电平更新只覆盖最新值，由动画帧读取（合并为每帧一次）
+
+画布图形只创建一次，每帧用 coords() 更新坐标；波形的x网格、包络和正弦表预先用NumPy计算，
+每帧只需两次标量三角函数和几次数组乘加。电平不变时降低帧率，并统计每帧绘制耗时
+
+用法:
+    python -m util.waveform_display                          # 每帧计算耗时对比，无需显示器
+    python -m util.waveform_display --overlay 1000           # 对比每次新建窗口与常驻窗口的显示延迟和内存增长（需要显示器）
 """
 
 import tkinter as tk
+import os
+import queue
 import threading
 import time
 import math
 import random
 
+import numpy as np
+
+from util.latency import LatencyHistogram
+
 
 class WaveformWindow:
     """最终波形显示窗口"""
@@ -22,13 +38,26 @@ class WaveformWindow:
         self.canvas = None
         self.is_visible = False
         self.window_thread = None
+        self.thread_lock = threading.Lock()
         self.animation_running = False
+        self.after_id = None
+        
+        # 界面线程的命令队列：(命令, 请求时间, 参数)，界面线程只执行最后一条显示/隐藏命令
+        self.commands = queue.SimpleQueue()
+        self.ui_ready = threading.Event()
+        self.threaded_tcl = True   # 线程版Tcl可从其他线程调用after_idle唤醒界面线程，否则界面线程轮询队列
+        self.shown = threading.Event()
+        self.hidden = threading.Event()
+        
+        # 显示延迟：调用show到窗口映射完成
+        self.show_latency = LatencyHistogram(min_latency=0.001, max_latency=5.0)
         
         # 波形参数 - 来自demo
         self.scale = 2
         self.speed = 9
         self.phase_offset = 21.8
         self.fps = 60
+        self.idle_fps = 20           # 电平不变时的帧率
         self.line_width = 2
         
         # 动画状态
@@ -36,9 +65,45 @@ class WaveformWindow:
         self.power_level = 0
         self.target_power_level = 0  # 目标振幅
         self.smooth_factor = 0.15    # 平滑系数，越小越平滑
+        self.last_frame = None
+        
+        # 画布图形（创建一次，之后只更新坐标）
+        self.items = None
+        self.notice_item = None   # 波形上方的提示文字
         
-    def _create_window(self):
-        """创建tkinter窗口"""
+        # 帧耗时统计
+        self.frame_time = LatencyHistogram(min_latency=0.0001, max_latency=1.0)
+        self.frames = 0
+        self.idle_frames = 0
+        self.shown_at = None
+        
+        self._precompute()
+    
+    def _precompute(self):
+        """预先计算x网格、包络和两条波形的正弦表"""
+        self.xs = np.arange(0, self.width + 1, 2, dtype=np.float64)
+        position = self.xs / self.width
+        max_amplitude = self.height / 2
+        self.max_amplitude = max_amplitude
+        # 缩放因子 - demo算法：两端为0、中间最大的包络
+        self.envelope = (1 + np.cos(np.pi + position * 2 * np.pi)) / 2 * max_amplitude
+        # sin(a + phase) = sin(a)·cos(phase) + cos(a)·sin(phase)，每帧只需计算phase的三角函数
+        self.tables = []
+        for frequency in (2.0, 1.8):
+            angle = 2 * np.pi * position * frequency
+            self.tables.append((self.envelope * np.sin(angle), self.envelope * np.cos(angle)))
+        
+        # 坐标缓冲区：线条为 [x0, y0, x1, y1, ...]，填充为路径1加反向的路径2
+        count = len(self.xs)
+        self.line_coords = [np.empty(count * 2) for _ in range(2)]
+        for coords in self.line_coords:
+            coords[0::2] = self.xs
+        self.fill_coords = np.empty(count * 4)
+        self.fill_coords[0:count * 2:2] = self.xs
+        self.fill_coords[count * 2::2] = self.xs[::-1]
+        
+    def _run_ui(self):
+        """界面线程：创建一次隐藏的窗口，之后处理显示/隐藏命令直到退出"""
         try:
             self.window = tk.Tk()
             
@@ -66,10 +131,16 @@ class WaveformWindow:
                 bd=0
             )
             self.canvas.pack()
+            self._create_items()
+            self.window.withdraw()
             
-            # 开始动画
-            self.animation_running = True
-            self._animate()
+            self.threaded_tcl = bool(int(self.window.tk.call('info', 'exists', 'tcl_platform(threaded)')))
+            self.ui_ready.set()
+            if self.threaded_tcl:
+                # 处理界面线程就绪前已提交的命令
+                self._process_commands()
+            else:
+                self._poll_commands()
             
             # 启动事件循环
             self.window.mainloop()
@@ -78,10 +149,97 @@ class WaveformWindow:
             print(f"[调试] 波形窗口创建失败: {e}")
         finally:
             # 确保清理资源
+            self.ui_ready.clear()
+            try:
+                if self.window:
+                    self.window.destroy()
+            except Exception:
+                pass
             self._cleanup_references()
             self.is_visible = False
             self.animation_running = False
     
+    def start(self):
+        """启动界面线程（首次显示前调用可省去创建窗口的耗时）"""
+        with self.thread_lock:
+            if self.window_thread is None or not self.window_thread.is_alive():
+                self.window_thread = threading.Thread(target=self._run_ui, name='waveform-ui', daemon=True)
+                self.window_thread.start()
+    
+    def _post(self, command, argument=None):
+        """提交命令给界面线程"""
+        self.commands.put((command, time.perf_counter(), argument))
+        self.start()
+        if self.ui_ready.is_set() and self.threaded_tcl:
+            try:
+                self.window.after_idle(self._process_commands)
+            except Exception:
+                pass  # 界面线程正在启动或退出，就绪后会处理队列
+    
+    def _poll_commands(self):
+        """非线程版Tcl：界面线程定期检查命令队列"""
+        self._process_commands()
+        if self.window:
+            self.window.after(50, self._poll_commands)
+    
+    def _process_commands(self):
+        """执行队列中的命令（界面线程），连续的显示/隐藏只执行最后一条"""
+        latest = None
+        notice = None
+        quit_requested = False
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if command[0] == 'quit':
+                quit_requested = True
+            elif command[0] == 'notice':
+                notice = command[2]
+            else:
+                latest = command
+        
+        if notice is not None and self.canvas:
+            self.canvas.itemconfigure(self.notice_item, text=notice)
+        
+        if quit_requested:
+            self._hide_now()
+            self.window.quit()
+        elif latest and latest[0] == 'show':
+            self._show_now(latest[1])
+        elif latest:
+            self._hide_now()
+    
+    def _show_now(self, requested):
+        """显示窗口并开始动画（界面线程）"""
+        self.power_level = 0
+        self.frames = self.idle_frames = 0
+        self.shown_at = self.last_frame = time.perf_counter()
+        self.window.deiconify()
+        self.window.attributes('-topmost', True)
+        self.animation_running = True
+        if self.after_id is None:
+            self._animate()
+        self.window.update_idletasks()
+        self.show_latency.record(time.perf_counter() - requested)
+        self.hidden.clear()
+        self.shown.set()
+    
+    def _hide_now(self):
+        """停止动画并隐藏窗口（界面线程）"""
+        self.animation_running = False
+        if self.after_id is not None:
+            self.window.after_cancel(self.after_id)
+            self.after_id = None
+        if self.window.state() != 'withdrawn':
+            self.window.withdraw()
+            stats = self.get_frame_stats()
+            if stats['frames']:
+                print(f"波形: {stats['frames']} 帧，平均 {stats['fps']:.0f} fps（低帧率 {stats['idle_ratio']:.0%}），"
+                      f"每帧绘制 p50 {stats['p50'] * 1000:.2f}ms / p99 {stats['p99'] * 1000:.2f}ms")
+        self.shown.clear()
+        self.hidden.set()
+    
     def _center_window(self):
         """窗口居中定位"""
         screen_width = self.window.winfo_screenwidth()
@@ -94,120 +252,113 @@ class WaveformWindow:
     
     def _animate(self):
         """动画循环"""
+        self.after_id = None
         if not self.animation_running or not self.canvas:
             return
         
+        start = time.perf_counter()
+        
         # 平滑插值到目标振幅
-        self.power_level += (self.target_power_level - self.power_level) * self.smooth_factor
+        change = (self.target_power_level - self.power_level) * self.smooth_factor
+        self.power_level += change
         self.power_level = max(0, min(100, self.power_level))
         
-        # 绘制波形
-        self._draw_waveform()
+        # 绘制波形（相位按实际帧间隔推进，帧率变化时波形速度不变）
+        elapsed = start - self.last_frame
+        self.last_frame = start
+        self._draw_waveform(elapsed)
+        
+        self.frame_time.record(time.perf_counter() - start)
+        self.frames += 1
+        
+        # 电平基本不变时降低帧率
+        if abs(change) < 0.05:
+            self.idle_frames += 1
+            interval = 1000 // self.idle_fps
+        else:
+            interval = 1000 // self.fps
         
         # 调度下一帧
         if self.window:
-            self.window.after(16, self._animate)  # ~60 FPS
+            self.after_id = self.window.after(interval, self._animate)
     
-    def _draw_waveform(self):
+    def _create_items(self):
+        """创建填充和两条波形线（之后每帧只更新坐标）"""
+        flat = [0, 0] * len(self.xs)
+        self.items = (
+            self.canvas.create_polygon(flat + flat, fill='#2a4a6b', outline='', stipple='gray25'),
+            self.canvas.create_line(flat, fill='#4a9eff', width=1, capstyle='round', joinstyle='round'),  # 蓝色波形
+            self.canvas.create_line(flat, fill='#00d4ff', width=2, capstyle='round', joinstyle='round'),  # 青色主波形
+        )
+        self.notice_item = self.canvas.create_text(
+            self.width // 2, 10, text='', fill='#ffcc66', font=('Microsoft YaHei', 9)
+        )
+    
+    def _draw_waveform(self, elapsed=None):
         """绘制波形 - 移植demo算法"""
-        if not self.canvas:
+        if not self.canvas or not self.items:
             return
         
-        # 清除画布
-        self.canvas.delete("all")
+        path1, path2 = self._compute_paths(elapsed)
+        fill, line2, line1 = self.items
+        self.canvas.coords(fill, self.fill_coords.tolist())
+        self.canvas.coords(line2, path2.tolist())
+        self.canvas.coords(line1, path1.tolist())
+    
+    def _compute_paths(self, elapsed=None):
+        """
+        计算两条波形的坐标（写入预分配的缓冲区）
         
-        # 计算参数 - 来自demo
-        speed_x = self.speed / self.fps
+        Returns:
+            tuple: (路径1坐标, 路径2坐标)，均为 [x0, y0, x1, y1, ...] 数组
+        """
+        # 计算参数 - 来自demo（每帧相位推进 speed/fps）
+        if elapsed is None:
+            elapsed = 1 / self.fps
+        speed_x = self.speed * min(elapsed, 0.1)
         self._phase -= speed_x
-        phase2 = self._phase + speed_x * self.phase_offset
+        phase2 = self._phase + self.speed / self.fps * self.phase_offset
         amplitude = self.power_level / 100
         
-        # 增强振幅效果
+        # 增强振幅效果，并确保有最小波动
         enhanced_amplitude = min(1.0, amplitude * 2.5)  # 放大2.5倍
+        base_amplitude = max(0.15, enhanced_amplitude)  # 最小15%振幅
         
-        # 生成两条波形路径 - 来自demo算法
-        path1 = self._gen_path(2.0, enhanced_amplitude, self._phase)
-        path2 = self._gen_path(1.8, enhanced_amplitude, phase2)
+        count = len(self.xs)
+        for (sin_table, cos_table), coords, phase in zip(self.tables, self.line_coords, (self._phase, phase2)):
+            ys = coords[1::2]
+            np.multiply(sin_table, base_amplitude * math.cos(phase), out=ys)
+            ys += cos_table * (base_amplitude * math.sin(phase))
+            ys += self.max_amplitude
         
-        # 绘制背景填充
-        self._draw_background_fill(path1, path2)
-        
-        # 绘制波形线条
-        self._draw_wave_line(path2, '#4a9eff', 1)  # 蓝色波形
-        self._draw_wave_line(path1, '#00d4ff', 2)  # 青色主波形
+        path1, path2 = self.line_coords
+        self.fill_coords[1:count * 2:2] = path1[1::2]
+        self.fill_coords[count * 2 + 1::2] = path2[1::2][::-1]
+        return path1, path2
     
-    def _gen_path(self, frequency, amplitude, phase):
-        """生成波形路径 - 优化振幅"""
-        path = []
-        max_amplitude = self.height / 2
+    def get_frame_stats(self):
+        """
+        帧统计
         
-        for x in range(0, self.width + 1, 2):
-            # 缩放因子 - demo算法
-            scaling = (1 + math.cos(math.pi + (x / self.width) * 2 * math.pi)) / 2
-            
-            # 增强基础振幅，确保有最小波动
-            base_amplitude = max(0.15, amplitude)  # 最小15%振幅
-            
-            # 波形计算 - demo算法
-            y = scaling * max_amplitude * base_amplitude * math.sin(
-                2 * math.pi * (x / self.width) * frequency + phase
-            ) + max_amplitude
-            
-            path.append((x, y))
-        
-        return path
-    
-    def _draw_background_fill(self, path1, path2):
-        """绘制背景填充"""
-        if len(path1) < 2 or len(path2) < 2:
-            return
-        
-        # 创建填充路径
-        fill_points = []
-        for x, y in path1:
-            fill_points.extend([x, y])
-        for x, y in reversed(path2):
-            fill_points.extend([x, y])
-        
-        if len(fill_points) >= 6:
-            self.canvas.create_polygon(
-                fill_points,
-                fill='#2a4a6b',
-                outline='',
-                stipple='gray25'
-            )
-    
-    def _draw_wave_line(self, path, color, width):
-        """绘制波形线条"""
-        if len(path) < 2:
-            return
-        
-        # 绘制平滑曲线
-        for i in range(len(path) - 1):
-            x1, y1 = path[i]
-            x2, y2 = path[i + 1]
-            
-            self.canvas.create_line(
-                x1, y1, x2, y2,
-                fill=color,
-                width=width,
-                smooth=True,
-                capstyle='round'
-            )
+        Returns:
+            dict: frames, fps（实际平均帧率）, idle_ratio（低帧率帧占比）, 每帧绘制耗时分位数（秒）
+        """
+        stats = self.frame_time.snapshot()
+        elapsed = (self.last_frame - self.shown_at) if self.shown_at and self.last_frame else 0
+        stats.update(
+            frames=self.frames,
+            fps=self.frames / elapsed if elapsed else 0.0,
+            idle_ratio=self.idle_frames / self.frames if self.frames else 0.0,
+        )
+        return stats
     
     def show(self):
         """显示波形窗口"""
         if self.is_visible:
             return
         
-        # 确保之前的窗口已经完全清理
-        if self.window:
-            self.hide()
-            time.sleep(0.1)  # 等待清理完成
-            
         self.is_visible = True
-        self.window_thread = threading.Thread(target=self._create_window, daemon=True)
-        self.window_thread.start()
+        self._post('show')
         
         print("🎵 半透明波形窗口已显示")
     
@@ -217,34 +368,30 @@ class WaveformWindow:
             return
             
         self.is_visible = False
-        self.animation_running = False
-        
-        # 在主线程中安全关闭窗口
-        if self.window:
-            try:
-                # 使用after在主线程中执行关闭操作
-                self.window.after(0, self._safe_destroy)
-            except:
-                # 如果窗口已经被销毁，直接清理
-                self._cleanup_references()
+        self._post('hide')
         
         print("🔇 半透明波形窗口已隐藏")
     
-    def _safe_destroy(self):
-        """安全销毁窗口"""
-        try:
-            if self.window:
-                self.window.quit()
-                self.window.destroy()
-        except:
-            pass
-        finally:
-            self._cleanup_references()
+    def set_notice(self, text):
+        """设置波形上方的提示文字（空字符串清除），下次显示时可见"""
+        self._post('notice', text)
+    
+    def close(self):
+        """退出界面线程"""
+        if self.window_thread and self.window_thread.is_alive():
+            self.is_visible = False
+            self._post('quit')
+            self.window_thread.join(timeout=1.0)
+    
+    def get_show_stats(self):
+        """显示延迟统计（秒）"""
+        return self.show_latency.snapshot()
     
     def _cleanup_references(self):
         """清理引用"""
         self.window = None
         self.canvas = None
+        self.items = None
     
     def is_showing(self):
         """检查窗口是否显示"""
@@ -256,7 +403,7 @@ waveform_window = WaveformWindow()
 
 
 def update_waveform_level(level):
-    """更新波形电平（平滑过渡）"""
+    """更新波形电平（平滑过渡；只保存最新值，多次更新在下一帧合并为一次）"""
     try:
         if waveform_window.is_visible:
             waveform_window.target_power_level = level
@@ -280,9 +427,164 @@ def hide_waveform():
         print(f"[调试] 隐藏波形失败: {e}")
 
 
+def set_waveform_notice(text):
+    """设置波形窗口的提示文字（空字符串清除）"""
+    try:
+        waveform_window.set_notice(text)
+    except Exception as e:
+        print(f"[调试] 设置波形提示失败: {e}")
+
+
+def start_waveform():
+    """提前启动波形界面线程"""
+    try:
+        waveform_window.start()
+    except Exception as e:
+        print(f"[调试] 启动波形界面失败: {e}")
+
+
+def close_waveform():
+    """退出波形界面线程"""
+    try:
+        waveform_window.close()
+    except Exception as e:
+        print(f"[调试] 关闭波形界面失败: {e}")
+
+
 def is_waveform_showing():
     """检查波形窗口是否显示"""
     try:
         return waveform_window.is_showing()
     except:
-        return False
\ No newline at end of file
+        return False
+
+
+def benchmark(frames=2000):
+    """对比每帧计算耗时：原逐点生成路径并展开坐标列表，与预计算正弦表（不含Tk绘制）"""
+    window = WaveformWindow()
+    window.power_level = 40
+
+    def gen_path(frequency, amplitude, phase):
+        path = []
+        max_amplitude = window.height / 2
+        for x in range(0, window.width + 1, 2):
+            scaling = (1 + math.cos(math.pi + (x / window.width) * 2 * math.pi)) / 2
+            base_amplitude = max(0.15, amplitude)
+            y = scaling * max_amplitude * base_amplitude * math.sin(
+                2 * math.pi * (x / window.width) * frequency + phase
+            ) + max_amplitude
+            path.append((x, y))
+        return path
+
+    def old_frame():
+        phase = window._phase
+        path1 = gen_path(2.0, 1.0, phase)
+        path2 = gen_path(1.8, 1.0, phase + 3.27)
+        fill_points = []
+        for x, y in path1:
+            fill_points.extend([x, y])
+        for x, y in reversed(path2):
+            fill_points.extend([x, y])
+        # 原实现每两个相邻点创建一条线段
+        segments = [(path[i], path[i + 1]) for path in (path1, path2) for i in range(len(path) - 1)]
+        return fill_points, segments
+
+    def new_frame():
+        path1, path2 = window._compute_paths()
+        return window.fill_coords.tolist(), path1.tolist(), path2.tolist()
+
+    # 两种实现的坐标一致
+    window._phase = 0.7
+    window.power_level = 100
+    path1, path2 = window._compute_paths(0)
+    expected = gen_path(2.0, 1.0, window._phase)
+    error = max(abs(y - expected_y) for (_, expected_y), y in zip(expected, path1[1::2]))
+
+    for name, frame in (('逐点生成路径', old_frame), ('预计算正弦表', new_frame)):
+        start = time.perf_counter()
+        for _ in range(frames):
+            frame()
+        print(f"{name}: 每帧 {(time.perf_counter() - start) / frames * 1e6:.0f}us")
+    print(f"坐标最大误差: {error:.2e}px；原实现每帧创建 1 + {2 * (len(window.xs) - 1)} 个画布图形，现为更新 3 个图形的坐标")
+
+
+
+def _rss_mb():
+    """当前进程常驻内存（MB），不支持时返回None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        return None
+
+
+def benchmark_overlay(dictations=1000):
+    """
+    对比每次录音新建 tk.Tk() 的旧方式与常驻隐藏窗口：从请求显示到窗口映射完成的延迟，以及多次显示后的内存增长
+    （需要显示器）
+    """
+    def report(name, latencies, rss_start, rss_end):
+        latencies.sort()
+        growth = f"{rss_end - rss_start:+.1f}MB" if rss_start is not None else "不支持"
+        print(f"{name:<10} 显示延迟 p50 {latencies[len(latencies) // 2] * 1000:6.1f}ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f}ms  内存增长 {growth}")
+
+    # 旧方式：每次新线程 + 新 tk.Tk()，显示后销毁
+    latencies = []
+    rss_start = _rss_mb()
+    for _ in range(dictations):
+        def run():
+            requested = time.perf_counter()
+            root = tk.Tk()
+            root.overrideredirect(True)
+            root.geometry("300x60")
+            canvas = tk.Canvas(root, width=300, height=60, highlightthickness=0, bd=0)
+            canvas.pack()
+            root.update_idletasks()
+            latencies.append(time.perf_counter() - requested)
+            root.destroy()
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    report('每次新建', latencies, rss_start, _rss_mb())
+
+    # 常驻窗口：通过命令队列显示/隐藏
+    import contextlib
+    import io
+
+    window = WaveformWindow()
+    window.start()
+    window.ui_ready.wait(5)
+    latencies = []
+    rss_start = _rss_mb()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(dictations):
+            requested = time.perf_counter()
+            window.show()
+            window.shown.wait(5)
+            latencies.append(time.perf_counter() - requested)
+            window.hide()
+            window.hidden.wait(5)
+    report('常驻窗口', latencies, rss_start, _rss_mb())
+    window.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="波形显示性能测试")
+    parser.add_argument('--overlay', type=int, metavar='N', help="对比N次显示的窗口延迟和内存增长（需要显示器）")
+    args = parser.parse_args()
+    if args.overlay:
+        benchmark_overlay(args.overlay)
+    else:
+        benchmark()
+
+
+if __name__ == "__main__":
+    main()